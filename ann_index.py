@@ -0,0 +1,511 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+# Import konfigurasi lokal
+import config
+
+# Jenis index yang didukung (config.INDEX_TYPE)
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq_fp16", "sq_int8")
+
+# Presisi penyimpanan untuk index scalar quantization (flat, tanpa aproksimasi pencarian)
+SQ_TYPES = {
+    "sq_fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq_int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Parameter runtime yang di-sweep saat tuning untuk tiap jenis index
+TUNING_PARAMS = {
+    "ivf_flat": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256]),
+    "ivf_pq": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256]),
+    "hnsw": ("efSearch", [16, 32, 64, 128, 256, 512]),
+}
+
+# Jumlah baris yang ditambahkan ke index per langkah (menjaga memori saat membaca memmap)
+ADD_CHUNK_SIZE = 16384
+
+# Jumlah query per blok saat re-rank exact (membatasi memori vektor kandidat)
+RERANK_BLOCK_SIZE = 256
+
+
+# 1. PEMBUATAN INDEX
+
+def create_index(d, index_type=config.INDEX_TYPE):
+    """
+    Membuat index FAISS kosong (Inner Product) sesuai jenis yang dipilih.
+
+    Args:
+        d (int): Dimensi embedding.
+        index_type (str): Salah satu dari INDEX_TYPES.
+
+    Returns:
+        faiss.Index: Index kosong (IVF/PQ masih perlu di-train).
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatIP(d)
+
+    if index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(d)
+        return faiss.IndexIVFFlat(quantizer, d, config.IVF_NLIST, faiss.METRIC_INNER_PRODUCT)
+
+    if index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(d)
+        return faiss.IndexIVFPQ(
+            quantizer, d, config.IVF_NLIST, config.PQ_M, config.PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+        )
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, config.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+        return index
+
+    if index_type in SQ_TYPES:
+        # Vektor disimpan sebagai float16 (2x lebih kecil) atau int8 per dimensi (4x lebih kecil)
+        return faiss.IndexScalarQuantizer(d, SQ_TYPES[index_type], faiss.METRIC_INNER_PRODUCT)
+
+    raise ValueError(f"Jenis index tidak dikenal: '{index_type}'. Pilihan: {', '.join(INDEX_TYPES)}")
+
+def get_index_type(index):
+    """
+    Mendeteksi jenis index dari objek FAISS (kebalikan dari create_index).
+    """
+    if isinstance(index, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for index_type, qtype in SQ_TYPES.items():
+            if index.sq.qtype == qtype:
+                return index_type
+    return "flat"
+
+def add_in_chunks(index, embeddings, chunk_size=ADD_CHUNK_SIZE):
+    """
+    Menambahkan embedding (boleh memmap) ke index per chunk.
+    """
+    for start in range(0, embeddings.shape[0], chunk_size):
+        index.add(np.ascontiguousarray(embeddings[start : start + chunk_size], dtype='float32'))
+
+def train_index(index, embeddings, max_train=config.INDEX_TRAIN_SIZE, seed=0):
+    """
+    Melatih quantizer IVF/PQ/SQ memakai sampel acak embedding (tidak perlu untuk flat/HNSW).
+    """
+    if index.is_trained:
+        return
+
+    n = embeddings.shape[0]
+    if n > max_train:
+        rows = np.sort(np.random.default_rng(seed).choice(n, max_train, replace=False))
+        sample = np.ascontiguousarray(embeddings[rows], dtype='float32')
+    else:
+        sample = np.ascontiguousarray(embeddings[:], dtype='float32')
+
+    print(f"🏋️  Training index ({len(sample)} vektor)...")
+    index.train(sample)
+
+def build_index(embeddings, index_type=config.INDEX_TYPE):
+    """
+    Membangun index lengkap dari matrix embedding (boleh memmap).
+
+    Returns:
+        faiss.Index: Index yang berisi seluruh embedding, urutan baris = row id.
+    """
+    index = create_index(embeddings.shape[1], index_type)
+    train_index(index, embeddings)
+    add_in_chunks(index, embeddings)
+    return index
+
+def refill_index(index, embeddings):
+    """
+    Mengosongkan index lalu mengisi ulang dari matrix embedding.
+
+    Quantizer IVF/PQ/SQ yang sudah di-train dipertahankan oleh `reset()`,
+    sehingga update incremental tidak perlu training ulang.
+    """
+    index.reset()
+    add_in_chunks(index, embeddings)
+
+
+# 2. PARAMETER PENCARIAN (OPERATING POINT)
+
+def apply_search_params(index, params):
+    """
+    Menerapkan parameter runtime (misal {"nprobe": 16} atau {"efSearch": 64}).
+    """
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        space.set_index_parameter(index, name, value)
+
+def default_search_params(index_type):
+    """
+    Parameter runtime bawaan jika belum ada hasil tuning.
+    """
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return {"nprobe": config.IVF_NPROBE}
+    if index_type == "hnsw":
+        return {"efSearch": config.HNSW_EF_SEARCH}
+    return {}
+
+def load_tuning(tuning_path=config.INDEX_TUNING_FILE):
+    """
+    Membaca hasil tuning yang tersimpan bersama index (atau None).
+    """
+    if not os.path.exists(tuning_path):
+        return None
+    with open(tuning_path, 'r') as f:
+        return json.load(f)
+
+def load_index(index_path=config.INDEX_FILE, tuning_path=config.INDEX_TUNING_FILE,
+               rerank_factor=config.RERANK_FACTOR, embeddings_path=config.EMBEDDINGS_FILE):
+    """
+    Membaca index FAISS dan menerapkan operating point hasil tuning (jika cocok).
+
+    Jika `rerank_factor` > 0 dan index tidak exact, index dibungkus RerankedIndex
+    yang mengurutkan ulang kandidat dengan vektor float32 dari matrix embedding.
+
+    Returns:
+        faiss.Index atau RerankedIndex: Index siap dipakai untuk pencarian.
+    """
+    index = faiss.read_index(index_path)
+    index_type = get_index_type(index)
+
+    params = default_search_params(index_type)
+    tuning = load_tuning(tuning_path)
+    if tuning and tuning.get("index_type") == index_type:
+        params = tuning["chosen"]["params"]
+
+    if params:
+        apply_search_params(index, params)
+        print(f"🎛️  Index {index_type}: {params}")
+
+    if rerank_factor > 0 and index_type != "flat" and os.path.exists(embeddings_path):
+        print(f"🔁 Re-rank exact aktif: {rerank_factor}x kandidat dari {os.path.basename(embeddings_path)}")
+        return RerankedIndex(index, np.load(embeddings_path, mmap_mode='r'), rerank_factor)
+    return index
+
+
+# 3. PENCARIAN EXACT, RE-RANK & FILTER
+
+def exact_search(queries, embeddings, k, rows=None, chunk_size=4096):
+    """
+    Top-k exact (brute force) per chunk dari matrix embedding (boleh memmap),
+    tanpa menyalin seluruh matrix ke index flat di memori.
+
+    Args:
+        rows (np.ndarray): Row id terurut yang boleh dikembalikan (None = semua baris).
+
+    Returns:
+        tuple: (scores, ids) berukuran (nq, k), format sama dengan `faiss.Index.search`
+        (id -1 jika kandidat kurang dari k).
+    """
+    nq = len(queries)
+    n = embeddings.shape[0] if rows is None else len(rows)
+    best_scores = np.full((nq, 0), -np.inf, dtype='float32')
+    best_ids = np.empty((nq, 0), dtype='int64')
+
+    for start in range(0, n, chunk_size):
+        if rows is None:
+            chunk_ids = np.arange(start, min(start + chunk_size, n), dtype='int64')
+            chunk = embeddings[start : start + chunk_size]
+        else:
+            chunk_ids = np.asarray(rows[start : start + chunk_size], dtype='int64')
+            chunk = embeddings[chunk_ids]
+        chunk = np.ascontiguousarray(chunk, dtype='float32')
+
+        scores = np.concatenate([best_scores, queries @ chunk.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(chunk_ids, (nq, len(chunk_ids)))], axis=1)
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+
+    # Lengkapi ke k kolom jika kandidat lebih sedikit dari k
+    pad = k - best_ids.shape[1]
+    if pad > 0:
+        best_scores = np.pad(best_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+        best_ids = np.pad(best_ids, ((0, 0), (0, pad)), constant_values=-1)
+    return best_scores, best_ids
+
+def exact_scores(queries, embeddings, ids):
+    """
+    Menghitung inner product exact antara tiap query dan kandidatnya.
+
+    Args:
+        queries (np.ndarray): (nq, d) float32.
+        embeddings (np.ndarray): Matrix embedding float32 (boleh memmap).
+        ids (np.ndarray): (nq, n_cand) row id kandidat, -1 = kosong.
+
+    Returns:
+        np.ndarray: (nq, n_cand) skor float32, -inf untuk kandidat kosong.
+    """
+    valid = ids >= 0
+    # Baris unik dibaca sekali dan berurutan dari memmap
+    rows, inverse = np.unique(ids[valid], return_inverse=True)
+    vectors = np.ascontiguousarray(embeddings[rows], dtype='float32')
+
+    scores = np.full(ids.shape, -np.inf, dtype='float32')
+    gathered = np.zeros(ids.shape + (embeddings.shape[1],), dtype='float32')
+    gathered[valid] = vectors[inverse]
+    scores[valid] = np.einsum('qcd,qd->qc', gathered, queries)[valid]
+    return scores
+
+def rerank(queries, candidate_ids, embeddings, k, block_size=RERANK_BLOCK_SIZE):
+    """
+    Mengurutkan ulang kandidat index aproksimasi dengan skor float32 exact.
+
+    Returns:
+        tuple: (scores, ids) berukuran (nq, k), format sama dengan `faiss.Index.search`.
+    """
+    # Query diproses per blok agar tensor kandidat (nq, n_cand, d) tetap kecil
+    scores = np.concatenate([
+        exact_scores(queries[start : start + block_size], embeddings,
+                     candidate_ids[start : start + block_size])
+        for start in range(0, len(queries), block_size)
+    ]) if len(queries) else np.empty(candidate_ids.shape, dtype='float32')
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    top_scores = np.take_along_axis(scores, order, axis=1)
+    top_ids = np.take_along_axis(candidate_ids, order, axis=1)
+    # Slot tanpa kandidat mengikuti konvensi FAISS (id -1)
+    top_ids[~np.isfinite(top_scores)] = -1
+    return top_scores, top_ids
+
+class RerankedIndex:
+    """
+    Index kompak (SQ/PQ/IVF/HNSW) + re-rank exact dari matrix float32 memory-mapped.
+
+    Index mengambil `k * rerank_factor` kandidat, lalu skor kandidat dihitung ulang
+    dengan vektor float32 asli sehingga urutan & skor top-k setara index flat
+    selama tetangga sebenarnya ada di antara kandidat. Atribut lain (ntotal, d, ...)
+    diteruskan ke index FAISS di dalamnya.
+    """
+
+    def __init__(self, index, embeddings, rerank_factor=config.RERANK_FACTOR):
+        self.index = index
+        self.embeddings = embeddings
+        self.rerank_factor = rerank_factor
+
+    def search(self, queries, k, params=None):
+        queries = np.ascontiguousarray(queries, dtype='float32')
+        n_cand = min(k * self.rerank_factor, self.index.ntotal)
+        _, candidate_ids = self.index.search(queries, max(n_cand, k), params=params)
+        return rerank(queries, candidate_ids, self.embeddings, k)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def selector_params(index, bitmap):
+    """
+    SearchParameters FAISS dengan IDSelectorBitmap, mempertahankan nprobe/efSearch index.
+
+    Args:
+        bitmap (np.ndarray): Bitmap uint8 (bit ke-i = row id i), harus tetap hidup selama search.
+    """
+    sel = faiss.IDSelectorBitmap(bitmap.size, faiss.swig_ptr(bitmap))
+    index_type = get_index_type(index)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=faiss.extract_index_ivf(index).nprobe)
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=sel)
+
+def filtered_search(index, queries, k, rows, embeddings, brute_force_max=config.FILTER_BRUTE_FORCE_MAX):
+    """
+    Top-k hanya di antara `rows` (hasil filter metadata), tetap tepat k hasil.
+
+    Subset kecil dicari exact langsung dari matrix embedding (biaya sebanding
+    ukuran subset). Subset besar memakai IDSelectorBitmap FAISS; query yang
+    hasilnya kurang dari k (IVF/HNSW bisa kehabisan kandidat lolos filter)
+    dilengkapi dengan pencarian exact pada subset.
+
+    Args:
+        index (faiss.Index atau RerankedIndex): Index utama.
+        rows (np.ndarray): Row id terurut yang lolos filter.
+        embeddings (np.ndarray): Matrix embedding float32 (memmap).
+
+    Returns:
+        tuple: (scores, ids) berukuran (nq, k).
+    """
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    if len(rows) <= brute_force_max:
+        return exact_search(queries, embeddings, k, rows)
+
+    mask = np.zeros(index.ntotal, dtype=bool)
+    mask[rows] = True
+    bitmap = np.packbits(mask, bitorder='little')
+
+    faiss_index = index.index if isinstance(index, RerankedIndex) else index
+    scores, ids = index.search(queries, k, params=selector_params(faiss_index, bitmap))
+
+    short = (ids < 0).any(axis=1)
+    if short.any():
+        scores[short], ids[short] = exact_search(queries[short], embeddings, k, rows)
+    return scores, ids
+
+
+# 4. TUNING RECALL vs LATENCY
+
+def recall_at_k(approx_ids, exact_ids):
+    """
+    Recall@k: rata-rata irisan top-k hasil aproksimasi dengan top-k exact.
+    """
+    k = exact_ids.shape[1]
+    hits = [len(np.intersect1d(a, e)) for a, e in zip(approx_ids, exact_ids)]
+    return float(np.mean(hits)) / k
+
+def sample_queries(embeddings, n_queries, seed=0):
+    """
+    Sampel acak baris embedding sebagai query evaluasi recall.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(embeddings.shape[0], min(n_queries, embeddings.shape[0]), replace=False))
+    return np.ascontiguousarray(embeddings[rows], dtype='float32')
+
+def tune(k=10, n_queries=1000, target_recall=config.INDEX_TARGET_RECALL, seed=0):
+    """
+    Mengukur recall@k terhadap index flat (exact) untuk sweep nprobe/efSearch,
+    lalu menyimpan operating point tercepat yang memenuhi target recall.
+
+    Returns:
+        dict: Laporan tuning (juga ditulis ke config.INDEX_TUNING_FILE).
+    """
+    index = faiss.read_index(config.INDEX_FILE)
+    index_type = get_index_type(index)
+    if index_type not in TUNING_PARAMS:
+        print(f"ℹ️  Index {index_type} tidak memiliki parameter pencarian untuk di-tuning.")
+        return None
+
+    embeddings = np.load(config.EMBEDDINGS_FILE, mmap_mode='r')
+    queries = sample_queries(embeddings, n_queries, seed)
+
+    # Ground truth dari pencarian exact (brute force)
+    print(f"🎯 Menghitung ground truth exact untuk {len(queries)} query...")
+    _, exact_ids = exact_search(queries, embeddings, k)
+
+    param_name, values = TUNING_PARAMS[index_type]
+    sweep = []
+    for value in values:
+        apply_search_params(index, {param_name: value})
+        t0 = time.perf_counter()
+        _, approx_ids = index.search(queries, k)
+        elapsed = time.perf_counter() - t0
+
+        point = {
+            "params": {param_name: value},
+            "recall": recall_at_k(approx_ids, exact_ids),
+            "latency_ms": elapsed * 1000 / len(queries)
+        }
+        sweep.append(point)
+        print(f"   {param_name}={value:<4} recall@{k}={point['recall']:.4f}  {point['latency_ms']:.3f} ms/query")
+
+    # Pilih nilai terkecil (tercepat) yang memenuhi target, atau recall tertinggi
+    passing = [p for p in sweep if p["recall"] >= target_recall]
+    chosen = passing[0] if passing else max(sweep, key=lambda p: p["recall"])
+
+    report = {
+        "index_type": index_type,
+        "ntotal": int(index.ntotal),
+        "k": k,
+        "n_queries": len(queries),
+        "target_recall": target_recall,
+        "chosen": chosen,
+        "sweep": sweep
+    }
+    with open(config.INDEX_TUNING_FILE, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    status = "✅" if passing else "⚠️ Target tidak tercapai,"
+    print(f"{status} Operating point: {chosen['params']} "
+          f"(recall@{k}={chosen['recall']:.4f}, {chosen['latency_ms']:.3f} ms/query)")
+    print(f"💾 Hasil tuning disimpan ke: {config.INDEX_TUNING_FILE}")
+    if os.path.exists(config.NEIGHBOR_IDS_FILE):
+        print("💡 Graph tetangga lama tidak berlaku lagi, jalankan 'python neighbor_graph.py'.")
+    return report
+
+
+
+# 5. LAPORAN MEMORI & RECALL
+
+def storage_report(index=None, k=10, n_queries=1000, rerank_factor=config.RERANK_FACTOR,
+                   index_path=config.INDEX_FILE, embeddings_path=config.EMBEDDINGS_FILE,
+                   report_path=config.INDEX_REPORT_FILE, seed=0):
+    """
+    Mengukur ukuran index terhadap float32 penuh dan recall@k yang hilang akibat
+    kompresi/aproksimasi, dengan dan tanpa re-rank exact.
+
+    Args:
+        index (faiss.Index): Index yang sudah tersimpan di `index_path` (None = baca dari file).
+
+    Returns:
+        dict: Laporan (juga ditulis ke config.INDEX_REPORT_FILE).
+    """
+    if index is None:
+        index = load_index(index_path, rerank_factor=0)
+    index_type = get_index_type(index)
+    embeddings = np.load(embeddings_path, mmap_mode='r')
+
+    # Ukuran file index serialisasi ~ memori yang dipakai saat dimuat
+    index_bytes = os.path.getsize(index_path)
+    float32_bytes = embeddings.shape[0] * embeddings.shape[1] * 4
+
+    queries = sample_queries(embeddings, n_queries, seed)
+    _, exact_ids = exact_search(queries, embeddings, k)
+
+    _, approx_ids = index.search(queries, k)
+    recall = recall_at_k(approx_ids, exact_ids)
+
+    report = {
+        "index_type": index_type,
+        "ntotal": int(index.ntotal),
+        "d": int(index.d),
+        "index_bytes": index_bytes,
+        "float32_bytes": float32_bytes,
+        "compression": float32_bytes / index_bytes if index_bytes else 0.0,
+        "k": k,
+        "n_queries": len(queries),
+        "recall": recall,
+        "recall_loss": 1.0 - recall
+    }
+
+    if rerank_factor > 0 and index_type != "flat":
+        _, reranked_ids = RerankedIndex(index, embeddings, rerank_factor).search(queries, k)
+        report["rerank_factor"] = rerank_factor
+        report["recall_reranked"] = recall_at_k(reranked_ids, exact_ids)
+        report["recall_loss_reranked"] = 1.0 - report["recall_reranked"]
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    print(f"💽 Index {index_type}: {index_bytes / 2**20:.1f} MiB "
+          f"(float32 {float32_bytes / 2**20:.1f} MiB, {report['compression']:.2f}x lebih kecil)")
+    print(f"🎯 Recall@{k} vs exact: {recall:.4f} (hilang {report['recall_loss']:.4f})")
+    if "recall_reranked" in report:
+        print(f"🔁 Dengan re-rank {rerank_factor}x: recall@{k} {report['recall_reranked']:.4f} "
+              f"(hilang {report['recall_loss_reranked']:.4f})")
+    print(f"💾 Laporan index disimpan ke: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tuning recall/latency index FAISS.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    tune_parser = subparsers.add_parser("tune", help="Sweep nprobe/efSearch dan simpan operating point.")
+    tune_parser.add_argument("--k", type=int, default=10)
+    tune_parser.add_argument("--queries", type=int, default=1000)
+    tune_parser.add_argument("--target-recall", type=float, default=config.INDEX_TARGET_RECALL)
+
+    report_parser = subparsers.add_parser("report", help="Ukur memori index & recall yang hilang.")
+    report_parser.add_argument("--k", type=int, default=10)
+    report_parser.add_argument("--queries", type=int, default=1000)
+    report_parser.add_argument("--rerank-factor", type=int, default=config.RERANK_FACTOR)
+
+    args = parser.parse_args()
+    if args.command == "tune":
+        tune(k=args.k, n_queries=args.queries, target_recall=args.target_recall)
+    elif args.command == "report":
+        storage_report(k=args.k, n_queries=args.queries, rerank_factor=args.rerank_factor)
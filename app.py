@@ -1,6 +1,7 @@
 import streamlit as st
 import os
 import config
+import metrics
 from backend import RAGSystem
 import logging
 from transformers import logging as hf_logging
@@ -29,6 +30,9 @@ st.caption(f"Backend: {config.CLIP_MODEL_NAME} | {config.VLM_MODEL_NAME} | Cache
 
 @st.cache_resource
 def get_rag_system():
+    # Dijalankan sekali per proses (st.cache_resource), bukan di setiap rerun skrip
+    metrics.configure_logging()
+    metrics.set_role("app", instance=st.get_option("server.port"))
     try:
         return RAGSystem()
     except FileNotFoundError as e:
@@ -41,26 +45,39 @@ def get_rag_system():
 with st.spinner("Initializing System & Models... (Check ./models_cache folder)"):
     rag = get_rag_system()
 
+# Statistik cache embedding query (hit-rate) di sidebar
+cache_stats = rag.query_cache.stats()
+st.sidebar.caption(
+    f"Query cache: {cache_stats['entries']} entries | "
+    f"hit-rate {cache_stats['hit_rate'] * 100:.1f}% "
+    f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})"
+)
+
 
 # 3. LOGIKA TAMPILAN (DISPLAY LOGIC)
 
-def display_results(results):
+def more_like_this(image_path):
+    # Disimpan di session state agar hasil tetap tampil setelah Streamlit rerun
+    st.session_state["more_like"] = image_path
+
+def clear_more_like():
+    # Pencarian utama baru (atau tombol tutup) menggantikan hasil "More like" sebelumnya
+    st.session_state.pop("more_like", None)
+
+def display_results(results, key_prefix="main"):
     if results:
         best = results[0]
         c1, c2 = st.columns([1, 1.5])
 
         with c1:
             # PERBAIKAN: Menggunakan width='stretch' sesuai standar Streamlit 2025
-            st.image(best['path'], caption=f"Top Result: {best['label']}", width="stretch")
+            st.image(rag.result_image(best['path']), caption=f"Top Result: {best['label']}", width="stretch")
             st.metric("Similarity Score", f"{best['score']:.4f}")
 
         with c2:
             st.subheader("🤖 Qwen2-VL Description:")
-            with st.spinner("Generating explanation..."):
-                # Mengirim label sebagai konteks agar deskripsi lebih akurat
-                desc = rag.generate_description(best['path'], best['label'])
-            st.success(desc)
 
+        # Hasil retrieval ditampilkan dulu, tanpa menunggu proses generasi
         if len(results) > 1:
             st.divider()
             st.write("### Similar Images:")
@@ -68,8 +85,15 @@ def display_results(results):
             for i, res in enumerate(results[1:]):
                 with cols[i]:
                     # PERBAIKAN: Menggunakan width='stretch' di galeri juga
-                    st.image(res['path'], width="stretch")
+                    st.image(rag.result_image(res['path']), width="stretch")
                     st.caption(f"**{res['label']}**\n({res['score']:.2f})")
+                    # Gambar ter-index dicari dari graph tetangga (tanpa encode ulang)
+                    st.button("More like this", key=f"{key_prefix}_more_{i}",
+                              on_click=more_like_this, args=(res['path'],))
+
+        with c2:
+            # Deskripsi di-stream token demi token (label sebagai konteks agar lebih akurat)
+            st.write_stream(rag.generate_description_stream(best['path'], best['label']))
     else:
         st.warning("No results found.")
 
@@ -82,24 +106,25 @@ with tab1:
     text_query = st.text_input("Describe what you are looking for...",
                                placeholder="e.g., A golden retriever playing in the grass")
 
-    if st.button("Search Text", key="btn_txt"):
+    if st.button("Search Text", key="btn_txt", on_click=clear_more_like):
         if text_query:
-            results = rag.search(text_query)
+            results = rag.search(text_query, query_type="text")
             display_results(results)
 
 with tab2:
-    uploaded = st.file_uploader("Upload reference image", type=['jpg', 'png', 'jpeg'])
+    uploaded = st.file_uploader("Upload reference image", type=['jpg', 'png', 'jpeg'], on_change=clear_more_like)
     if uploaded:
         st.image(uploaded, width=250, caption="Your Input")
-        if st.button("Search Similar Images", key="btn_img"):
-            # Save temp file untuk diproses backend
-            os.makedirs("save", exist_ok=True)
-            temp_path = os.path.join("save", "temp_query.jpg")
-            with open(temp_path, "wb") as f:
-                f.write(uploaded.getbuffer())
-
-            results = rag.search(temp_path)
+        if st.button("Search Similar Images", key="btn_img", on_click=clear_more_like):
+            # Byte upload langsung dikirim ke backend (tanpa file sementara di disk)
+            results = rag.search(uploaded.getvalue(), query_type="image")
             display_results(results)
 
+if st.session_state.get("more_like"):
+    st.divider()
+    st.write(f"### More like: {os.path.basename(st.session_state['more_like'])}")
+    st.button("✖ Close", key="btn_close_similar", on_click=clear_more_like)
+    display_results(rag.search(st.session_state["more_like"], query_type="image"), key_prefix="similar")
+
 st.divider()
 st.markdown("<center><small>Final Project RAG System</small></center>", unsafe_allow_html=True)
\ No newline at end of file
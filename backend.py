@@ -1,20 +1,553 @@
+import io
 import os
 import json
 import logging
+import threading
+from contextlib import contextmanager, closing
 import torch
 import faiss
 import numpy as np
 from PIL import Image
-from sentence_transformers import SentenceTransformer
-from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+from transformers import Qwen2VLForConditionalGeneration, AutoProcessor, TextIteratorStreamer
+from transformers import StoppingCriteria, StoppingCriteriaList
 from transformers import logging as hf_logging
 
 # Import konfigurasi lokal
 import config
+from metadata_store import open_metadata, metadata_exists
+from ann_index import load_index, filtered_search
+from class_router import ClassRouter
+from image_store import open_image_store
+from neighbor_graph import open_neighbor_graph
+from query_cache import EmbeddingCache, text_key, image_key
+from description_cache import DescriptionCache
+from vision_cache import VisionFeatureCache
+from clip_encoder import load_encoder, encoder_name, encode_image_batch
+import metrics
 
 # Konfigurasi Logging: Menekan pesan warning yang tidak kritikal
 hf_logging.set_verbosity_error()
 
+def build_prompt(label):
+    """
+    Prompt deskripsi dengan konteks label hasil retrieval (RAG).
+    """
+    return f"Describe this image in detail. The image category is '{label}'."
+
+# Tipe query untuk dispatch eksplisit pada search/search_batch
+QUERY_TEXT = "text"
+QUERY_IMAGE = "image"
+
+def detect_query_type(query):
+    """
+    Deteksi otomatis tipe query (dipakai jika query_type tidak diberikan).
+
+    String dianggap path gambar hanya jika file-nya ada (perilaku lama),
+    selain itu dianggap teks. Bytes, file-like, PIL Image, dan np.ndarray selalu gambar.
+    """
+    if isinstance(query, str):
+        return QUERY_IMAGE if os.path.exists(query) else QUERY_TEXT
+    return QUERY_IMAGE
+
+def load_query_image(query):
+    """
+    Mengubah query gambar in-memory atau path menjadi PIL Image RGB tanpa file sementara.
+
+    Args:
+        query: PIL Image, np.ndarray uint8 (HxW atau HxWxC), bytes/bytearray/memoryview,
+            objek file-like (misal UploadedFile Streamlit), atau path file.
+
+    Returns:
+        PIL.Image.Image: Gambar RGB.
+    """
+    if isinstance(query, Image.Image):
+        return query.convert('RGB')
+    if isinstance(query, np.ndarray):
+        return Image.fromarray(np.ascontiguousarray(query, dtype=np.uint8)).convert('RGB')
+    if isinstance(query, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(query)).convert('RGB')
+    if hasattr(query, 'read'):
+        if hasattr(query, 'seek'):
+            query.seek(0)
+        return Image.open(query).convert('RGB')
+    if isinstance(query, str):
+        return Image.open(query).convert('RGB')
+    raise TypeError(f"Tipe query gambar tidak didukung: {type(query).__name__}")
+
+# Awalan pesan error generasi (dikembalikan sebagai teks agar UI tetap berjalan)
+GENERATION_ERROR_PREFIX = "Error generating description: "
+
+def generation_error(e):
+    metrics.inc("generation_errors_total", help_text="Jumlah deskripsi yang gagal digenerasi.")
+    metrics.log_event("generation_error", error=str(e))
+    return f"{GENERATION_ERROR_PREFIX}{str(e)}"
+
+def is_generation_error(text):
+    return text.startswith(GENERATION_ERROR_PREFIX)
+
+def record_description_cache(hit):
+    metrics.inc("description_cache_lookups_total", labels={"result": "hit" if hit else "miss"},
+                help_text="Lookup cache deskripsi.")
+
+def resolve_vlm_profile(name=None):
+    """
+    Menentukan profil inferensi Qwen2-VL dari `config.VLM_PROFILES`.
+
+    Args:
+        name (str): Nama profil; None = `config.VLM_PROFILE` ("auto" dipilih menurut DEVICE).
+
+    Returns:
+        tuple: (nama profil, dict pengaturan profil).
+    """
+    name = name or config.VLM_PROFILE
+    if name == "auto":
+        name = "cpu_bf16" if config.DEVICE == "cpu" else "default"
+    if name not in config.VLM_PROFILES:
+        raise ValueError(f"Profil VLM tidak dikenal: {name}. Pilihan: {', '.join(config.VLM_PROFILES)}")
+    return name, config.VLM_PROFILES[name]
+
+def generation_settings(profile=None):
+    """
+    Pengaturan generasi yang memengaruhi output (dipakai sebagai bagian kunci cache).
+    """
+    _, settings = resolve_vlm_profile(profile)
+    return {
+        "model": config.VLM_MODEL_NAME,
+        "max_new_tokens": settings["max_new_tokens"],
+        "dtype": settings["dtype"],
+        "min_pixels": settings["min_pixels"],
+        "max_pixels": settings["max_pixels"]
+    }
+
+def apply_thread_settings(profile=None):
+    """
+    Menerapkan jumlah thread torch profil VLM ke proses ini.
+
+    Thread torch berlaku per proses dan interop hanya bisa diatur sebelum ada kerja
+    paralel, sehingga fungsi ini sebaiknya dipanggil saat startup (sebelum CLIP dimuat).
+    Pemanggilan ulang aman; jika interop sudah terkunci, nilai lama dipakai dengan peringatan.
+    """
+    name, settings = resolve_vlm_profile(profile)
+    if settings["num_threads"] > 0:
+        torch.set_num_threads(settings["num_threads"])
+    if settings["interop_threads"] > 0 and torch.get_num_interop_threads() != settings["interop_threads"]:
+        try:
+            torch.set_num_interop_threads(settings["interop_threads"])
+        except RuntimeError:
+            actual = torch.get_num_interop_threads()
+            print(f"⚠️ interop_threads={settings['interop_threads']} tidak bisa diterapkan, "
+                  f"tetap memakai {actual}. Set VLM_LAZY_LOAD = False agar diterapkan saat startup.")
+            metrics.log_event(
+                "vlm_interop_threads_ignored",
+                profile=name, requested=settings["interop_threads"], actual=actual
+            )
+
+# Nama dtype profil -> dtype torch saat memuat bobot (int8 dimuat float32 lalu dikuantisasi)
+TORCH_DTYPES = {
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+    "float32": torch.float32,
+    "int8": torch.float32
+}
+
+# Penanda posisi label pada template chat yang dirender sekali
+PROMPT_LABEL_SLOT = "<<label>>"
+
+# Jumlah maksimum entri token prompt yang disimpan (satu per label & jumlah token visual)
+PROMPT_CACHE_SIZE = 4096
+
+class CachedVisionTower(torch.nn.Module):
+    """
+    Pembungkus vision tower Qwen2-VL.
+
+    Di dalam `use_features(...)`, pemanggilan tower oleh model mengembalikan fitur
+    yang sudah dihitung/di-cache (per thread), sehingga `generate` langsung mulai
+    dari prefill teks. Di luar itu tower berjalan seperti biasa.
+    """
+
+    def __init__(self, tower):
+        super().__init__()
+        self.tower = tower
+        self.local = threading.local()
+
+    def __getattr__(self, name):
+        # Atribut lain (dtype, get_dtype, spatial_merge_size, ...) diteruskan ke tower asli
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            return getattr(self.tower, name)
+
+    @contextmanager
+    def use_features(self, features):
+        self.local.features = features
+        try:
+            yield
+        finally:
+            self.local.features = None
+
+    def forward(self, pixel_values, grid_thw=None, **kwargs):
+        features = getattr(self.local, "features", None)
+        if features is not None:
+            return features.to(self.tower.dtype)
+        return self.tower(pixel_values, grid_thw=grid_thw, **kwargs)
+
+class StopOnEvent(StoppingCriteria):
+    """
+    Menghentikan `generate` setelah token saat ini jika `event` di-set (misal stream ditutup).
+    """
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class VLMGenerator:
+    """
+    Komponen generatif (Qwen2-VL) yang terpisah dari retrieval.
+
+    Dapat dibuat sendiri (misal di proses/worker terpisah) sehingga kapasitas
+    generasi bisa di-scale tanpa ikut memuat CLIP & index FAISS.
+    """
+
+    def __init__(self, profile=None):
+        """
+        Args:
+            profile (str): Nama profil di `config.VLM_PROFILES` (None = `config.VLM_PROFILE`).
+        """
+        self.profile_name, self.profile = resolve_vlm_profile(profile)
+        print(f"⏳ Loading Qwen2-VL Model (Vision-Language Model), profil: {self.profile_name}...")
+
+        apply_thread_settings(self.profile_name)
+
+        # Batas resolusi image processor (None = bawaan model)
+        pixel_limits = {
+            key: self.profile[key] for key in ("min_pixels", "max_pixels") if self.profile[key] is not None
+        }
+        self.processor = AutoProcessor.from_pretrained(
+            config.VLM_MODEL_NAME,
+            cache_dir=config.MODELS_CACHE_DIR,
+            use_fast=True,
+            **pixel_limits
+        )
+        # Left padding wajib untuk generasi ber-batch pada model decoder-only
+        self.processor.tokenizer.padding_side = "left"
+
+        # Profil default: float16 untuk efisiensi memori GPU; profil CPU: bfloat16 atau int8
+        self.vlm_model = Qwen2VLForConditionalGeneration.from_pretrained(
+            config.VLM_MODEL_NAME,
+            torch_dtype=TORCH_DTYPES[self.profile["dtype"]],
+            device_map=self.profile["device_map"],
+            cache_dir=config.MODELS_CACHE_DIR
+        )
+        if self.profile["dtype"] == "int8":
+            # Kuantisasi dinamis: bobot nn.Linear int8, aktivasi dikuantisasi saat runtime (CPU)
+            # inplace=True: tanpa ini seluruh model fp32 disalin dulu (memori puncak 2x)
+            self.vlm_model = torch.ao.quantization.quantize_dynamic(
+                self.vlm_model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+
+        # Vision tower dibungkus agar fitur visual dari cache bisa langsung dipakai generate
+        owner = self.vlm_model.model if hasattr(self.vlm_model.model, "visual") else self.vlm_model
+        self.vision_tower = CachedVisionTower(owner.visual)
+        owner.visual = self.vision_tower
+
+        # Token id prompt per (label, jumlah token visual); template chat hanya dirender sekali
+        self.image_token = getattr(self.processor, "image_token", "<|image_pad|>")
+        self.prompt_template = self.build_chat_text(None, PROMPT_LABEL_SLOT)
+        self.prompt_cache = {}
+
+        self.vision_cache = None
+        if config.VISION_CACHE_ENABLED and metadata_exists():
+            self.vision_cache = VisionFeatureCache(open_metadata(), self.vision_settings())
+
+        print("✅ Qwen2-VL Siap Digunakan!")
+
+    def vision_settings(self):
+        """
+        Pengaturan yang memengaruhi fitur visual (kunci validitas cache fitur).
+        """
+        image_processor = self.processor.image_processor
+        return {
+            "model": config.VLM_MODEL_NAME,
+            "min_pixels": getattr(image_processor, "min_pixels", None),
+            "max_pixels": getattr(image_processor, "max_pixels", None),
+            "dtype": self.profile["dtype"]
+        }
+
+    def build_chat_text(self, image, label):
+        """
+        Menyusun teks chat-template (dengan placeholder gambar) untuk satu input.
+        """
+        # Prompt Engineering: Memberikan konteks kategori untuk hasil lebih akurat
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image", "image": image},
+                    {"type": "text", "text": build_prompt(label)},
+                ],
+            }
+        ]
+        return self.processor.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+
+    def visual_features(self, images, rows=None):
+        """
+        Fitur visual (output vision tower) per gambar, dibaca dari cache jika tersedia.
+
+        Gambar yang belum ada di cache diproses dalam satu pemanggilan image
+        processor + vision tower, lalu disimpan ke cache jika merupakan baris index.
+
+        Args:
+            images (list): Daftar PIL Image RGB (boleh None untuk baris yang sudah ada di cache).
+            rows (list): Row id index per gambar (None = bukan gambar ter-index).
+
+        Returns:
+            list: Tuple (features [T, H], grid_thw [3]) per gambar.
+        """
+        rows = rows if rows is not None else [None] * len(images)
+        outputs = [None] * len(images)
+        misses = []
+        for pos, row in enumerate(rows):
+            cached = self.vision_cache.get(row) if self.vision_cache is not None else None
+            if cached is not None:
+                outputs[pos] = (torch.from_numpy(cached[0]), torch.from_numpy(cached[1]))
+            else:
+                misses.append(pos)
+
+        metrics.inc("vision_cache_lookups_total", len(outputs) - len(misses), labels={"result": "hit"},
+                    help_text="Lookup cache fitur visual Qwen2-VL.")
+        metrics.inc("vision_cache_lookups_total", len(misses), labels={"result": "miss"})
+        if not misses:
+            return outputs
+
+        with metrics.timer("vlm_vision_encode", items=len(misses)):
+            processed = self.processor.image_processor(images=[images[pos] for pos in misses], return_tensors="pt")
+            grid_thw = processed["image_grid_thw"]
+            with torch.no_grad():
+                features = self.vision_tower.tower(
+                    processed["pixel_values"].to(self.vision_tower.device, self.vision_tower.dtype),
+                    grid_thw=grid_thw.to(self.vision_tower.device)
+                )
+
+        merge = self.processor.image_processor.merge_size ** 2
+        sizes = (grid_thw.prod(-1) // merge).tolist()
+        for pos, feats, grid in zip(misses, torch.split(features, sizes), grid_thw):
+            outputs[pos] = (feats, grid)
+            if self.vision_cache is not None and rows[pos] is not None:
+                self.vision_cache.put(rows[pos], feats.float().cpu().numpy(), grid.numpy())
+        return outputs
+
+    def prompt_ids(self, label, num_image_tokens):
+        """
+        Token id prompt lengkap untuk satu label (template chat sudah dirender sekali).
+        """
+        key = (label, num_image_tokens)
+        ids = self.prompt_cache.get(key)
+        if ids is None:
+            text = self.prompt_template.replace(PROMPT_LABEL_SLOT, label).replace(
+                self.image_token, self.image_token * num_image_tokens
+            )
+            ids = self.processor.tokenizer(text)["input_ids"]
+            if len(self.prompt_cache) < PROMPT_CACHE_SIZE:
+                self.prompt_cache[key] = ids
+        return ids
+
+    def prepare_feature_inputs(self, features, labels):
+        """
+        Input generate dari fitur visual yang sudah jadi: token id prompt (padding kiri)
+        dan grid gambar. Vision tower tidak dijalankan lagi saat prefill.
+        """
+        ids = [self.prompt_ids(label, feats.shape[0]) for (feats, _), label in zip(features, labels)]
+        length = max(len(seq) for seq in ids)
+        pad_id = self.processor.tokenizer.pad_token_id
+
+        input_ids = torch.full((len(ids), length), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(ids), length), dtype=torch.long)
+        for i, seq in enumerate(ids):
+            input_ids[i, length - len(seq):] = torch.tensor(seq, dtype=torch.long)
+            attention_mask[i, length - len(seq):] = 1
+
+        device = self.vlm_model.device
+        return {
+            "input_ids": input_ids.to(device),
+            "attention_mask": attention_mask.to(device),
+            # Placeholder: model hanya memanggil vision tower jika pixel_values tidak None
+            "pixel_values": torch.zeros((1, 1), device=device),
+            "image_grid_thw": torch.stack([grid for _, grid in features]).to(device)
+        }
+
+    def generate_from_features(self, features, inputs, **generate_kwargs):
+        """
+        Menjalankan `generate` dengan fitur visual yang disuntikkan ke vision tower.
+        """
+        generate_kwargs.setdefault("max_new_tokens", self.profile["max_new_tokens"])
+        embeds = torch.cat([feats.to(self.vision_tower.device) for feats, _ in features])
+        with self.vision_tower.use_features(embeds):
+            return self.vlm_model.generate(**inputs, **generate_kwargs)
+
+    def generate_batch(self, images, labels, rows=None):
+        """
+        Menjalankan satu pemanggilan `generate` untuk beberapa gambar sekaligus.
+
+        Args:
+            images (list): Daftar PIL Image RGB (boleh None untuk baris yang sudah ada di cache).
+            labels (list): Label kelas untuk tiap gambar.
+            rows (list): Row id index per gambar (opsional, untuk cache fitur visual).
+
+        Returns:
+            list: Deskripsi per gambar (urutan sama dengan input).
+        """
+        features = self.visual_features(images, rows)
+        inputs = self.prepare_feature_inputs(features, labels)
+
+        # Proses Generasi (Inference)
+        generated_ids = self.generate_from_features(features, inputs)
+
+        # Post-processing Output (Decoding)
+        generated_ids_trimmed = generated_ids[:, inputs["input_ids"].shape[1]:]
+        return self.processor.batch_decode(
+            generated_ids_trimmed,
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=False
+        )
+
+    def cached_input(self, image_path):
+        """
+        (image, row) untuk satu path: gambar tidak dibuka jika fiturnya sudah ada di cache.
+        """
+        row = self.vision_cache.row_for_path(image_path) if self.vision_cache is not None else None
+        if row is not None and self.vision_cache.get(row) is not None:
+            return None, row
+        return Image.open(image_path).convert("RGB"), row
+
+    def describe(self, image_path, label):
+        """
+        Menghasilkan deskripsi visual menggunakan model Qwen2-VL.
+
+        Args:
+            image_path (str): Lokasi file gambar.
+            label (str): Label kelas (sebagai konteks tambahan prompt).
+
+        Returns:
+            str: Deskripsi teks yang dihasilkan model.
+
+        Raises:
+            Exception: Jika gambar gagal dibaca atau generasi gagal.
+        """
+        image, row = self.cached_input(image_path)
+        return self.generate_batch([image], [label], [row])[0]
+
+    def describe_stream(self, image_path, label):
+        """
+        Versi streaming dari `describe`: menghasilkan potongan teks selagi token dibuat.
+
+        `generate` berjalan di thread terpisah dan menulis ke TextIteratorStreamer,
+        sehingga pemanggil bisa menampilkan token pertama tanpa menunggu 200 token.
+        Jika pemanggil berhenti membaca (generator ditutup, misal rerun Streamlit),
+        `generate` dihentikan pada token berikutnya lewat StoppingCriteria.
+
+        Yields:
+            str: Potongan teks deskripsi.
+
+        Raises:
+            Exception: Jika gambar gagal dibaca atau generasi gagal.
+        """
+        image, row = self.cached_input(image_path)
+        features = self.visual_features([image], [row])
+        inputs = self.prepare_feature_inputs(features, [label])
+
+        streamer = TextIteratorStreamer(
+            self.processor.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=False
+        )
+        errors = []
+        stop = threading.Event()
+
+        def run_generate():
+            try:
+                self.generate_from_features(
+                    features, inputs, streamer=streamer, stopping_criteria=StoppingCriteriaList([StopOnEvent(stop)])
+                )
+            except Exception as e:
+                # Tutup streamer agar loop pembaca tidak menunggu selamanya
+                errors.append(e)
+                streamer.end()
+
+        thread = threading.Thread(target=run_generate, daemon=True)
+        thread.start()
+        try:
+            for chunk in streamer:
+                if chunk:
+                    yield chunk
+        finally:
+            # Selesai normal: tidak berpengaruh. Ditutup di tengah: generate berhenti
+            # sehingga rerun tidak menumpuk beberapa generate pada model yang sama.
+            stop.set()
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def describe_batch(self, items, batch_size=config.VLM_GENERATION_BATCH_SIZE):
+        """
+        Menghasilkan deskripsi untuk banyak gambar dengan pemanggilan `generate` ber-batch.
+
+        Error ditangani per item: gambar yang gagal dibaca tidak ikut batch, dan
+        jika satu batch gagal, item di dalamnya diulang satu per satu sehingga
+        satu input bermasalah tidak menggagalkan seluruh batch.
+
+        Args:
+            items (list): Daftar tuple [(image_path, label), ...].
+            batch_size (int): Jumlah gambar per pemanggilan `generate`.
+
+        Returns:
+            list: Deskripsi atau pesan error generasi per item.
+        """
+        outputs = [None] * len(items)
+        valid = []
+
+        # A. Load gambar per item (dilewati jika fitur visualnya sudah ada di cache)
+        for pos, (image_path, label) in enumerate(items):
+            try:
+                image, row = self.cached_input(image_path)
+                valid.append((pos, image, row, label))
+            except Exception as e:
+                outputs[pos] = generation_error(e)
+
+        # B. Generasi per batch, fallback per item jika batch gagal
+        for start in range(0, len(valid), batch_size):
+            chunk = valid[start : start + batch_size]
+            try:
+                texts = self.generate_batch(
+                    [img for _, img, _, _ in chunk], [lbl for _, _, _, lbl in chunk], [row for _, _, row, _ in chunk]
+                )
+                for (pos, _, _, _), text in zip(chunk, texts):
+                    outputs[pos] = text
+            except Exception:
+                for pos, img, row, lbl in chunk:
+                    try:
+                        outputs[pos] = self.generate_batch([img], [lbl], [row])[0]
+                    except Exception as e:
+                        outputs[pos] = generation_error(e)
+
+        return outputs
+
+    def generate_description(self, image_path, label):
+        """
+        Versi `describe` yang tidak melempar exception (pesan error dikembalikan sebagai teks).
+        """
+        try:
+            return self.describe(image_path, label)
+        except Exception as e:
+            return generation_error(e)
+
+
 class RAGSystem:
     """
     Sistem utama Retrieval-Augmented Generation (RAG) yang menangani:
@@ -22,15 +555,29 @@ class RAGSystem:
     2. Pemuatan Database Vektor (FAISS).
     3. Proses Pencarian (Retrieval).
     4. Proses Generasi Deskripsi (Generation).
+
+    Qwen2-VL tidak dimuat saat inisialisasi (kecuali `config.VLM_LAZY_LOAD = False`),
+    melainkan saat `generate_description` pertama kali dipanggil.
+    Dengan `retrieval_only=True` model generatif tidak pernah dimuat.
     """
 
-    def __init__(self):
+    def __init__(self, retrieval_only=False, generator=None):
+        """
+        Args:
+            retrieval_only (bool): Hanya memuat CLIP & FAISS (tanpa Qwen2-VL).
+            generator (VLMGenerator): Instance generator yang sudah ada (opsional, bisa dibagi).
+        """
         print("🛠️  Inisialisasi RAG System...")
 
+        # Qwen2-VL dimuat saat startup: thread profilnya diterapkan sebelum CLIP dimuat
+        # (interop tidak bisa diubah setelahnya). Proses yang tidak memuat VLM tidak diubah.
+        if not retrieval_only and generator is None and not config.VLM_LAZY_LOAD:
+            apply_thread_settings()
+
         # ---------------------------------------------------------
         # 1. Validasi Keberadaan Database
         # ---------------------------------------------------------
-        if not os.path.exists(config.INDEX_FILE) or not os.path.exists(config.METADATA_FILE):
+        if not os.path.exists(config.INDEX_FILE) or not metadata_exists():
             raise FileNotFoundError(
                 "❌ Database Vector belum ditemukan! Harap jalankan 'indexer.py' terlebih dahulu."
             )
@@ -39,71 +586,165 @@ class RAGSystem:
         # 2. Memuat Model Retrieval (CLIP)
         # ---------------------------------------------------------
         # Digunakan untuk mengubah query (teks/gambar) menjadi vektor.
-        self.clip_model = SentenceTransformer(
-            config.CLIP_MODEL_NAME,
-            device=config.DEVICE,
-            cache_folder=config.MODELS_CACHE_DIR
-        )
+        # Backend (PyTorch / ONNX Runtime) mengikuti config.CLIP_BACKEND.
+        self.clip_model, self.clip_backend = load_encoder()
 
         # ---------------------------------------------------------
         # 3. Memuat Index FAISS & Metadata
         # ---------------------------------------------------------
         # FAISS untuk pencarian vektor cepat, Metadata untuk info label/path.
-        self.index = faiss.read_index(config.INDEX_FILE)
+        # Metadata di-memory-map dan baris dibaca lazy saat search.
+        # Operating point (nprobe/efSearch) hasil tuning diterapkan otomatis.
+        self.index = load_index(config.INDEX_FILE)
+        self.metadata = open_metadata()
+
+        # Matrix embedding float32 (memmap) untuk pencarian exact pada subset hasil filter
+        self.embeddings = (
+            np.load(config.EMBEDDINGS_FILE, mmap_mode='r') if os.path.exists(config.EMBEDDINGS_FILE) else None
+        )
+
+        # Piksel dataset ter-pack (memmap) untuk menampilkan hasil tanpa decode file per gambar
+        self.image_store = open_image_store()
+
+        # Graph tetangga top-K: gambar yang sudah ter-index dicari dengan membaca tabel
+        self.neighbor_graph = open_neighbor_graph(self.index.ntotal)
+
+        # Router kelas (centroid & label words.txt): routing search dua tahap & prediksi label zero-shot
+        self.router = ClassRouter(self.metadata) if ClassRouter.exists(encoder_name(self.clip_backend)) else None
+        self.use_router = config.ROUTER_ENABLED and self.router is not None
 
-        with open(config.METADATA_FILE, 'r') as f:
-            self.metadata = json.load(f)
+        # Cache embedding query (LRU), opsional dipersistenkan ke disk
+        self.query_cache = EmbeddingCache(
+            max_entries=config.QUERY_CACHE_SIZE,
+            persist_path=config.QUERY_CACHE_FILE if config.QUERY_CACHE_PERSIST else None,
+            model_name=encoder_name(self.clip_backend)
+        )
+
+        # Cache deskripsi persisten (SQLite), dibagi antar proses aplikasi
+        self.description_cache = DescriptionCache()
 
         # ---------------------------------------------------------
-        # 4. Memuat Model Generative (Qwen2-VL)
+        # 4. Model Generative (Qwen2-VL) - Lazy Loading
         # ---------------------------------------------------------
-        # Diload terakhir karena memakan VRAM paling besar.
-        print("⏳ Loading Qwen2-VL Model (Vision-Language Model)...")
+        # Memakan memori paling besar, sehingga hanya dimuat jika dibutuhkan.
+        self.retrieval_only = retrieval_only
+        self._generator = generator
+        self._generator_lock = threading.Lock()
 
-        self.processor = AutoProcessor.from_pretrained(
-            config.VLM_MODEL_NAME,
-            cache_dir=config.MODELS_CACHE_DIR,
-            use_fast=True
-        )
+        if not retrieval_only and not config.VLM_LAZY_LOAD:
+            self.get_generator()
 
-        # Menggunakan torch_dtype=float16 untuk efisiensi memori GPU
-        self.vlm_model = Qwen2VLForConditionalGeneration.from_pretrained(
-            config.VLM_MODEL_NAME,
-            torch_dtype=torch.float16,
-            device_map="auto",
-            cache_dir=config.MODELS_CACHE_DIR
-        )
+        mode = "Retrieval-Only" if retrieval_only else "Retrieval + Generation"
+        print(f"✅ Sistem RAG Siap Digunakan! (Mode: {mode})")
 
-        print("✅ Sistem RAG Siap Digunakan!")
+    def get_generator(self):
+        """
+        Mengembalikan VLMGenerator, memuatnya terlebih dahulu jika belum ada.
 
-    def search(self, query, top_k=config.TOP_K):
+        Raises:
+            RuntimeError: Jika sistem berjalan dalam mode retrieval-only.
         """
-        Melakukan pencarian gambar berdasarkan query teks atau gambar input.
+        if self.retrieval_only:
+            raise RuntimeError("RAGSystem berjalan dalam mode retrieval-only (tanpa Qwen2-VL).")
+
+        # Double-checked locking: beberapa sesi Streamlit bisa memanggil bersamaan
+        if self._generator is None:
+            with self._generator_lock:
+                if self._generator is None:
+                    self._generator = VLMGenerator()
+        return self._generator
+
+    def generation_settings(self):
+        """
+        Pengaturan generasi untuk kunci cache deskripsi, sesuai profil generator yang dipakai.
+        """
+        return generation_settings(self._generator.profile_name if self._generator is not None else None)
+
+    def load_image(self, query):
+        """
+        `load_query_image`, tetapi path yang sudah di-pack dibaca dari image store (tanpa decode file).
+        """
+        if isinstance(query, str) and self.image_store is not None:
+            row = self.image_store.lookup_current(query)
+            if row is not None:
+                return self.image_store.image(row)
+        return load_query_image(query)
+
+    def encode_queries(self, queries, query_types=None):
+        """
+        Meng-encode campuran query teks & gambar dalam forward pass ber-batch.
+
+        Query yang sudah ada di cache embedding tidak di-encode ulang. Sisanya,
+        semua gambar di-encode dalam satu batch dan semua teks dalam satu batch,
+        lalu disusun kembali sesuai urutan input.
 
         Args:
-            query (str): Path file gambar ATAU string teks pencarian.
-            top_k (int): Jumlah hasil teratas yang diambil.
+            queries (list): Campuran query teks & gambar (lihat `load_query_image`).
+            query_types (list): Tipe eksplisit per query ("text"/"image"/None = deteksi otomatis).
 
         Returns:
-            list: Daftar dictionary berisi path gambar, label, dan skor kemiripan.
+            np.ndarray: Matrix embedding float32 [len(queries), D] ter-normalisasi L2.
         """
-        # A. Deteksi Tipe Query
-        # Jika query adalah string path file yang valid -> Image Search
-        if isinstance(query, str) and os.path.exists(query):
-            img = Image.open(query).convert('RGB')
-            query_emb = self.clip_model.encode([img], convert_to_numpy=True)
-        # Jika query adalah teks biasa -> Text Search
-        else:
-            query_emb = self.clip_model.encode([query], convert_to_numpy=True)
+        cached = {}
+        image_pos, images, image_keys = [], [], []
+        text_pos, texts, text_keys = [], [], []
+
+        if query_types is None:
+            query_types = [None] * len(queries)
+
+        # A. Deteksi Tipe Query & Lookup Cache
+        for pos, (query, query_type) in enumerate(zip(queries, query_types)):
+            if (query_type or detect_query_type(query)) == QUERY_IMAGE:
+                img = self.load_image(query)
+            else:
+                img = None
 
-        # B. Normalisasi & Pencarian Vektor
-        faiss.normalize_L2(query_emb)
-        scores, indices = self.index.search(query_emb, top_k)
+            key = text_key(query) if img is None else image_key(img)
+            emb = self.query_cache.get(key)
+            metrics.inc("query_cache_lookups_total", labels={"result": "hit" if emb is not None else "miss"},
+                        help_text="Lookup cache embedding query.")
+            if emb is not None:
+                cached[pos] = emb
+            elif img is None:
+                text_pos.append(pos)
+                texts.append(query)
+                text_keys.append(key)
+            else:
+                image_pos.append(pos)
+                images.append(img)
+                image_keys.append(key)
 
-        # C. Format Output
+        # B. Encoding Ber-batch per Modalitas (hanya cache miss)
+        encoded = {}
+        for modality, positions, inputs, keys in (
+            ("image", image_pos, images, image_keys), ("text", text_pos, texts, text_keys)
+        ):
+            if not inputs:
+                continue
+            with metrics.timer("clip_encode", {"modality": modality}, items=len(inputs)):
+                if modality == "image":
+                    # Preprocessing ber-batch (tensor) jika aktif & lolos cek (fast_preprocess_enabled)
+                    emb = encode_image_batch(self.clip_model, inputs)
+                else:
+                    emb = self.clip_model.encode(inputs, convert_to_numpy=True, show_progress_bar=False)
+
+            # C. Normalisasi L2 (Cosine Similarity)
+            faiss.normalize_L2(emb)
+            for pos, key, row in zip(positions, keys, emb):
+                self.query_cache.put(key, row)
+                encoded[pos] = row
+
+        rows = {**cached, **encoded}
+        return np.stack([rows[pos] for pos in range(len(queries))]).astype('float32')
+
+    def format_results(self, scores, indices):
+        """
+        Mengubah satu baris hasil FAISS (skor & row id) menjadi daftar hasil.
+        """
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.metadata):
+        for score, idx in zip(scores, indices):
+            # Index aproksimasi (IVF) dapat mengembalikan -1 jika kandidat kurang dari top_k
+            if 0 <= idx < len(self.metadata):
                 item = self.metadata[idx]
                 results.append({
                     "path": item['path'],
@@ -112,9 +753,133 @@ class RAGSystem:
                 })
         return results
 
+    def search_batch(self, queries, top_k=config.TOP_K, query_types=None,
+                     class_ids=None, split=None, path_prefix=None):
+        """
+        Melakukan pencarian untuk banyak query sekaligus (satu pemanggilan FAISS).
+
+        Args:
+            queries (list): Campuran teks, path gambar, bytes, file-like, PIL Image, atau np.ndarray.
+            top_k (int): Jumlah hasil teratas yang diambil per query.
+            query_types (list): Tipe eksplisit per query ("text"/"image"/None = deteksi otomatis).
+            class_ids (list): Hanya kembalikan gambar dari class_id ini.
+            split (str): Hanya kembalikan gambar dari split ini ("train" atau "val").
+            path_prefix (str): Hanya kembalikan gambar dengan path berawalan ini
+                (relatif terhadap folder Dataset jika bukan path absolut).
+
+        Returns:
+            list: Daftar hasil per query (urutan sama dengan input). Dengan filter,
+            tetap berisi top_k hasil selama jumlah gambar yang lolos filter mencukupi.
+        """
+        if not queries:
+            return []
+        if query_types is None:
+            query_types = [None] * len(queries)
+
+        results = [None] * len(queries)
+        with metrics.maybe_profile("search"), metrics.timer("search", items=len(queries)):
+            rows = self.metadata.filter_rows(class_ids, split, path_prefix)
+
+            # A. Gambar yang sudah ter-index: baca tabel graph tetangga (tanpa decode, encode, FAISS)
+            indexed = {} if rows is not None else self.indexed_rows(queries, query_types, top_k)
+            if indexed:
+                positions = list(indexed)
+                with metrics.timer("neighbor_graph", items=len(positions)):
+                    scores, indices = self.neighbor_graph.search([indexed[p] for p in positions], top_k)
+                for pos, s, i in zip(positions, scores, indices):
+                    results[pos] = self.format_results(s, i)
+                metrics.inc("search_graph_hits_total", len(positions),
+                            help_text="Query yang dijawab dari graph tetangga.")
+
+            # B. Query lainnya: encode CLIP lalu cari di index
+            pending = [pos for pos in range(len(queries)) if pos not in indexed]
+            if pending:
+                query_emb = self.encode_queries([queries[p] for p in pending], [query_types[p] for p in pending])
+                if rows is not None:
+                    if self.embeddings is None:
+                        raise RuntimeError("Matrix embedding tidak ditemukan. Jalankan ulang 'python indexer.py'.")
+                    with metrics.timer("filtered_search", items=len(pending)):
+                        scores, indices = filtered_search(self.index, query_emb, top_k, rows, self.embeddings)
+                elif self.use_router:
+                    with metrics.timer("router_search", items=len(pending)):
+                        scores, indices = self.router.search(query_emb, top_k)
+                else:
+                    with metrics.timer("faiss_search", items=len(pending)):
+                        scores, indices = self.index.search(query_emb, top_k)
+
+                for pos, s, i in zip(pending, scores, indices):
+                    results[pos] = self.format_results(s, i)
+
+        metrics.inc("search_queries_total", len(queries), help_text="Jumlah query pencarian.")
+        metrics.maybe_export()
+        return results
+
+    def indexed_rows(self, queries, query_types, top_k):
+        """
+        Mencari query berupa path gambar yang sudah ter-index dan tercakup graph tetangga.
+
+        Returns:
+            dict: Mapping {posisi query: row id index}.
+        """
+        if self.neighbor_graph is None or top_k > self.neighbor_graph.k:
+            return {}
+
+        indexed = {}
+        for pos, (query, query_type) in enumerate(zip(queries, query_types)):
+            if isinstance(query, str) and query_type != QUERY_TEXT:
+                row = self.metadata.row_for_path(query)
+                if row is not None:
+                    indexed[pos] = row
+        return indexed
+
+    def search(self, query, top_k=config.TOP_K, query_type=None,
+               class_ids=None, split=None, path_prefix=None):
+        """
+        Melakukan pencarian gambar berdasarkan query teks atau gambar input.
+
+        Args:
+            query: String teks, path file gambar, bytes, file-like, PIL Image, atau np.ndarray.
+            top_k (int): Jumlah hasil teratas yang diambil.
+            query_type (str): "text" atau "image" untuk melewati deteksi otomatis.
+                String hanya dianggap path gambar jika query_type=None dan file-nya ada.
+            class_ids, split, path_prefix: Filter hasil (lihat `search_batch`).
+
+        Returns:
+            list: Daftar dictionary berisi path gambar, label, dan skor kemiripan.
+        """
+        return self.search_batch([query], top_k, [query_type], class_ids, split, path_prefix)[0]
+
+    def result_image(self, image_path):
+        """
+        Gambar hasil pencarian untuk ditampilkan: view array image store jika
+        gambar sudah di-pack, selain itu path file aslinya.
+        """
+        if self.image_store is not None:
+            row = self.image_store.lookup_current(image_path)
+            if row is not None:
+                return self.image_store.array(row)
+        return image_path
+
+    def predict_labels(self, query, top_k=config.TOP_K, query_type=None):
+        """
+        Prediksi label zero-shot: query hanya dinilai terhadap 200 kelas (centroid & label),
+        tanpa pencarian index.
+
+        Returns:
+            list: Daftar dictionary berisi class_id, label, dan skor kelas.
+        """
+        if self.router is None:
+            raise RuntimeError("Router kelas belum dibangun. Jalankan 'python indexer.py' terlebih dahulu.")
+
+        query_emb = self.encode_queries([query], [query_type])
+        return self.router.predict(query_emb, top_k)[0]
+
     def generate_description(self, image_path, label):
         """
-        Menghasilkan deskripsi visual menggunakan model Qwen2-VL.
+        Menghasilkan deskripsi visual menggunakan model Qwen2-VL (dimuat saat pertama dipakai).
+
+        Deskripsi yang sudah pernah dibuat untuk gambar, label, prompt, dan
+        pengaturan generasi yang sama diambil dari cache tanpa memanggil model.
 
         Args:
             image_path (str): Lokasi file gambar.
@@ -123,47 +888,111 @@ class RAGSystem:
         Returns:
             str: Deskripsi teks yang dihasilkan model.
         """
+        if self.retrieval_only:
+            raise RuntimeError("RAGSystem berjalan dalam mode retrieval-only (tanpa Qwen2-VL).")
+
+        cache_key = DescriptionCache.make_key(
+            image_path, label, build_prompt(label), self.generation_settings()
+        )
+        cached = self.description_cache.get(cache_key)
+        record_description_cache(cached is not None)
+        if cached is not None:
+            return cached
+
         try:
-            image = Image.open(image_path).convert("RGB")
-
-            # Prompt Engineering: Memberikan konteks kategori untuk hasil lebih akurat
-            prompt = f"Describe this image in detail. The image category is '{label}'."
-
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "image", "image": image},
-                        {"type": "text", "text": prompt},
-                    ],
-                }
-            ]
-
-            # Preprocessing Input
-            text = self.processor.apply_chat_template(
-                messages, tokenize=False, add_generation_prompt=True
-            )
-            inputs = self.processor(
-                text=[text],
-                images=[image],
-                padding=True,
-                return_tensors="pt"
-            ).to(self.vlm_model.device)
-
-            # Proses Generasi (Inference)
-            generated_ids = self.vlm_model.generate(**inputs, max_new_tokens=200)
-
-            # Post-processing Output (Decoding)
-            generated_ids_trimmed = [
-                out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-            ]
-            output_text = self.processor.batch_decode(
-                generated_ids_trimmed,
-                skip_special_tokens=True,
-                clean_up_tokenization_spaces=False
+            with metrics.maybe_profile("generate"), metrics.timer("vlm_generate", items=1):
+                description = self.get_generator().describe(image_path, label)
+        except Exception as e:
+            return generation_error(e)
+        finally:
+            metrics.maybe_export()
+
+        self.description_cache.put(cache_key, description)
+        return description
+
+    def generate_description_stream(self, image_path, label):
+        """
+        Versi streaming dari `generate_description` untuk ditampilkan bertahap di UI.
+
+        Jika deskripsi ada di cache, seluruh teks langsung dikirim sebagai satu potongan.
+        Deskripsi lengkap disimpan ke cache setelah streaming selesai.
+
+        Yields:
+            str: Potongan teks deskripsi (atau pesan error).
+        """
+        if self.retrieval_only:
+            raise RuntimeError("RAGSystem berjalan dalam mode retrieval-only (tanpa Qwen2-VL).")
+
+        cache_key = DescriptionCache.make_key(
+            image_path, label, build_prompt(label), self.generation_settings()
+        )
+        cached = self.description_cache.get(cache_key)
+        record_description_cache(cached is not None)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        try:
+            with metrics.timer("vlm_generate_stream", items=1):
+                # closing: stream yang ditutup pemanggil ikut menghentikan generate di dalamnya
+                with closing(self.get_generator().describe_stream(image_path, label)) as stream:
+                    for chunk in stream:
+                        chunks.append(chunk)
+                        yield chunk
+        except Exception as e:
+            yield generation_error(e)
+            return
+        finally:
+            metrics.maybe_export()
+
+        self.description_cache.put(cache_key, "".join(chunks))
+
+    def generate_descriptions(self, items):
+        """
+        Versi ber-batch dari `generate_description` (misal untuk mendeskripsikan top-k hasil).
+
+        Item yang ada di cache langsung diambil; sisanya digenerasi dengan
+        pemanggilan `generate` ber-batch.
+
+        Args:
+            items (list): Daftar tuple [(image_path, label), ...].
+
+        Returns:
+            list: Deskripsi per item (item gagal berisi pesan error).
+        """
+        if self.retrieval_only:
+            raise RuntimeError("RAGSystem berjalan dalam mode retrieval-only (tanpa Qwen2-VL).")
+
+        outputs = [None] * len(items)
+        keys = [None] * len(items)
+        misses = []
+
+        for pos, (image_path, label) in enumerate(items):
+            keys[pos] = DescriptionCache.make_key(
+                image_path, label, build_prompt(label), self.generation_settings()
             )
+            outputs[pos] = self.description_cache.get(keys[pos])
+            record_description_cache(outputs[pos] is not None)
+            if outputs[pos] is None:
+                misses.append(pos)
 
-            return output_text[0]
+        if not misses:
+            return outputs
 
+        try:
+            generator = self.get_generator()
         except Exception as e:
-            return f"Error generating description: {str(e)}"
\ No newline at end of file
+            for pos in misses:
+                outputs[pos] = generation_error(e)
+            return outputs
+
+        with metrics.timer("vlm_generate_batch", items=len(misses)):
+            generated = generator.describe_batch([items[pos] for pos in misses])
+        for pos, description in zip(misses, generated):
+            outputs[pos] = description
+            if not is_generation_error(description):
+                self.description_cache.put(keys[pos], description)
+        metrics.maybe_export()
+
+        return outputs
@@ -0,0 +1,433 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+# Import konfigurasi lokal
+import config
+
+# Tahap pipeline yang dapat diukur
+STAGES = ("decode", "clip_text", "clip_image", "faiss_search", "format", "vlm_prefill", "vlm_decode")
+
+# Tahap default (tanpa VLM karena sangat berat di CPU)
+DEFAULT_STAGES = ("decode", "clip_text", "clip_image", "faiss_search", "format")
+
+# Kenaikan latency / penurunan throughput (relatif) yang dianggap regresi
+REGRESSION_TOLERANCE = 0.10
+
+
+# 1. PENGUKURAN
+
+def summarize(latencies, items_per_call, wall_time):
+    """
+    Meringkas latency per pemanggilan (detik) menjadi p50/p95/p99 (ms) dan items/sec.
+    """
+    lat_ms = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(lat_ms, [50, 95, 99])
+    total_items = items_per_call * len(latencies)
+    return {
+        "calls": len(latencies),
+        "items": total_items,
+        "mean_ms": float(lat_ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "items_per_sec": total_items / wall_time if wall_time > 0 else 0.0
+    }
+
+def measure(fn, make_args, iterations, items_per_call, concurrency=1, warmup=2):
+    """
+    Menjalankan `fn(*make_args(i))` sebanyak `iterations` kali dengan `concurrency` thread.
+
+    Args:
+        fn (callable): Fungsi tahap yang diukur.
+        make_args (callable): Pembuat argumen untuk iterasi ke-i (di luar waktu ukur).
+        iterations (int): Jumlah pemanggilan terukur.
+        items_per_call (int): Jumlah item per pemanggilan (untuk items/sec).
+        concurrency (int): Jumlah pemanggil paralel.
+        warmup (int): Jumlah pemanggilan awal yang tidak diukur.
+
+    Returns:
+        dict: Ringkasan statistik (lihat `summarize`).
+    """
+    for i in range(warmup):
+        fn(*make_args(i))
+
+    args_list = [make_args(i) for i in range(iterations)]
+
+    def timed(args):
+        t0 = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - t0
+
+    wall_start = time.perf_counter()
+    if concurrency <= 1:
+        latencies = [timed(args) for args in args_list]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, args_list))
+    wall_time = time.perf_counter() - wall_start
+
+    return summarize(latencies, items_per_call, wall_time)
+
+
+# 2. WORKLOAD (SINTETIS & DATA ASLI)
+
+class Workload:
+    """
+    Sumber input benchmark: gambar JPEG (bytes), teks query, dan path gambar.
+
+    - synthetic: gambar acak 64x64 & teks dari template, tidak butuh dataset.
+    - real: gambar & label diambil dari metadata index.
+    """
+
+    def __init__(self, kind, metadata=None, pool_size=512, seed=0):
+        rng = np.random.default_rng(seed)
+        random.seed(seed)
+        self.kind = kind
+
+        if kind == "real" and metadata is not None and len(metadata) > 0:
+            rows = rng.choice(len(metadata), min(pool_size, len(metadata)), replace=False)
+            items = [metadata[int(r)] for r in rows]
+            self.jpegs = []
+            for item in items:
+                with open(item['path'], 'rb') as f:
+                    self.jpegs.append(f.read())
+            self.texts = [f"a photo of a {item['label'].split(',')[0]}" for item in items]
+            self.paths = [item['path'] for item in items]
+            self.labels = [item['label'] for item in items]
+        else:
+            self.jpegs = []
+            for _ in range(pool_size):
+                pixels = rng.integers(0, 256, size=(64, 64, 3), dtype=np.uint8)
+                buf = io.BytesIO()
+                Image.fromarray(pixels).save(buf, format='JPEG')
+                self.jpegs.append(buf.getvalue())
+            words = ["cat", "dog", "car", "bridge", "goldfish", "mushroom", "school bus", "teapot"]
+            self.texts = [f"a photo of a {random.choice(words)} #{i}" for i in range(pool_size)]
+            self.paths = []
+            self.labels = [random.choice(words) for _ in range(pool_size)]
+
+        self.images = [Image.open(io.BytesIO(b)).convert('RGB') for b in self.jpegs]
+
+    def batch(self, items, i, batch_size):
+        start = (i * batch_size) % len(items)
+        return [items[(start + j) % len(items)] for j in range(batch_size)]
+
+
+# 3. BENCHMARK PER TAHAP
+
+def decode_jpegs(jpegs):
+    return [Image.open(io.BytesIO(b)).convert('RGB') for b in jpegs]
+
+def run_benchmark(stages=DEFAULT_STAGES, workload="synthetic", batch_size=32, concurrency=1,
+                  iterations=20, vlm_tokens=32):
+    """
+    Menjalankan benchmark per tahap dan mengembalikan laporan yang bisa di-serialisasi JSON.
+    """
+    from backend import RAGSystem
+    from clip_encoder import encode_image_batch, fast_preprocess_enabled
+
+    needs_vlm = any(stage.startswith("vlm") for stage in stages)
+    rag = RAGSystem(retrieval_only=not needs_vlm)
+    wl = Workload(workload, rag.metadata)
+    print(f"🧪 Workload: {workload} | batch {batch_size} | concurrency {concurrency} | {iterations} iterasi")
+
+    # Vektor query untuk tahap FAISS (embedding dari teks workload, di luar waktu ukur)
+    pool_texts = wl.batch(wl.texts, 0, batch_size)
+    query_pool = rag.encode_queries(pool_texts, ["text"] * len(pool_texts))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "device": config.DEVICE,
+            "clip_backend": rag.clip_backend,
+            "clip_fast_preprocess": fast_preprocess_enabled(),
+            "platform": platform.platform(),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "workload": workload,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "iterations": iterations,
+            "index_ntotal": int(rag.index.ntotal),
+            "top_k": config.TOP_K
+        },
+        "stages": {}
+    }
+
+    def clip_encode(inputs):
+        rag.clip_model.encode(inputs, convert_to_numpy=True, show_progress_bar=False)
+
+    def clip_encode_images(images):
+        # Jalur yang sama dengan query gambar (preprocessing ber-batch jika aktif)
+        encode_image_batch(rag.clip_model, images)
+
+    def faiss_search(q):
+        rag.index.search(q, config.TOP_K)
+
+    _, ids_pool = rag.index.search(query_pool, config.TOP_K)
+    scores_pool = np.zeros_like(ids_pool, dtype='float32')
+
+    def format_results(scores, ids):
+        for s, i in zip(scores, ids):
+            rag.format_results(s, i)
+
+    if wl.paths:
+        # Data asli: decode lewat jalur indexer (open file + convert RGB)
+        from indexer import load_batch
+        decode_stage = (
+            load_batch,
+            lambda i: ([(p, "") for p in wl.batch(wl.paths, i, batch_size)], {}),
+            batch_size
+        )
+    else:
+        decode_stage = (decode_jpegs, lambda i: (wl.batch(wl.jpegs, i, batch_size),), batch_size)
+
+    stage_fns = {
+        "decode": decode_stage,
+        "clip_text": (clip_encode, lambda i: (wl.batch(wl.texts, i, batch_size),), batch_size),
+        "clip_image": (clip_encode_images, lambda i: (wl.batch(wl.images, i, batch_size),), batch_size),
+        "faiss_search": (faiss_search, lambda i: (query_pool,), len(query_pool)),
+        "format": (format_results, lambda i: (scores_pool, ids_pool), len(ids_pool)),
+    }
+
+    for stage in stages:
+        if stage in stage_fns:
+            fn, make_args, items = stage_fns[stage]
+            stats = measure(fn, make_args, iterations, items, concurrency)
+        elif stage in ("vlm_prefill", "vlm_decode"):
+            stats = benchmark_vlm(rag, wl, stage, iterations=max(1, iterations // 4), tokens=vlm_tokens)
+        else:
+            raise ValueError(f"Tahap tidak dikenal: {stage}")
+
+        report["stages"][stage] = stats
+        print(f"   {stage:<13} p50 {stats['p50_ms']:9.2f} ms | p95 {stats['p95_ms']:9.2f} ms | "
+              f"p99 {stats['p99_ms']:9.2f} ms | {stats['items_per_sec']:9.1f} items/s")
+
+    return report
+
+def benchmark_vlm(rag, wl, stage, iterations, tokens):
+    """
+    Mengukur Qwen2-VL lewat jalur yang sama dengan aplikasi (fitur visual + cache):
+    prefill = fitur visual + generate 1 token, decode = waktu per token tambahan.
+    """
+    generator = rag.get_generator()
+    images = wl.images[:iterations]
+    labels = wl.labels[:iterations]
+
+    # Gambar ter-index (workload real) memakai row id agar fitur visual dibaca dari cache
+    cache = generator.vision_cache
+    if wl.paths and cache is not None:
+        rows = [cache.row_for_path(path) for path in wl.paths[:iterations]]
+    else:
+        rows = [None] * len(images)
+
+    prefill, decode, hits = [], [], 0
+    for image, label, row in zip(images, labels, rows):
+        # Prefill mencakup vision tower (atau baca cache) seperti jalur generate_batch
+        t0 = time.perf_counter()
+        hits += cache is not None and cache.get(row) is not None
+        features = generator.visual_features([image], [row])
+        inputs = generator.prepare_feature_inputs(features, [label])
+        t1 = time.perf_counter()
+        generator.generate_from_features(features, inputs, max_new_tokens=1)
+        t_first = time.perf_counter() - t1
+        t_prefill = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        out = generator.generate_from_features(features, inputs, max_new_tokens=tokens, min_new_tokens=tokens)
+        t_total = time.perf_counter() - t0
+
+        new_tokens = max(out.shape[1] - inputs["input_ids"].shape[1] - 1, 1)
+        prefill.append(t_prefill)
+        decode.append(max(t_total - t_first, 0.0) / new_tokens)
+
+    if stage == "vlm_prefill":
+        stats = summarize(prefill, 1, sum(prefill))
+        stats["vision_cache_hit_rate"] = hits / len(prefill) if prefill else 0.0
+        return stats
+    return summarize(decode, 1, sum(decode))
+
+
+def token_f1(text, reference):
+    """
+    F1 overlap kata (bag of words) antara dua teks, 0..1.
+    """
+    a, b = text.lower().split(), reference.lower().split()
+    if not a or not b:
+        return float(a == b)
+    common = sum(min(a.count(w), b.count(w)) for w in set(a))
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(a), common / len(b)
+    return 2 * precision * recall / (precision + recall)
+
+def compare_vlm_profiles(profiles, wl, iterations=4):
+    """
+    Membandingkan profil inferensi Qwen2-VL (config.VLM_PROFILES) pada gambar yang sama.
+
+    Profil pertama menjadi referensi kualitas. Per profil diukur latency prefill
+    (generate 1 token) dan deskripsi penuh (max_new_tokens profil), serta kualitas:
+    - ref_f1     : F1 overlap kata terhadap deskripsi profil referensi.
+    - label_rate : porsi deskripsi yang menyebut label kelas (sinonim pertama).
+
+    Model dimuat satu per satu sehingga hanya satu profil berada di memori.
+    """
+    import gc
+    import torch
+    from backend import VLMGenerator
+
+    images = wl.images[:iterations]
+    labels = wl.labels[:iterations]
+    results = {}
+    reference = None
+
+    for name in profiles:
+        generator = VLMGenerator(profile=name)
+        # Warmup satu gambar (alokasi & kernel pertama tidak ikut diukur)
+        generator.generate_batch(images[:1], labels[:1])
+
+        prefill, full, texts, tokens = [], [], [], 0
+        for image, label in zip(images, labels):
+            features = generator.visual_features([image])
+            inputs = generator.prepare_feature_inputs(features, [label])
+
+            t0 = time.perf_counter()
+            generator.generate_from_features(features, inputs, max_new_tokens=1)
+            prefill.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            out = generator.generate_from_features(features, inputs)
+            full.append(time.perf_counter() - t0)
+
+            new_ids = out[:, inputs["input_ids"].shape[1]:]
+            tokens += new_ids.shape[1]
+            texts.append(generator.processor.batch_decode(new_ids, skip_special_tokens=True)[0])
+
+        if reference is None:
+            reference = texts
+        results[name] = {
+            "settings": dict(generator.profile),
+            "prefill_p50_ms": float(np.percentile(prefill, 50) * 1000.0),
+            "describe_p50_ms": float(np.percentile(full, 50) * 1000.0),
+            "tokens_per_sec": tokens / sum(full) if sum(full) > 0 else 0.0,
+            "visual_tokens": int(features[0][0].shape[0]),
+            "ref_f1": float(np.mean([token_f1(t, r) for t, r in zip(texts, reference)])),
+            "label_rate": float(np.mean([
+                label.split(',')[0].strip().lower() in text.lower() for text, label in zip(texts, labels)
+            ])),
+            "samples": texts[:2]
+        }
+        r = results[name]
+        print(f"   {name:<10} prefill p50 {r['prefill_p50_ms']:9.1f} ms | deskripsi p50 {r['describe_p50_ms']:9.1f} ms | "
+              f"{r['tokens_per_sec']:6.1f} tok/s | {r['visual_tokens']} token visual | "
+              f"F1 ref {r['ref_f1']:.2f} | label {r['label_rate']:.2f}")
+
+        del generator
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    return results
+
+
+# 4. PERBANDINGAN DENGAN BASELINE
+
+def compare_reports(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Membandingkan laporan dengan baseline dan menandai regresi.
+
+    Regresi: p50/p95 naik lebih dari `tolerance` atau items/sec turun lebih dari `tolerance`.
+
+    Returns:
+        list: Daftar dict perbandingan per tahap & metrik.
+    """
+    rows = []
+    for stage, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if base is None:
+            continue
+        for metric, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("items_per_sec", False)):
+            old, new = base[metric], stats[metric]
+            change = (new - old) / old if old else 0.0
+            regressed = change > tolerance if higher_is_worse else change < -tolerance
+            rows.append({
+                "stage": stage, "metric": metric,
+                "baseline": old, "current": new,
+                "change": change, "regression": regressed
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark latency & throughput per tahap pipeline RAG.")
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES),
+                        help=f"Daftar tahap dipisah koma. Pilihan: {', '.join(STAGES)}")
+    parser.add_argument("--workload", choices=("synthetic", "real"), default="synthetic")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--vlm-tokens", type=int, default=32, help="Jumlah token untuk tahap vlm_decode.")
+    parser.add_argument("--vlm-profiles",
+                        help="Bandingkan profil VLM (dipisah koma, profil pertama = referensi kualitas), "
+                             f"misal default,cpu_bf16,cpu_int8. Pilihan: {', '.join(config.VLM_PROFILES)}")
+    parser.add_argument("--cpu", action="store_true", help="Paksa device CPU.")
+    parser.add_argument("--output", default=os.path.join(config.BENCHMARK_DIR, "report.json"))
+    parser.add_argument("--baseline", help="Laporan JSON sebelumnya untuk perbandingan.")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    from metrics import set_role
+    set_role("benchmark")
+
+    if args.cpu:
+        config.DEVICE = 'cpu'
+
+    report = run_benchmark(
+        stages=[s.strip() for s in args.stages.split(",") if s.strip()],
+        workload=args.workload,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        iterations=args.iterations,
+        vlm_tokens=args.vlm_tokens
+    )
+
+    if args.vlm_profiles:
+        from metadata_store import open_metadata, metadata_exists
+
+        print("\n🧪 Perbandingan profil VLM:")
+        wl = Workload(args.workload, open_metadata() if metadata_exists() else None)
+        report["vlm_profiles"] = compare_vlm_profiles(
+            [p.strip() for p in args.vlm_profiles.split(",") if p.strip()], wl,
+            iterations=max(1, args.iterations // 4)
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"💾 Laporan benchmark disimpan ke: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        rows = compare_reports(report, baseline, args.tolerance)
+        regressions = [r for r in rows if r["regression"]]
+
+        print("\n📈 Perbandingan dengan baseline:")
+        for r in rows:
+            flag = "❌ REGRESI" if r["regression"] else "✅"
+            print(f"   {r['stage']:<13} {r['metric']:<14} {r['baseline']:10.2f} -> {r['current']:10.2f} "
+                  f"({r['change'] * 100:+6.1f}%) {flag}")
+
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresi terdeteksi (toleransi {args.tolerance * 100:.0f}%).")
+            sys.exit(1)
+        print("\n✅ Tidak ada regresi.")
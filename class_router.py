@@ -0,0 +1,188 @@
+import os
+import numpy as np
+
+# Import konfigurasi lokal
+import config
+from metadata_store import MetadataStore
+from ann_index import exact_search
+
+# Jumlah baris embedding yang dibaca per langkah saat menghitung centroid
+CENTROID_CHUNK_SIZE = 16384
+
+
+# 1. PEMBANGUNAN ROUTER (CENTROID KELAS & EMBEDDING LABEL)
+
+def label_prompt(label, template=config.ROUTER_TEXT_TEMPLATE):
+    """
+    Membuat prompt CLIP dari label words.txt (hanya sinonim pertama, misal "goldfish").
+    """
+    return template.format(label.split(',')[0].strip())
+
+def class_centroids(embeddings, class_codes, num_classes, chunk_size=CENTROID_CHUNK_SIZE):
+    """
+    Menghitung centroid (rata-rata, lalu dinormalisasi L2) embedding tiap kelas.
+
+    Args:
+        embeddings (np.ndarray): Matrix embedding [N, D] (boleh memmap).
+        class_codes (np.ndarray): Kode kelas int32 [N] dari metadata store.
+        num_classes (int): Jumlah kelas.
+
+    Returns:
+        np.ndarray: Matrix centroid float32 [num_classes, D].
+    """
+    sums = np.zeros((num_classes, embeddings.shape[1]), dtype='float64')
+    for start in range(0, embeddings.shape[0], chunk_size):
+        chunk = np.asarray(embeddings[start : start + chunk_size], dtype='float64')
+        np.add.at(sums, np.asarray(class_codes[start : start + chunk_size]), chunk)
+
+    norms = np.linalg.norm(sums, axis=1, keepdims=True)
+    # Kelas tanpa baris tetap bernilai nol (tidak pernah terpilih di atas kelas lain)
+    return (sums / np.maximum(norms, 1e-12)).astype('float32')
+
+def build_router(model, encoder, embeddings_path=config.EMBEDDINGS_FILE,
+                 store_dir=config.METADATA_STORE_DIR, router_path=config.ROUTER_FILE):
+    """
+    Membangun file router dua tahap dari matrix embedding & metadata store.
+
+    Isi file (.npz):
+    - centroids        : centroid embedding gambar per kelas.
+    - text_embeddings  : embedding CLIP teks label words.txt per kelas.
+    - encoder          : identitas encoder (`encoder_name`) pembuat text_embeddings.
+
+    Baris per kelas (CSR) dibaca dari metadata store (class_rows/class_offsets).
+
+    Args:
+        model: Encoder CLIP (SentenceTransformer atau OnnxClipEncoder) untuk meng-encode label.
+        encoder (str): Identitas encoder `model` (`encoder_name`).
+    """
+    store = MetadataStore(store_dir)
+    embeddings = np.load(embeddings_path, mmap_mode='r')
+    class_codes = np.asarray(store.class_codes)
+    num_classes = len(store.class_ids)
+
+    print(f"🧭 Membangun router kelas ({num_classes} kelas, {len(class_codes)} baris)...")
+    centroids = class_centroids(embeddings, class_codes, num_classes)
+
+    text_embeddings = model.encode(
+        [label_prompt(label) for label in store.labels],
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype('float32')
+    text_embeddings /= np.maximum(np.linalg.norm(text_embeddings, axis=1, keepdims=True), 1e-12)
+
+    tmp_path = router_path + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        centroids=centroids,
+        text_embeddings=text_embeddings,
+        encoder=np.array(encoder)
+    )
+    os.replace(tmp_path, router_path)
+    print(f"💾 Router kelas disimpan ke: {router_path}")
+
+
+# 2. PENCARIAN DUA TAHAP
+
+class ClassRouter:
+    """
+    Pencarian dua tahap berbasis kelas TinyImageNet.
+
+    Tahap kasar menilai query terhadap centroid embedding gambar tiap kelas dan
+    embedding teks labelnya. Tahap halus menghitung skor exact hanya untuk baris
+    milik beberapa kelas teratas, dibaca dari matrix embedding memory-mapped.
+    Tahap kasar sendiri juga berfungsi sebagai prediksi label zero-shot.
+    """
+
+    def __init__(self, metadata, router_path=config.ROUTER_FILE, embeddings_path=config.EMBEDDINGS_FILE,
+                 text_weight=config.ROUTER_TEXT_WEIGHT):
+        """
+        Args:
+            metadata (MetadataStore): Metadata index (untuk nama kelas & label).
+            text_weight (float): Bobot skor label teks pada tahap kasar (0 = hanya centroid).
+        """
+        self.metadata = metadata
+        self.text_weight = text_weight
+        with np.load(router_path) as data:
+            self.centroids = data["centroids"]
+            self.text_embeddings = data["text_embeddings"]
+        self.embeddings = np.load(embeddings_path, mmap_mode='r')
+
+    @staticmethod
+    def exists(encoder=None, router_path=config.ROUTER_FILE):
+        """
+        True jika file router ada dan (jika `encoder` diberikan) dibuat dengan encoder yang sama.
+
+        Embedding label teks bergantung pada backend encoder, sehingga router dari
+        encoder lain diabaikan sampai indexer membangunnya ulang.
+        """
+        if not os.path.exists(router_path):
+            return False
+        if encoder is None:
+            return True
+        with np.load(router_path) as data:
+            stored = str(data["encoder"]) if "encoder" in data.files else None
+        if stored != encoder:
+            print(f"⚠️ Router kelas dibuat dengan encoder {stored}, encoder saat ini {encoder}: diabaikan. "
+                  "Jalankan indexer untuk membangun ulang.")
+            return False
+        return True
+
+    def class_scores(self, query_emb):
+        """
+        Tahap kasar: skor [nq, num_classes] gabungan centroid gambar & label teks.
+        """
+        scores = (1.0 - self.text_weight) * (query_emb @ self.centroids.T)
+        if self.text_weight > 0:
+            scores += self.text_weight * (query_emb @ self.text_embeddings.T)
+        return scores
+
+    def top_classes(self, query_emb, n_classes):
+        """
+        Mengembalikan (kode kelas, skor) untuk `n_classes` kelas teratas per query.
+        """
+        scores = self.class_scores(query_emb)
+        n_classes = min(n_classes, scores.shape[1])
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :n_classes]
+        return order, np.take_along_axis(scores, order, axis=1)
+
+    def predict(self, query_emb, top_k=config.TOP_K):
+        """
+        Prediksi label zero-shot dari tahap kasar saja (tanpa menyentuh index).
+
+        Returns:
+            list: Per query, daftar {"class_id", "label", "score"}.
+        """
+        codes, scores = self.top_classes(query_emb, top_k)
+        return [
+            [
+                {
+                    "class_id": self.metadata.class_ids[code],
+                    "label": self.metadata.labels[code],
+                    "score": float(score)
+                }
+                for code, score in zip(row_codes, row_scores)
+            ]
+            for row_codes, row_scores in zip(codes, scores)
+        ]
+
+    def search(self, query_emb, top_k=config.TOP_K, n_classes=config.ROUTER_TOP_CLASSES):
+        """
+        Tahap halus: top-k exact di antara baris milik `n_classes` kelas teratas.
+
+        Returns:
+            tuple: (scores, ids) berukuran [nq, top_k], format sama dengan `faiss.Index.search`
+            (slot kosong berisi id -1 jika kandidat kurang dari top_k).
+        """
+        codes, _ = self.top_classes(query_emb, n_classes)
+        all_scores = np.empty((len(query_emb), top_k), dtype='float32')
+        all_ids = np.empty((len(query_emb), top_k), dtype='int64')
+
+        for qi, row_codes in enumerate(codes):
+            rows = np.sort(np.concatenate([
+                self.metadata.class_rows[self.metadata.class_offsets[c] : self.metadata.class_offsets[c + 1]]
+                for c in row_codes
+            ]))
+            scores, ids = exact_search(query_emb[qi : qi + 1], self.embeddings, top_k, rows)
+            all_scores[qi], all_ids[qi] = scores[0], ids[0]
+
+        return all_scores, all_ids
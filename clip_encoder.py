@@ -0,0 +1,547 @@
+import os
+import json
+import time
+import argparse
+import torch
+import torch.nn.functional as F
+import numpy as np
+from PIL import Image
+from sentence_transformers import SentenceTransformer
+
+# Import konfigurasi lokal
+import config
+
+# Nama file di dalam folder export ONNX
+IMAGE_MODEL_FILE = "image.onnx"
+TEXT_MODEL_FILE = "text.onnx"
+INFO_FILE = "export.json"
+AGREEMENT_FILE = "agreement.json"
+
+# Jumlah input per pemanggilan session ONNX Runtime
+ONNX_BATCH_SIZE = 64
+
+# Panjang maksimum token teks CLIP
+CLIP_MAX_TEXT_LENGTH = 77
+
+# Jumlah sampel gambar & teks untuk cek kesesuaian embedding
+AGREEMENT_SAMPLES = 256
+
+
+def model_file(name, backend):
+    """
+    Nama file model ONNX untuk backend ("onnx" atau "onnx_int8").
+    """
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_int8{ext}" if backend == "onnx_int8" else name
+
+def encoder_name(backend=config.CLIP_BACKEND, fast=None):
+    """
+    Identitas encoder (model + backend + preprocessing), misal untuk kunci cache embedding query.
+
+    Args:
+        fast (bool): Preprocessing ter-vektorisasi dipakai (None = `fast_preprocess_enabled()`).
+    """
+    fast = fast_preprocess_enabled() if fast is None else fast
+    name = config.CLIP_MODEL_NAME if backend == "torch" else f"{config.CLIP_MODEL_NAME}:{backend}"
+    return f"{name}+fast" if fast else name
+
+
+# 1. EXPORT KE ONNX
+
+def load_torch_encoder(device=config.DEVICE):
+    """
+    Encoder referensi: SentenceTransformer CLIP (PyTorch eager).
+    """
+    return SentenceTransformer(
+        config.CLIP_MODEL_NAME,
+        device=device,
+        cache_folder=config.MODELS_CACHE_DIR
+    )
+
+def export_onnx(output_dir=config.CLIP_ONNX_DIR, quantize=True, opset=17):
+    """
+    Meng-export tower gambar & teks CLIP (termasuk proyeksi ke ruang embedding bersama)
+    dari SentenceTransformer ke ONNX, opsional dengan salinan int8 (kuantisasi dinamis).
+
+    Output sama dengan `SentenceTransformer.encode` (belum dinormalisasi L2), sehingga
+    embedding index & query tetap kompatibel antar backend.
+    """
+    reference = load_torch_encoder(device="cpu")
+    clip = reference[0].model.eval()
+    processor = reference[0].processor
+    os.makedirs(output_dir, exist_ok=True)
+
+    class ImageTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, pixel_values):
+            return self.clip.get_image_features(pixel_values=pixel_values)
+
+    class TextTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, input_ids, attention_mask):
+            return self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    print(f"📤 Export CLIP ke ONNX: {output_dir}")
+    dummy_image = Image.fromarray(np.zeros((64, 64, 3), dtype=np.uint8))
+    pixel_values = processor(images=[dummy_image, dummy_image], return_tensors="pt")["pixel_values"]
+    tokens = processor.tokenizer(["a photo of a cat", "a photo of a goldfish"], padding=True, return_tensors="pt")
+
+    with torch.no_grad():
+        torch.onnx.export(
+            ImageTower(clip), (pixel_values,), os.path.join(output_dir, IMAGE_MODEL_FILE),
+            input_names=["pixel_values"], output_names=["embeddings"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "embeddings": {0: "batch"}},
+            opset_version=opset
+        )
+        torch.onnx.export(
+            TextTower(clip), (tokens["input_ids"], tokens["attention_mask"]),
+            os.path.join(output_dir, TEXT_MODEL_FILE),
+            input_names=["input_ids", "attention_mask"], output_names=["embeddings"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "embeddings": {0: "batch"}
+            },
+            opset_version=opset
+        )
+    processor.save_pretrained(output_dir)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        print("🗜️  Kuantisasi dinamis int8...")
+        for name in (IMAGE_MODEL_FILE, TEXT_MODEL_FILE):
+            quantize_dynamic(
+                os.path.join(output_dir, name),
+                os.path.join(output_dir, model_file(name, "onnx_int8")),
+                weight_type=QuantType.QInt8
+            )
+
+    with open(os.path.join(output_dir, INFO_FILE), 'w') as f:
+        json.dump({"model": config.CLIP_MODEL_NAME, "opset": opset, "int8": quantize}, f, indent=4)
+
+    # Hasil cek lama tidak berlaku lagi untuk model yang baru di-export
+    if os.path.exists(os.path.join(output_dir, AGREEMENT_FILE)):
+        os.remove(os.path.join(output_dir, AGREEMENT_FILE))
+    print("✅ Export selesai.")
+    return reference
+
+
+# 2. ENCODER ONNX RUNTIME
+
+class OnnxClipEncoder:
+    """
+    Encoder CLIP di atas ONNX Runtime dengan antarmuka yang sama dengan
+    `SentenceTransformer.encode` (list PIL Image dan/atau string -> np.ndarray [N, D]).
+    """
+
+    def __init__(self, backend="onnx", model_dir=config.CLIP_ONNX_DIR, num_threads=config.CLIP_ONNX_THREADS):
+        import onnxruntime as ort
+        from transformers import CLIPProcessor
+
+        self.backend = backend
+        self.model_dir = model_dir
+        self.processor = CLIPProcessor.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        def session(name):
+            return ort.InferenceSession(
+                os.path.join(model_dir, model_file(name, backend)), options, providers=["CPUExecutionProvider"]
+            )
+
+        self.image_session = session(IMAGE_MODEL_FILE)
+        self.text_session = session(TEXT_MODEL_FILE)
+
+    @staticmethod
+    def exists(backend="onnx", model_dir=config.CLIP_ONNX_DIR):
+        return all(
+            os.path.exists(os.path.join(model_dir, model_file(name, backend)))
+            for name in (IMAGE_MODEL_FILE, TEXT_MODEL_FILE)
+        )
+
+    def encode_images(self, images):
+        pixel_values = self.processor(images=images, return_tensors="np")["pixel_values"]
+        return self.encode_pixels(pixel_values)
+
+    def encode_pixels(self, pixel_values):
+        """
+        Encode tensor piksel yang sudah di-preprocess [N, 3, H, W].
+        """
+        return self.image_session.run(None, {"pixel_values": np.asarray(pixel_values, dtype=np.float32)})[0]
+
+    def encode_texts(self, texts):
+        tokens = self.processor.tokenizer(
+            texts, padding=True, truncation=True, max_length=CLIP_MAX_TEXT_LENGTH, return_tensors="np"
+        )
+        return self.text_session.run(None, {
+            "input_ids": tokens["input_ids"].astype(np.int64),
+            "attention_mask": tokens["attention_mask"].astype(np.int64)
+        })[0]
+
+    def encode(self, inputs, batch_size=ONNX_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False):
+        """
+        Encode campuran gambar & teks (urutan output sama dengan input).
+
+        Argumen `convert_to_numpy` & `show_progress_bar` hanya untuk kompatibilitas
+        dengan SentenceTransformer; output selalu np.ndarray float32.
+        """
+        if isinstance(inputs, (str, Image.Image)):
+            return self.encode([inputs], batch_size)[0]
+
+        outputs = [None] * len(inputs)
+        text_pos = [pos for pos, item in enumerate(inputs) if isinstance(item, str)]
+        image_pos = [pos for pos, item in enumerate(inputs) if not isinstance(item, str)]
+
+        for positions, encode_fn in ((image_pos, self.encode_images), (text_pos, self.encode_texts)):
+            for start in range(0, len(positions), batch_size):
+                chunk = positions[start : start + batch_size]
+                for pos, emb in zip(chunk, encode_fn([inputs[pos] for pos in chunk])):
+                    outputs[pos] = emb
+
+        if not outputs:
+            return np.zeros((0, self.image_session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        return np.stack(outputs).astype(np.float32)
+
+
+# 3. PREPROCESSING GAMBAR TER-VEKTORISASI
+
+def size_value(size, key):
+    # Image processor lambat memakai dict, versi fast memakai objek SizeDict
+    return size.get(key) if isinstance(size, dict) else getattr(size, key, None)
+
+class FastClipPreprocessor:
+    """
+    Preprocessing CLIP (resize sisi terpendek, center crop, normalisasi) untuk satu batch
+    array uint8 [N, H, W, 3] sebagai operasi tensor, bukan per PIL Image.
+
+    Parameter dibaca dari image processor model sehingga sama dengan jalur
+    `SentenceTransformer.encode`. Resize memakai bicubic antialias torch (kernel
+    setara PIL) lalu dibulatkan ke nilai uint8 seperti hasil resize PIL.
+    """
+
+    def __init__(self, image_processor):
+        size, crop = image_processor.size, image_processor.crop_size
+        self.shortest_edge = size_value(size, "shortest_edge") or min(
+            size_value(size, "height"), size_value(size, "width")
+        )
+        self.crop_size = (size_value(crop, "height"), size_value(crop, "width"))
+        self.mean = torch.tensor(image_processor.image_mean, dtype=torch.float32).view(1, 3, 1, 1)
+        self.std = torch.tensor(image_processor.image_std, dtype=torch.float32).view(1, 3, 1, 1)
+
+    def output_size(self, height, width):
+        """
+        Ukuran setelah resize sisi terpendek (aturan pembulatan sama dengan image processor HF).
+        """
+        short, long = (height, width) if height <= width else (width, height)
+        new_long = int(self.shortest_edge * long / short)
+        return (self.shortest_edge, new_long) if height <= width else (new_long, self.shortest_edge)
+
+    def __call__(self, batch):
+        """
+        Args:
+            batch (np.ndarray): Array uint8 [N, H, W, 3] (boleh view memmap).
+
+        Returns:
+            torch.Tensor: pixel_values float32 [N, 3, crop_h, crop_w].
+        """
+        x = torch.from_numpy(np.ascontiguousarray(batch, dtype=np.uint8)).permute(0, 3, 1, 2).float()
+        height, width = x.shape[-2:]
+        out_h, out_w = self.output_size(height, width)
+        if (out_h, out_w) != (height, width):
+            x = F.interpolate(x, size=(out_h, out_w), mode="bicubic", align_corners=False, antialias=True)
+            x = x.round_().clamp_(0, 255)
+
+        crop_h, crop_w = self.crop_size
+        top, left = max((out_h - crop_h) // 2, 0), max((out_w - crop_w) // 2, 0)
+        x = x[:, :, top : top + crop_h, left : left + crop_w]
+        return (x / 255.0 - self.mean) / self.std
+
+def image_processor_of(encoder):
+    if isinstance(encoder, OnnxClipEncoder):
+        return encoder.processor.image_processor
+    return encoder[0].processor.image_processor
+
+def encode_pixels(encoder, pixel_values):
+    """
+    Menjalankan tower gambar (+ proyeksi) pada pixel_values hasil preprocessing.
+    """
+    if isinstance(encoder, OnnxClipEncoder):
+        return encoder.encode_pixels(pixel_values.numpy())
+    with torch.no_grad():
+        emb = encoder[0].model.get_image_features(pixel_values=pixel_values.to(encoder.device))
+    return emb.float().cpu().numpy()
+
+def encode_image_batch(encoder, images, fast=None, batch_size=ONNX_BATCH_SIZE):
+    """
+    Encode gambar (PIL Image atau array uint8 [H, W, 3]) menjadi embedding CLIP (belum dinormalisasi).
+
+    Dengan `fast=True`, gambar berukuran sama ditumpuk menjadi satu array [N, H, W, 3]
+    dan di-preprocess sekaligus (`FastClipPreprocessor`) sebelum masuk tower gambar.
+    Array 4 dimensi [N, H, W, 3] langsung dipakai tanpa ditumpuk ulang.
+    `fast=None` mengikuti `fast_preprocess_enabled()`.
+
+    Returns:
+        np.ndarray: Embedding float32 [N, D].
+    """
+    fast = fast_preprocess_enabled() if fast is None else fast
+    if not fast:
+        images = [img if isinstance(img, Image.Image) else Image.fromarray(np.asarray(img)) for img in images]
+        return encoder.encode(images, convert_to_numpy=True, show_progress_bar=False)
+
+    preprocess = FastClipPreprocessor(image_processor_of(encoder))
+    if isinstance(images, np.ndarray) and images.ndim == 4:
+        return np.concatenate([
+            encode_pixels(encoder, preprocess(images[start : start + batch_size]))
+            for start in range(0, len(images), batch_size)
+        ]).astype(np.float32)
+
+    arrays = [
+        np.asarray(img.convert("RGB") if isinstance(img, Image.Image) else img, dtype=np.uint8) for img in images
+    ]
+    # Gambar dikelompokkan per ukuran (TinyImageNet: satu kelompok 64x64)
+    groups = {}
+    for pos, arr in enumerate(arrays):
+        groups.setdefault(arr.shape, []).append(pos)
+
+    outputs = [None] * len(arrays)
+    for positions in groups.values():
+        for start in range(0, len(positions), batch_size):
+            chunk = positions[start : start + batch_size]
+            emb = encode_pixels(encoder, preprocess(np.stack([arrays[pos] for pos in chunk])))
+            for pos, row in zip(chunk, emb):
+                outputs[pos] = row
+    return np.stack(outputs).astype(np.float32)
+
+class FastPreprocessEncoder:
+    """
+    Adapter untuk cek kesesuaian: gambar lewat `encode_image_batch(fast=True)`, teks lewat encoder asli.
+    """
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+
+    def encode(self, inputs, convert_to_numpy=True, show_progress_bar=False):
+        if inputs and isinstance(inputs[0], str):
+            return self.encoder.encode(inputs, convert_to_numpy=True, show_progress_bar=False)
+        return encode_image_batch(self.encoder, inputs, fast=True)
+
+
+# 4. CEK KESESUAIAN EMBEDDING
+
+def normalized(emb):
+    emb = np.asarray(emb, dtype=np.float64)
+    return emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+
+def agreement_samples(n=AGREEMENT_SAMPLES, seed=0):
+    """
+    Gambar & teks untuk cek kesesuaian: diambil dari index jika ada, selain itu sintetis.
+    """
+    from metadata_store import open_metadata, metadata_exists
+    from image_store import open_image_store
+
+    rng = np.random.default_rng(seed)
+    if metadata_exists():
+        metadata = open_metadata()
+        if len(metadata) > 0:
+            store = open_image_store()
+            images = []
+            for row in rng.choice(len(metadata), min(n, len(metadata)), replace=False):
+                path = metadata.paths[int(row)]
+                store_row = store.lookup_current(path) if store is not None else None
+                images.append(store.image(store_row) if store_row is not None else Image.open(path).convert("RGB"))
+            texts = [f"a photo of a {label.split(',')[0].strip()}" for label in metadata.labels][:n]
+            return images, texts
+
+    images = [Image.fromarray(rng.integers(0, 256, size=(64, 64, 3), dtype=np.uint8)) for _ in range(n)]
+    texts = [f"a photo of a {word}" for word in ("cat", "dog", "car", "bridge", "goldfish", "teapot")]
+    return images, texts
+
+def check_agreement(encoder, reference, images, texts, min_cosine, min_top1):
+    """
+    Membandingkan embedding encoder dengan referensi PyTorch per sampel.
+
+    Selain cosine similarity, diperiksa juga kesamaan hasil retrieval top-1
+    (setiap gambar -> teks terdekat) agar perbedaan kecil tidak mengubah peringkat.
+
+    Returns:
+        dict: Statistik per modalitas dan `passed` (semua cosine >= min_cosine
+        dan porsi top-1 yang sama >= min_top1).
+    """
+    report = {"min_cosine_required": min_cosine, "min_top1_required": min_top1}
+    embs = {}
+    for modality, inputs in (("image", images), ("text", texts)):
+        ref = normalized(reference.encode(inputs, convert_to_numpy=True, show_progress_bar=False))
+        t0 = time.perf_counter()
+        out = normalized(encoder.encode(inputs, convert_to_numpy=True, show_progress_bar=False))
+        elapsed = time.perf_counter() - t0
+        cosine = np.sum(ref * out, axis=1)
+        report[modality] = {
+            "samples": len(inputs),
+            "min_cosine": float(cosine.min()),
+            "mean_cosine": float(cosine.mean()),
+            "items_per_sec": len(inputs) / elapsed if elapsed > 0 else 0.0
+        }
+        embs[modality] = (ref, out)
+
+    ref_top1 = np.argmax(embs["image"][0] @ embs["text"][0].T, axis=1)
+    out_top1 = np.argmax(embs["image"][1] @ embs["text"][1].T, axis=1)
+    report["top1_agreement"] = float(np.mean(ref_top1 == out_top1))
+    report["passed"] = bool(
+        report["image"]["min_cosine"] >= min_cosine and report["text"]["min_cosine"] >= min_cosine
+        and report["top1_agreement"] >= min_top1
+    )
+    return report
+
+def run_agreement_check(backend, reference=None, model_dir=config.CLIP_ONNX_DIR, samples=AGREEMENT_SAMPLES):
+    """
+    Menjalankan cek kesesuaian untuk satu backend ONNX dan menyimpan hasilnya ke agreement.json.
+    """
+    reference = reference or load_torch_encoder(device="cpu")
+    encoder = OnnxClipEncoder(backend, model_dir)
+    images, texts = agreement_samples(samples)
+
+    report = check_agreement(
+        encoder, reference, images, texts,
+        config.CLIP_AGREEMENT_MIN_COSINE[backend], config.CLIP_AGREEMENT_MIN_TOP1[backend]
+    )
+    report["model"] = config.CLIP_MODEL_NAME
+
+    path = os.path.join(model_dir, AGREEMENT_FILE)
+    results = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            results = json.load(f)
+    results[backend] = report
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    flag = "✅" if report["passed"] else "❌"
+    print(f"{flag} {backend}: cosine min gambar {report['image']['min_cosine']:.5f}, "
+          f"teks {report['text']['min_cosine']:.5f} (batas {report['min_cosine_required']}), "
+          f"top-1 sama {report['top1_agreement'] * 100:.1f}% (batas {report['min_top1_required'] * 100:.1f}%)")
+    return report
+
+def run_preprocess_check(reference=None, samples=AGREEMENT_SAMPLES, check_path=config.CLIP_PREPROCESS_CHECK_FILE):
+    """
+    Membandingkan preprocessing ter-vektorisasi dengan preprocessing PIL per gambar
+    (encoder PyTorch yang sama) dan menyimpan hasilnya; jalur cepat hanya dipakai jika lolos.
+    """
+    reference = reference or load_torch_encoder(device="cpu")
+    images, texts = agreement_samples(samples)
+    report = check_agreement(
+        FastPreprocessEncoder(reference), reference, images, texts,
+        config.CLIP_PREPROCESS_MIN_COSINE, config.CLIP_PREPROCESS_MIN_TOP1
+    )
+    report["model"] = config.CLIP_MODEL_NAME
+
+    os.makedirs(os.path.dirname(check_path), exist_ok=True)
+    with open(check_path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    flag = "✅" if report["passed"] else "❌"
+    print(f"{flag} Preprocessing cepat: cosine min {report['image']['min_cosine']:.5f}, "
+          f"rata-rata {report['image']['mean_cosine']:.5f}, top-1 sama {report['top1_agreement'] * 100:.1f}%, "
+          f"{report['image']['items_per_sec']:.1f} gambar/s")
+    return report
+
+def preprocess_check_passed(check_path=config.CLIP_PREPROCESS_CHECK_FILE):
+    if not os.path.exists(check_path):
+        return False
+    with open(check_path, 'r') as f:
+        report = json.load(f)
+    return (
+        bool(report.get("passed")) and report.get("model") == config.CLIP_MODEL_NAME
+        and report.get("min_cosine_required") == config.CLIP_PREPROCESS_MIN_COSINE
+        and report.get("min_top1_required") == config.CLIP_PREPROCESS_MIN_TOP1
+    )
+
+# Hasil keputusan jalur preprocessing (dihitung sekali per proses)
+_fast_preprocess = None
+
+def fast_preprocess_enabled():
+    """
+    True jika preprocessing ter-vektorisasi aktif di config dan sudah lolos cek
+    (`python clip_encoder.py check-preprocess`), selain itu preprocessing PIL.
+    """
+    global _fast_preprocess
+    if _fast_preprocess is None:
+        _fast_preprocess = config.CLIP_FAST_PREPROCESS and preprocess_check_passed()
+        if config.CLIP_FAST_PREPROCESS and not _fast_preprocess:
+            print("⚠️ Preprocessing cepat belum lolos cek kesesuaian "
+                  "(python clip_encoder.py check-preprocess), memakai preprocessing PIL.")
+    return _fast_preprocess
+
+def agreement_passed(backend, model_dir=config.CLIP_ONNX_DIR):
+    path = os.path.join(model_dir, AGREEMENT_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path, 'r') as f:
+        report = json.load(f).get(backend, {})
+    # Hasil cek dengan batas lama (atau tanpa batas top-1) tidak berlaku lagi
+    return (
+        bool(report.get("passed")) and report.get("model") == config.CLIP_MODEL_NAME
+        and report.get("min_cosine_required") == config.CLIP_AGREEMENT_MIN_COSINE[backend]
+        and report.get("min_top1_required") == config.CLIP_AGREEMENT_MIN_TOP1[backend]
+    )
+
+
+# 5. PEMILIHAN BACKEND
+
+def load_encoder(backend=config.CLIP_BACKEND, device=config.DEVICE):
+    """
+    Memuat encoder CLIP sesuai backend. Backend ONNX yang belum di-export atau belum
+    lolos cek kesesuaian diganti dengan SentenceTransformer (PyTorch).
+
+    Returns:
+        tuple: (encoder dengan method `encode`, nama backend yang benar-benar dipakai).
+    """
+    if backend != "torch":
+        if not OnnxClipEncoder.exists(backend):
+            print(f"⚠️ Model {backend} belum di-export (python clip_encoder.py export), memakai PyTorch.")
+        elif not agreement_passed(backend):
+            print(f"⚠️ Backend {backend} belum lolos cek kesesuaian embedding "
+                  f"(python clip_encoder.py check --backend {backend}), memakai PyTorch.")
+        else:
+            print(f"⚡ Encoder CLIP: ONNX Runtime ({backend})")
+            return OnnxClipEncoder(backend), backend
+
+    return load_torch_encoder(device), "torch"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export & cek backend encoder CLIP (ONNX Runtime).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export tower CLIP ke ONNX lalu jalankan cek kesesuaian.")
+    export_parser.add_argument("--no-int8", action="store_true", help="Lewati model kuantisasi int8.")
+    export_parser.add_argument("--samples", type=int, default=AGREEMENT_SAMPLES)
+
+    check_parser = subparsers.add_parser("check", help="Cek kesesuaian embedding backend terhadap PyTorch.")
+    check_parser.add_argument("--backend", choices=("onnx", "onnx_int8"), default="onnx")
+    check_parser.add_argument("--samples", type=int, default=AGREEMENT_SAMPLES)
+
+    preprocess_parser = subparsers.add_parser(
+        "check-preprocess",
+        help="Bandingkan preprocessing ter-vektorisasi dengan preprocessing PIL per gambar dan simpan hasilnya."
+    )
+    preprocess_parser.add_argument("--samples", type=int, default=AGREEMENT_SAMPLES)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        reference = export_onnx(quantize=not args.no_int8)
+        for backend in ("onnx",) if args.no_int8 else ("onnx", "onnx_int8"):
+            run_agreement_check(backend, reference, samples=args.samples)
+    elif args.command == "check":
+        run_agreement_check(args.backend, samples=args.samples)
+    else:
+        run_preprocess_check(samples=args.samples)
@@ -17,6 +17,12 @@ TRAIN_DIR = os.path.join(DATASET_DIR, "Train")
 VAL_DIR   = os.path.join(DATASET_DIR, "Val")
 WORDS_FILE = os.path.join(DATASET_DIR, "words.txt")
 
+# Dataset ter-decode dalam satu array uint8 N x 64 x 64 x 3 (memory-mapped), dibuat oleh image_store.py
+IMAGE_STORE_DIR = os.path.join(DATASET_DIR, "packed")
+IMAGE_STORE_SIZE = 64
+# Baca gambar dari image store (jika sudah di-pack) alih-alih membuka & decode file per gambar
+USE_IMAGE_STORE = True
+
 # --- FOLDER SISTEM RAG ---
 # Tempat menyimpan file vektor (FAISS) dan cache model agar tidak download ulang
 VECTOR_DB_DIR = os.path.join(BASE_DIR, "vector_db")
@@ -31,23 +37,221 @@ for folder in target_folders:
 
 # File database disimpan
 INDEX_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_index.bin")
+# Metadata format kolom (memory-mapped) yang dibaca oleh RAGSystem
+METADATA_STORE_DIR = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_metadata")
+
+# Ekspor JSON metadata (opsional, untuk debugging)
 METADATA_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_metadata.json")
 
+# Manifest file yang sudah ter-index (path, ukuran, mtime, row id) untuk mode incremental
+MANIFEST_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_manifest.json")
+
+# Matrix embedding float32 hasil merge (memory-mappable, urutan = row id index)
+EMBEDDINGS_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_embeddings.npy")
+
+# Folder checkpoint shard selama proses indexing (dihapus setelah merge sukses)
+SHARDS_DIR = os.path.join(VECTOR_DB_DIR, "shards")
+
+# Hasil tuning recall/latency (operating point nprobe/efSearch) untuk index aproksimasi
+INDEX_TUNING_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_index_tuning.json")
+
+# Laporan ukuran index & recall yang hilang dibanding pencarian exact (ann_index.py report)
+INDEX_REPORT_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_index_report.json")
+
+# Jenis index: "flat" (exact), "ivf_flat", "ivf_pq", "hnsw",
+# atau "sq_fp16" / "sq_int8" (vektor disimpan float16 / int8, memori 2x / 4x lebih kecil)
+INDEX_TYPE = "flat"
+
+# Parameter IVF (jumlah cluster, cluster yang diperiksa saat search, sampel training)
+IVF_NLIST = 1024
+IVF_NPROBE = 16
+INDEX_TRAIN_SIZE = 65536
+
+# Parameter Product Quantization (IVF-PQ): jumlah sub-vektor & bit per kode
+PQ_M = 64
+PQ_NBITS = 8
+
+# Parameter HNSW (jumlah tetangga graph, lebar pencarian saat build & search)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Re-rank exact: ambil top_k * faktor kandidat dari index kompak lalu urutkan ulang
+# dengan vektor float32 dari EMBEDDINGS_FILE (memmap). 0 = nonaktif
+RERANK_FACTOR = 0
+
+# Target recall@k terhadap index flat saat memilih operating point (ann_index.py tune)
+INDEX_TARGET_RECALL = 0.95
+
+# Filter search (kelas/split/prefix path): subset hingga ukuran ini dicari exact langsung
+# dari matrix embedding, subset lebih besar memakai IDSelector FAISS
+FILTER_BRUTE_FORCE_MAX = 20000
+
+# Graph tetangga top-K per baris index (dibangun indexer): pencarian gambar yang sudah
+# ter-index cukup membaca tabel, tanpa encode CLIP & FAISS. 0 = nonaktif
+NEIGHBOR_GRAPH_K = 32
+NEIGHBOR_IDS_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_neighbor_ids.npy")
+NEIGHBOR_SCORES_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_neighbor_scores.npy")
+# Sidik jari index & operating point saat graph dibangun (graph lama diabaikan jika berbeda)
+NEIGHBOR_INFO_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_neighbor_graph.json")
+
+# Router dua tahap per kelas: centroid embedding & label words.txt per kelas, baris per kelas
+ROUTER_FILE = os.path.join(VECTOR_DB_DIR, "tiny_imagenet_rag_router.npz")
+
+# Aktifkan routing pada search: hanya baris milik ROUTER_TOP_CLASSES kelas teratas yang dicari
+ROUTER_ENABLED = False
+ROUTER_TOP_CLASSES = 8
+
+# Bobot skor label teks vs centroid gambar pada tahap kasar, dan template prompt label CLIP
+ROUTER_TEXT_WEIGHT = 0.5
+ROUTER_TEXT_TEMPLATE = "a photo of a {}"
+
 # 3. KONFIGURASI MODEL AI
 
 # Model Embedding (Pengubah Gambar ke Angka)
 CLIP_MODEL_NAME = 'clip-ViT-B-32'
 
+# Backend encoder CLIP untuk indexing & query:
+# - "torch"     : SentenceTransformer (PyTorch eager, referensi).
+# - "onnx"      : tower gambar & teks hasil export ke ONNX Runtime (float32).
+# - "onnx_int8" : seperti "onnx" dengan bobot dikuantisasi dinamis int8.
+# Backend ONNX dibuat dengan `python clip_encoder.py export` dan hanya dipakai jika
+# lolos cek kesesuaian embedding terhadap PyTorch (selain itu kembali ke "torch").
+CLIP_BACKEND = "torch"
+CLIP_ONNX_DIR = os.path.join(MODELS_CACHE_DIR, "clip_onnx")
+CLIP_ONNX_THREADS = 0  # Thread intra-op ONNX Runtime (0 = bawaan)
+
+# Cosine similarity minimum (per sampel) terhadap embedding PyTorch agar backend dianggap kompatibel
+CLIP_AGREEMENT_MIN_COSINE = {"onnx": 0.999, "onnx_int8": 0.97}
+# Porsi minimum gambar yang hasil retrieval top-1 (gambar -> teks) sama dengan PyTorch
+CLIP_AGREEMENT_MIN_TOP1 = {"onnx": 0.99, "onnx_int8": 0.95}
+
+# Preprocessing gambar CLIP ter-vektorisasi: satu batch uint8 [N, H, W, 3] di-resize & dinormalisasi
+# sebagai operasi tensor (False = preprocessing PIL per gambar bawaan SentenceTransformer).
+# Hanya dipakai setelah lolos `python clip_encoder.py check-preprocess` (selain itu kembali ke PIL).
+CLIP_FAST_PREPROCESS = True
+CLIP_PREPROCESS_CHECK_FILE = os.path.join(MODELS_CACHE_DIR, "clip_fast_preprocess.json")
+CLIP_PREPROCESS_MIN_COSINE = 0.999
+CLIP_PREPROCESS_MIN_TOP1 = 0.99
+
 # Model Generatif (Pemberi Deskripsi)
 VLM_MODEL_NAME = "Qwen/Qwen2-VL-2B-Instruct"
 
+# Qwen2-VL baru dimuat saat deskripsi pertama diminta (False = muat saat startup)
+VLM_LAZY_LOAD = True
+
+# Jumlah token maksimum deskripsi yang dihasilkan
+VLM_MAX_NEW_TOKENS = 200
+
+# Profil inferensi Qwen2-VL (lihat VLM_PROFILES). "default" = perilaku awal (float16, 200 token).
+# Profil CPU dipilih secara eksplisit setelah dibandingkan dengan `benchmark.py --vlm-profiles`;
+# "auto" (opt-in) = "cpu_bf16" jika DEVICE == 'cpu', selain itu "default".
+VLM_PROFILE = "default"
+
+# Setiap profil menentukan:
+# - dtype           : "float16" / "bfloat16" / "float32", atau "int8" (bobot nn.Linear
+#                     dikuantisasi dinamis oleh torch, hanya untuk CPU).
+# - device_map      : "auto" (GPU jika ada) atau "cpu".
+# - min/max_pixels  : batas resolusi image processor (None = bawaan model). Gambar 64x64
+#                     menjadi 56x56 = 4 token visual; batas atas mencegah gambar besar
+#                     menghasilkan ratusan token visual.
+# - max_new_tokens  : panjang maksimum deskripsi.
+# - num_threads / interop_threads : thread intra-op & inter-op torch (0 = bawaan torch).
+#                     Diterapkan saat Qwen2-VL dimuat dan berlaku untuk seluruh proses
+#                     (termasuk CLIP); interop hanya bisa diatur jika VLM_LAZY_LOAD = False.
+_CPU_THREADS = os.cpu_count() or 1
+VLM_PROFILES = {
+    "default": {
+        "dtype": "float16", "device_map": "auto",
+        "min_pixels": None, "max_pixels": None,
+        "max_new_tokens": VLM_MAX_NEW_TOKENS,
+        "num_threads": 0, "interop_threads": 0
+    },
+    "cpu_bf16": {
+        "dtype": "bfloat16", "device_map": "cpu",
+        "min_pixels": 56 * 56, "max_pixels": 112 * 112,
+        "max_new_tokens": 96,
+        "num_threads": _CPU_THREADS, "interop_threads": 1
+    },
+    "cpu_int8": {
+        "dtype": "int8", "device_map": "cpu",
+        "min_pixels": 56 * 56, "max_pixels": 112 * 112,
+        "max_new_tokens": 96,
+        "num_threads": _CPU_THREADS, "interop_threads": 1
+    },
+}
+
+# Jumlah gambar per pemanggilan generate pada deskripsi ber-batch
+VLM_GENERATION_BATCH_SIZE = 4
+
+# Cache persisten deskripsi (SQLite, aman dipakai bersama beberapa proses)
+DESCRIPTION_CACHE_FILE = os.path.join(VECTOR_DB_DIR, "description_cache.sqlite")
+DESCRIPTION_CACHE_SIZE = 50000  # Jumlah entri maksimum (0 = nonaktif)
+
+# Cache fitur visual Qwen2-VL per baris index (output vision tower, float16 memmap).
+# Gambar ter-index yang sudah ada di cache tidak melewati image processor & vision tower lagi.
+VISION_CACHE_DIR = os.path.join(VECTOR_DB_DIR, "vision_features")
+VISION_CACHE_ENABLED = True
+
 # Pengaturan Hardware (Otomatis pakai GPU T4 di Colab)
 DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
 
 # Parameter Pencarian
 TOP_K = 5  # Jumlah kemiripan yang ditampilkan
 
-# 4. STATUS LOG
+# Cache LRU embedding query (teks & gambar) agar query berulang tidak di-encode ulang
+QUERY_CACHE_SIZE = 4096
+QUERY_CACHE_PERSIST = False  # True = simpan cache ke disk antar restart
+QUERY_CACHE_FILE = os.path.join(VECTOR_DB_DIR, "query_embedding_cache.npz")
+
+# 4. KONFIGURASI INDEXING
+
+# Jumlah thread decoder gambar yang berjalan paralel dengan encoding CLIP.
+# Set ke 0 untuk decode sinkron di main thread (berguna untuk debugging).
+INDEX_NUM_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Jumlah batch yang boleh di-decode lebih dulu (antrian prefetch terbatas)
+INDEX_PREFETCH_BATCHES = 2 * INDEX_NUM_WORKERS
+
+# Jumlah gambar per shard checkpoint. Memori indexing dibatasi oleh satu shard.
+INDEX_SHARD_SIZE = 8192
+
+# 5. KONFIGURASI SEARCH SERVICE (search_service.py)
+
+SERVICE_HOST = "0.0.0.0"
+SERVICE_PORT = 8000
+
+# Micro-batching: request yang datang dalam jendela MAX_WAIT_MS di-encode bersama
+SERVICE_MAX_BATCH_SIZE = 32
+SERVICE_MAX_WAIT_MS = 5
+
+# Batas request: top_k maksimum per query dan ukuran body JSON (byte, termasuk gambar base64)
+SERVICE_MAX_TOP_K = 100
+SERVICE_MAX_BODY_BYTES = 10 * 1024 * 1024
+
+# 6. BENCHMARK
+
+# Folder laporan benchmark (benchmark.py), juga dipakai sebagai lokasi baseline
+BENCHMARK_DIR = os.path.join(BASE_DIR, "benchmarks")
+
+# 7. INSTRUMENTASI & METRIK (metrics.py)
+
+# File teks Prometheus (textfile collector). None = tidak diekspor ke file.
+# {role} diisi peran proses ("app", "indexer", "service", "evaluation", "benchmark") agar proses
+# berbeda tidak saling menimpa; app & service menambahkan port-nya (misal "service-8000") sehingga
+# beberapa replika di satu host juga menulis file masing-masing.
+METRICS_FILE = os.path.join(VECTOR_DB_DIR, "metrics_{role}.prom")
+METRICS_EXPORT_INTERVAL = 10  # detik, minimal jeda antar penulisan file
+
+# Level log terstruktur (JSON) logger "rag"; DEBUG = log latency setiap tahap
+LOG_LEVEL = "INFO"
+
+# Profiling tersampel: fraksi request yang diprofil (0 = nonaktif)
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_BACKEND = "cprofile"  # "cprofile" atau "torch"
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+
+# 8. STATUS LOG
 
 print(f"⚙️  Konfigurasi Sistem Dimuat (Mode: No-Auth).")
 print(f"   - Device       : {DEVICE}")
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+# Import konfigurasi lokal
+import config
+
+
+class DescriptionCache:
+    """
+    Cache persisten (SQLite) untuk deskripsi hasil Qwen2-VL.
+
+    Kunci cache mencakup identitas gambar (path, ukuran, mtime), label, prompt,
+    dan pengaturan generasi, sehingga perubahan salah satunya otomatis
+    menghasilkan entri baru. SQLite mode WAL aman dipakai bersama oleh
+    beberapa proses aplikasi sekaligus. Jumlah entri dibatasi; entri yang
+    paling lama tidak diakses dibuang lebih dulu (LRU).
+    """
+
+    def __init__(self, db_path=config.DESCRIPTION_CACHE_FILE, max_entries=config.DESCRIPTION_CACHE_SIZE):
+        """
+        Args:
+            db_path (str): Lokasi file database SQLite.
+            max_entries (int): Jumlah maksimum deskripsi yang disimpan (0 = nonaktif).
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+
+        if self.max_entries > 0:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS descriptions ("
+                    " key TEXT PRIMARY KEY,"
+                    " description TEXT NOT NULL,"
+                    " created REAL NOT NULL,"
+                    " last_access REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_last_access ON descriptions (last_access)"
+                )
+
+    @contextmanager
+    def _connect(self):
+        # Koneksi per operasi: aman lintas thread & proses, timeout menunggu lock penulis lain
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(image_path, label, prompt, settings):
+        """
+        Membuat kunci cache dari identitas gambar, label, prompt, dan pengaturan generasi.
+
+        Returns:
+            str atau None: Hash kunci, None jika file gambar tidak bisa di-stat.
+        """
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return None
+
+        identity = {
+            "path": os.path.abspath(image_path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "label": label,
+            "prompt": prompt,
+            "settings": settings
+        }
+        payload = json.dumps(identity, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key):
+        """
+        Mengambil deskripsi dari cache (dan memperbarui waktu akses), atau None.
+        """
+        if key is None or self.max_entries <= 0:
+            return None
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT description FROM descriptions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE descriptions SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0]
+
+    def put(self, key, description):
+        """
+        Menyimpan deskripsi lalu membuang entri LRU jika melebihi batas.
+        """
+        if key is None or self.max_entries <= 0:
+            return
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, description, created, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, description, now, now)
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM descriptions WHERE key IN ("
+                    " SELECT key FROM descriptions ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def __len__(self):
+        if self.max_entries <= 0:
+            return 0
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
@@ -3,6 +3,7 @@ import shutil
 import os
 import config
 from tqdm import tqdm
+from image_store import pack_dataset
 
 
 def setup_dataset():
@@ -80,9 +81,13 @@ def setup_dataset():
         # os.remove(val_annot_file) # Simpan anotasi jika perlu debug
         print("✅ Struktur Validasi Selesai Diperbaiki.")
 
+    # 4. PACKING KE IMAGE STORE (SATU ARRAY UINT8 MEMORY-MAPPED)
+    pack_dataset()
+
     print("\n🎉 Dataset Siap Digunakan!")
     print(f"   Train: {config.TRAIN_DIR}")
     print(f"   Val  : {config.VAL_DIR}")
+    print(f"   Packed: {config.IMAGE_STORE_DIR}")
 
 
 if __name__ == "__main__":
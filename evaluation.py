@@ -1,5 +1,6 @@
 import time
 import os
+import argparse
 import random
 import numpy as np
 from tqdm import tqdm
@@ -14,11 +15,15 @@ import torch
 SAMPLE_SIZE_RETRIEVAL = 1000
 
 # Dibatasi agar evaluasi tidak memakan waktu berjam-jam (karena Qwen berat).
+# Set ke 0 untuk evaluasi retrieval saja (Qwen2-VL tidak dimuat).
 SAMPLE_SIZE_GENERATIVE = 20
 
 # Jumlah dokumen/gambar teratas yang diambil saat retrieval
 TOP_K = 5
 
+# Jumlah query yang di-encode & dicari sekaligus (rag.search_batch)
+SEARCH_BATCH_SIZE = 64
+
 
 # 2. FUNGSI UTILITAS (HELPER)
 
@@ -59,6 +64,40 @@ def load_tiny_imagenet_mapping(root_dir):
     return mapping
 
 
+def scan_validation_samples():
+    """
+    Memindai folder validasi (Val/<class_id>/gambar).
+
+    Daftar sampel selalu diambil dari disk (bukan dari tabel image store) agar file
+    yang dihapus/ditambahkan setelah packing ikut tercermin. Piksel gambar yang
+    tidak berubah tetap dibaca dari image store lewat `RAGSystem.load_image`.
+
+    Returns:
+        list: Daftar dict {'path', 'class_id'}.
+    """
+    val_samples = []
+    print(f"📂 Scanning Folder Validasi: {config.VAL_DIR}")
+
+    if os.path.exists(config.VAL_DIR):
+        # Ambil hanya folder (hindari file nyasar seperti .DS_Store)
+        classes = [d for d in os.listdir(config.VAL_DIR) if os.path.isdir(os.path.join(config.VAL_DIR, d))]
+
+        for class_id in tqdm(classes, desc="Indexing Classes"):
+            class_path = os.path.join(config.VAL_DIR, class_id)
+
+            # Support .jpg, .png, DAN .jpeg (penting!)
+            images = [f for f in os.listdir(class_path)
+                      if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+
+            for img in images:
+                val_samples.append({
+                    'path': os.path.join(class_path, img),
+                    'class_id': class_id
+                })
+
+    return val_samples
+
+
 # 3. METRIK EVALUASI
 
 def calculate_mrr(results, target_class_id):
@@ -77,6 +116,32 @@ def calculate_lir(description, target_names):
     return 0
 
 
+def retrieval_metrics(result_classes, query_classes, ks=(1, 5)):
+    """
+    Menghitung Recall@k, Precision@k, dan MRR secara vektorisasi dengan numpy.
+
+    Args:
+        result_classes (np.ndarray): Kode kelas hasil retrieval [Q, K] (-1 = tidak ada hasil).
+        query_classes (np.ndarray): Kode kelas query [Q].
+        ks (tuple): Nilai k yang dilaporkan (<= K).
+
+    Returns:
+        dict: {"recall@k", "precision@k", "mrr"}.
+    """
+    relevant = (result_classes == query_classes[:, None]) & (result_classes >= 0)
+
+    report = {}
+    for k in ks:
+        report[f"recall@{k}"] = float(relevant[:, :k].any(axis=1).mean())
+        report[f"precision@{k}"] = float(relevant[:, :k].mean())
+
+    # Rank relevan pertama (1-based); query tanpa hasil relevan berkontribusi 0
+    has_hit = relevant.any(axis=1)
+    first_rank = relevant.argmax(axis=1) + 1
+    report["mrr"] = float(np.where(has_hit, 1.0 / first_rank, 0.0).mean())
+    return report
+
+
 # 4. PROGRAM UTAMA (MAIN LOOP)
 
 def run_evaluation():
@@ -90,32 +155,15 @@ def run_evaluation():
 
     # A. Inisialisasi Sistem & Mapping
     try:
-        rag = RAGSystem()
+        # Tanpa sampel generatif, Qwen2-VL tidak perlu dimuat sama sekali
+        rag = RAGSystem(retrieval_only=SAMPLE_SIZE_GENERATIVE == 0)
         id_to_name = load_tiny_imagenet_mapping(config.VAL_DIR)
     except Exception as e:
         print(f"❌ Error Initialization: {e}")
         return
 
     # B. Persiapan Data (Scanning Dataset) - BAGIAN INI DIPERBAIKI
-    val_samples = []
-    print(f"📂 Scanning Folder Validasi: {config.VAL_DIR}")
-
-    if os.path.exists(config.VAL_DIR):
-        # Ambil hanya folder (hindari file nyasar seperti .DS_Store)
-        classes = [d for d in os.listdir(config.VAL_DIR) if os.path.isdir(os.path.join(config.VAL_DIR, d))]
-
-        for class_id in tqdm(classes, desc="Indexing Classes"):
-            class_path = os.path.join(config.VAL_DIR, class_id)
-
-            # Support .jpg, .png, DAN .jpeg (penting!)
-            images = [f for f in os.listdir(class_path)
-                      if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-
-            for img in images:
-                val_samples.append({
-                    'path': os.path.join(class_path, img),
-                    'class_id': class_id
-                })
+    val_samples = scan_validation_samples()
 
     print(f"📊 Total Data Validasi Ditemukan: {len(val_samples)} gambar.")
 
@@ -135,13 +183,23 @@ def run_evaluation():
         'lir_hits': 0
     }
 
-    # E. Loop Evaluasi
+    # E. Retrieval Ber-batch (encode & search banyak query sekaligus)
+    all_results = []
+    for start in tqdm(range(0, len(test_set), SEARCH_BATCH_SIZE), desc="Retrieval"):
+        batch = test_set[start : start + SEARCH_BATCH_SIZE]
+        # Query berupa path: gambar ter-index dijawab dari graph tetangga, sisanya
+        # di-encode dengan piksel dari image store (jika ada)
+        all_results.extend(rag.search_batch(
+            [s['path'] for s in batch], top_k=TOP_K, query_types=["image"] * len(batch)
+        ))
+
+    # F. Loop Evaluasi
     debug_print_count = 0
+    gen_samples = []
 
-    for i, sample in enumerate(tqdm(test_set, desc="Benchmarking")):
+    for i, (sample, results) in enumerate(zip(tqdm(test_set, desc="Benchmarking"), all_results)):
 
         # --- PHASE 1: RETRIEVAL ---
-        results = rag.search(sample['path'], top_k=TOP_K)
 
         if not results: continue
 
@@ -164,31 +222,36 @@ def run_evaluation():
 
         # --- PHASE 2: GENERATIVE (Subset Only) ---
         if i < SAMPLE_SIZE_GENERATIVE:
-            try:
-                target_human_name = id_to_name.get(target_id, target_id)
-                desc = rag.generate_description(results[0]['path'], target_human_name)
-
-                is_hit = calculate_lir(desc, target_human_name)
-                metrics['lir_hits'] += is_hit
-
-                # Debug Print
-                if debug_print_count < 100:
-                    print("\n" + "-" * 30)
-                    print(f"🔍 DEBUG SAMPLE #{debug_print_count + 1}")
-                    print(f"   ID Folder   : {target_id}")
-                    print(f"   Target Name : {target_human_name}")
-                    print(f"   Qwen Output : {desc[:100]}...")  # Limit text
-                    print(f"   LIR Status  : {'✅ HIT' if is_hit else '❌ MISS'}")
-                    print("-" * 30)
-                    debug_print_count += 1
-
-                # Bersihkan cache GPU agar tidak OOM
-                torch.cuda.empty_cache()
-
-            except Exception as e:
-                pass
-
-                # F. Laporan Akhir
+            target_human_name = id_to_name.get(target_id, target_id)
+            gen_samples.append((target_id, results[0]['path'], target_human_name))
+
+    # Deskripsi subset generatif dibuat dengan pemanggilan generate ber-batch
+    if gen_samples:
+        try:
+            descs = rag.generate_descriptions([(path, name) for _, path, name in gen_samples])
+        except Exception as e:
+            print(f"❌ Error Generative Phase: {e}")
+            descs = []
+
+        for (target_id, _, target_human_name), desc in zip(gen_samples, descs):
+            is_hit = calculate_lir(desc, target_human_name)
+            metrics['lir_hits'] += is_hit
+
+            # Debug Print
+            if debug_print_count < 100:
+                print("\n" + "-" * 30)
+                print(f"🔍 DEBUG SAMPLE #{debug_print_count + 1}")
+                print(f"   ID Folder   : {target_id}")
+                print(f"   Target Name : {target_human_name}")
+                print(f"   Qwen Output : {desc[:100]}...")  # Limit text
+                print(f"   LIR Status  : {'✅ HIT' if is_hit else '❌ MISS'}")
+                print("-" * 30)
+                debug_print_count += 1
+
+        # Bersihkan cache GPU agar tidak OOM
+        torch.cuda.empty_cache()
+
+    # G. Laporan Akhir
     n_ret = len(test_set)
     # Hindari pembagian dengan nol jika loop generative gagal total
     n_gen = max(debug_print_count, 1)
@@ -203,5 +266,112 @@ def run_evaluation():
     print("╚══════════════════════════════════════╝")
 
 
+# 5. EVALUASI VEKTORISASI (SELURUH DATA VALIDASI)
+
+def embed_validation(rag, val_samples, path_to_row):
+    """
+    Mengambil embedding seluruh query validasi.
+
+    Gambar validasi yang sudah ada di index memakai embedding tersimpan
+    (identik dengan hasil encode CLIP), sisanya di-encode per batch.
+
+    Returns:
+        tuple: (matrix embedding float32 [Q, D], row id tiap query di index atau -1).
+    """
+    stored = np.load(config.EMBEDDINGS_FILE, mmap_mode='r') if os.path.exists(config.EMBEDDINGS_FILE) else None
+    query_emb = np.empty((len(val_samples), rag.index.d), dtype='float32')
+
+    rows = np.array([path_to_row.get(s['path'], -1) for s in val_samples], dtype='int64')
+    missing = np.flatnonzero(rows < 0) if stored is not None else np.arange(len(val_samples))
+
+    if stored is not None:
+        found = np.flatnonzero(rows >= 0)
+        query_emb[found] = stored[rows[found]]
+
+    for start in tqdm(range(0, len(missing), SEARCH_BATCH_SIZE), desc="Encoding Val"):
+        batch = missing[start : start + SEARCH_BATCH_SIZE]
+        query_emb[batch] = rag.encode_queries(
+            [val_samples[i]['path'] for i in batch], ["image"] * len(batch)
+        )
+
+    return query_emb, rows
+
+def run_vectorized_evaluation(top_k=TOP_K):
+    """
+    Evaluasi retrieval seluruh data validasi dengan satu pencarian FAISS.
+
+    Query di-embed per batch, lalu satu pemanggilan `index.search` untuk seluruh
+    matrix. Baris milik query itu sendiri (gambar val juga ter-index) dibuang
+    sebelum metrik dihitung dari array kode kelas integer.
+    """
+    print("\n" + "=" * 50)
+    print("🚀 MEMULAI EVALUASI RETRIEVAL VEKTORISASI (FULL VAL)")
+    print("=" * 50)
+
+    try:
+        rag = RAGSystem(retrieval_only=True)
+    except Exception as e:
+        print(f"❌ Error Initialization: {e}")
+        return
+
+    val_samples = scan_validation_samples()
+    print(f"📊 Total Data Validasi Ditemukan: {len(val_samples)} gambar.")
+    if not val_samples:
+        print("❌ Data validasi kosong. Pastikan path benar.")
+        return
+
+    store = rag.metadata
+    path_to_row = {path: row for row, path in enumerate(store.paths)}
+    class_to_code = {class_id: code for code, class_id in enumerate(store.class_ids)}
+
+    # A. Row id tiap query di index (gambar val juga ter-index)
+    t0 = time.perf_counter()
+    graph = rag.neighbor_graph
+    self_rows = np.array([path_to_row.get(s['path'], -1) for s in val_samples], dtype='int64')
+    if graph is not None and graph.k >= top_k + 1 and (self_rows >= 0).all():
+        # B. Semua query sudah ter-index: tetangga dibaca langsung dari graph (tanpa encode & FAISS)
+        print("🕸️  Memakai graph tetangga tersimpan (tanpa encode & pencarian ulang).")
+        _, ids = graph.search(self_rows, top_k + 1)
+    else:
+        # B. Embedding seluruh query lalu satu pencarian FAISS
+        # (+1 kandidat untuk menggantikan baris query sendiri)
+        query_emb, self_rows = embed_validation(rag, val_samples, path_to_row)
+        _, ids = rag.index.search(query_emb, top_k + 1)
+
+    # Buang baris milik query sendiri & hasil kosong (-1), lalu ambil k teratas
+    keep = (ids != self_rows[:, None]) & (ids >= 0)
+    order = np.argsort(~keep, axis=1, kind='stable')[:, :top_k]
+    ids = np.take_along_axis(ids, order, axis=1)
+    keep = np.take_along_axis(keep, order, axis=1)
+
+    # C. Kode kelas hasil & query (integer), lalu metrik
+    class_codes = np.asarray(store.class_codes)
+    result_classes = np.where(keep, class_codes[np.where(keep, ids, 0)], -1)
+    query_classes = np.array([class_to_code.get(s['class_id'], -2) for s in val_samples])
+
+    report = retrieval_metrics(result_classes, query_classes, ks=sorted({1, top_k}))
+    elapsed = time.perf_counter() - t0
+
+    print(f"\n╔═══════ FULL VAL REPORT ({len(val_samples)} query) ═══════╗")
+    for name, value in report.items():
+        unit = "" if name == "mrr" else " %"
+        shown = value if name == "mrr" else value * 100
+        print(f"║ {name:<12}: {shown:8.4f}{unit}")
+    print(f"║ Waktu        : {elapsed:8.2f} s")
+    print("╚════════════════════════════════════════════╝")
+    return report
+
+
 if __name__ == "__main__":
-    run_evaluation()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluasi sistem RAG TinyImageNet.")
+    parser.add_argument("--full", action="store_true",
+                        help="Evaluasi retrieval vektorisasi pada seluruh data validasi.")
+    args = parser.parse_args()
+
+    from metrics import set_role
+    set_role("evaluation")
+
+    if args.full:
+        run_vectorized_evaluation()
+    else:
+        run_evaluation()
\ No newline at end of file
@@ -2,6 +2,7 @@ import os
 import shutil
 from tqdm import tqdm
 import config
+from image_store import pack_dataset
 
 
 def flatten_train_structure():
@@ -36,6 +37,10 @@ def flatten_train_structure():
     print(f"\n✅ Selesai! {count_moved} gambar berhasil dipindahkan.")
     print("Sekarang struktur folder Train sudah benar (Flat).")
 
+    # Path gambar training berubah -> image store di-pack ulang
+    if count_moved:
+        pack_dataset()
+
 
 if __name__ == "__main__":
     flatten_train_structure()
\ No newline at end of file
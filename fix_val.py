@@ -2,6 +2,7 @@ import os
 import shutil
 from tqdm import tqdm
 import config
+from image_store import pack_dataset
 
 
 def fix_validation_structure():
@@ -88,6 +89,10 @@ def fix_validation_structure():
     print(f"   - Gambar tanpa label : {missing_count}")
     print(f"   - Lokasi Validasi    : {val_dir}")
 
+    # Path gambar validasi berubah -> image store di-pack ulang
+    if moved_count:
+        pack_dataset()
+
 
 if __name__ == "__main__":
     fix_validation_structure()
\ No newline at end of file
@@ -0,0 +1,265 @@
+import os
+import json
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+# Import konfigurasi lokal
+import config
+from metadata_store import PackedStrings
+
+# Nama file di dalam folder image store
+IMAGES_FILE = "images.npy"
+PATHS_FILE = "paths"
+CLASS_IDS_FILE = "class_ids"
+CLASS_CODES_FILE = "class_codes.npy"
+SIZES_FILE = "sizes.npy"
+MTIMES_FILE = "mtimes_ns.npy"
+INFO_FILE = "info.json"
+
+FORMAT_VERSION = 1
+
+# Jumlah gambar yang di-decode per langkah saat packing
+PACK_CHUNK_SIZE = 1024
+
+
+# 1. PACKING DATASET
+
+def scan_split(root_dir):
+    """
+    Memindai folder split (Train/ atau Val/) berstruktur folder_kelas/.../gambar.
+
+    Returns:
+        list: Daftar tuple [(path_gambar, class_id), ...] terurut menurut path.
+    """
+    image_paths = []
+    if not os.path.exists(root_dir):
+        return image_paths
+
+    for class_folder in sorted(os.listdir(root_dir)):
+        class_path = os.path.join(root_dir, class_folder)
+        if not os.path.isdir(class_path):
+            continue
+        for root, _, files in os.walk(class_path):
+            for file in files:
+                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    image_paths.append((os.path.join(root, file), class_folder))
+
+    return sorted(image_paths)
+
+def decode_fixed(path, size=config.IMAGE_STORE_SIZE):
+    """
+    Men-decode satu gambar menjadi array uint8 [size, size, 3] (di-resize jika ukurannya lain).
+
+    Returns:
+        np.ndarray atau None: Array gambar, None jika file corrupt.
+    """
+    try:
+        img = Image.open(path).convert('RGB')
+        if img.size != (size, size):
+            img = img.resize((size, size), Image.BICUBIC)
+        return np.asarray(img, dtype=np.uint8)
+    except Exception:
+        return None
+
+def pack_dataset(splits=(config.TRAIN_DIR, config.VAL_DIR), store_dir=config.IMAGE_STORE_DIR,
+                 size=config.IMAGE_STORE_SIZE, num_workers=config.INDEX_NUM_WORKERS):
+    """
+    Men-decode seluruh gambar dataset sekali ke satu array uint8 N x size x size x 3
+    yang di-memory-map, beserta tabel path/kelas yang sejajar dengan baris array.
+
+    Folder ditulis ke lokasi sementara lalu di-rename agar pembaca tidak pernah
+    melihat store yang setengah jadi.
+
+    Returns:
+        int: Jumlah gambar yang tersimpan.
+    """
+    files = [item for root_dir in splits for item in scan_split(root_dir)]
+    print(f"📦 Packing {len(files)} gambar ke: {store_dir}")
+    if not files:
+        print("⚠️ Tidak ada gambar untuk di-pack.")
+        return 0
+
+    tmp_dir = store_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    images = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, IMAGES_FILE), mode='w+', dtype=np.uint8, shape=(len(files), size, size, 3)
+    )
+    kept = []
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        for start in tqdm(range(0, len(files), PACK_CHUNK_SIZE), desc="Packing"):
+            chunk = files[start : start + PACK_CHUNK_SIZE]
+            for (path, class_id), arr in zip(chunk, pool.map(lambda f: decode_fixed(f[0], size), chunk)):
+                if arr is None:
+                    print(f"⚠️ Gambar corrupt dilewati: {path}")
+                    continue
+                images[len(kept)] = arr
+                kept.append((path, class_id))
+
+    images.flush()
+    del images
+
+    # Buang baris sisa milik gambar corrupt (jarang; hanya terjadi jika ada yang dilewati)
+    if len(kept) < len(files):
+        full = np.load(os.path.join(tmp_dir, IMAGES_FILE), mmap_mode='r')
+        trimmed = np.lib.format.open_memmap(
+            os.path.join(tmp_dir, IMAGES_FILE + ".trim"), mode='w+', dtype=np.uint8,
+            shape=(len(kept), size, size, 3)
+        )
+        trimmed[:] = full[:len(kept)]
+        trimmed.flush()
+        del full, trimmed
+        os.replace(os.path.join(tmp_dir, IMAGES_FILE + ".trim"), os.path.join(tmp_dir, IMAGES_FILE))
+
+    class_ids = sorted({class_id for _, class_id in kept})
+    code_of = {class_id: code for code, class_id in enumerate(class_ids)}
+    stats = [os.stat(path) for path, _ in kept]
+
+    PackedStrings.write([path for path, _ in kept], os.path.join(tmp_dir, PATHS_FILE))
+    PackedStrings.write(class_ids, os.path.join(tmp_dir, CLASS_IDS_FILE))
+    np.save(os.path.join(tmp_dir, CLASS_CODES_FILE),
+            np.array([code_of[class_id] for _, class_id in kept], dtype=np.int32))
+    np.save(os.path.join(tmp_dir, SIZES_FILE), np.array([st.st_size for st in stats], dtype=np.int64))
+    np.save(os.path.join(tmp_dir, MTIMES_FILE), np.array([st.st_mtime_ns for st in stats], dtype=np.int64))
+
+    with open(os.path.join(tmp_dir, INFO_FILE), 'w') as f:
+        json.dump({"version": FORMAT_VERSION, "rows": len(kept), "size": size, "classes": len(class_ids)}, f)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+
+    gib = len(kept) * size * size * 3 / 2**30
+    print(f"✅ Image store selesai: {len(kept)} gambar ({gib:.2f} GiB), {len(class_ids)} kelas.")
+    return len(kept)
+
+
+# 2. PEMBACA IMAGE STORE
+
+class ImageStore:
+    """
+    Dataset ter-decode dalam satu array uint8 [N, H, W, 3] yang di-memory-map.
+
+    Struktur folder:
+    - images.npy                    : piksel RGB semua gambar.
+    - paths.bin / paths.offsets.npy : path file asli tiap baris.
+    - class_ids.* / class_codes.npy : tabel kelas ter-intern & kode kelas tiap baris.
+    - sizes.npy / mtimes_ns.npy     : ukuran & mtime file saat di-pack (deteksi file berubah).
+
+    `store.array(row)` adalah view tanpa salinan ke halaman memmap; tidak ada
+    open file maupun decode JPEG per gambar.
+    """
+
+    def __init__(self, store_dir=config.IMAGE_STORE_DIR):
+        self.store_dir = store_dir
+        self.images = np.load(os.path.join(store_dir, IMAGES_FILE), mmap_mode='r')
+        self.paths = PackedStrings(os.path.join(store_dir, PATHS_FILE))
+        self.class_ids = list(PackedStrings(os.path.join(store_dir, CLASS_IDS_FILE)))
+        self.class_codes = np.load(os.path.join(store_dir, CLASS_CODES_FILE), mmap_mode='r')
+        self.sizes = np.load(os.path.join(store_dir, SIZES_FILE), mmap_mode='r')
+        self.mtimes_ns = np.load(os.path.join(store_dir, MTIMES_FILE), mmap_mode='r')
+        self._row_of = None
+
+    @staticmethod
+    def exists(store_dir=config.IMAGE_STORE_DIR):
+        return os.path.exists(os.path.join(store_dir, INFO_FILE))
+
+    def __len__(self):
+        return self.images.shape[0]
+
+    @property
+    def row_of(self):
+        """
+        Mapping {path: row} (dibangun sekali saat pertama dibutuhkan).
+        """
+        if self._row_of is None:
+            self._row_of = {path: row for row, path in enumerate(self.paths)}
+        return self._row_of
+
+    def lookup(self, path, signature=None):
+        """
+        Mencari baris untuk path gambar.
+
+        Args:
+            signature (dict): {"size", "mtime_ns"} file saat ini; jika berbeda dengan
+                saat di-pack, baris dianggap basi.
+
+        Returns:
+            int atau None: Row id, None jika tidak ada / basi.
+        """
+        row = self.row_of.get(path)
+        if row is None:
+            return None
+        if signature is not None and (
+            self.sizes[row] != signature["size"] or self.mtimes_ns[row] != signature["mtime_ns"]
+        ):
+            return None
+        return row
+
+    def lookup_current(self, path):
+        """
+        `lookup` dengan signature file saat ini (satu os.stat, tanpa decode).
+
+        Dipakai di luar indexer (query, tampilan hasil) sehingga file yang diubah,
+        diganti, atau dihapus setelah packing tidak dilayani dari array lama.
+
+        Returns:
+            int atau None: Row id, None jika tidak ada di store, basi, atau file sudah dihapus.
+        """
+        if path not in self.row_of:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return self.lookup(path, {"size": st.st_size, "mtime_ns": st.st_mtime_ns})
+
+    def validate(self, signatures):
+        """
+        Membatasi `lookup` ke baris yang file aslinya masih ada dan tidak berubah sejak di-pack.
+
+        Args:
+            signatures (dict): Mapping {path: {"size", "mtime_ns"}} hasil pemindaian dataset.
+
+        Returns:
+            int: Jumlah baris yang masih valid.
+        """
+        self._row_of = {
+            path: row for path, row in self.row_of.items()
+            if path in signatures and self.lookup(path, signatures[path]) is not None
+        }
+        return len(self._row_of)
+
+    def array(self, row):
+        """
+        View uint8 [H, W, 3] ke gambar pada baris `row` (tanpa salinan).
+        """
+        return self.images[row]
+
+    def image(self, row):
+        """
+        Gambar pada baris `row` sebagai PIL Image RGB.
+        """
+        return Image.fromarray(np.asarray(self.images[row]))
+
+
+def open_image_store(store_dir=config.IMAGE_STORE_DIR):
+    """
+    Membuka image store jika sudah di-pack dan diaktifkan di config, selain itu None.
+    """
+    if config.USE_IMAGE_STORE and ImageStore.exists(store_dir):
+        return ImageStore(store_dir)
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packing dataset TinyImageNet ke array uint8 memory-mapped.")
+    parser.add_argument("--workers", type=int, default=config.INDEX_NUM_WORKERS,
+                        help="Jumlah thread decoder gambar.")
+    args = parser.parse_args()
+
+    pack_dataset(num_workers=args.workers)
@@ -1,7 +1,11 @@
 import os
 import sys
 import json
+import shutil
 import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from transformers import logging as hf_logging
 
 # Mengatur environment variable untuk menghindari deadlock pada tokenizer
@@ -13,10 +17,16 @@ import faiss
 import numpy as np
 from PIL import Image
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 
 # Import konfigurasi lokal
 import config
+from metadata_store import MetadataStore, open_metadata, metadata_exists
+import ann_index
+from class_router import build_router
+from image_store import open_image_store
+from neighbor_graph import build_neighbor_graph, update_neighbor_graph, open_neighbor_graph
+from clip_encoder import load_encoder, encoder_name, encode_image_batch, fast_preprocess_enabled
+import metrics
 
 # Konfigurasi Logging HuggingFace
 hf_logging.set_verbosity_error()
@@ -91,73 +101,228 @@ def get_image_paths(root_dir, split_name="Data"):
     print(f"   ✅ Ditemukan {len(image_paths)} gambar di {split_name}.")
     return image_paths
 
-# 2. PROSES UTAMA (INDEXING)
+def load_batch(batch_files, class_map, image_store=None):
+    """
+    Membaca dan men-decode satu batch gambar menjadi PIL Image RGB.
 
-def main():
-    print(f"🚀 Memulai proses indexing pada device: {config.DEVICE}")
+    Args:
+        batch_files (list): Daftar tuple [(path_gambar, class_id), ...].
+        class_map (dict): Mapping {class_id: human_readable_label}.
+        image_store (ImageStore): Jika ada, gambar yang sudah di-pack dibaca langsung
+            dari array memmap (tanpa open file & decode JPEG). Jika preprocessing
+            cepat aktif (`fast_preprocess_enabled`), baris store dikembalikan sebagai view array
+            uint8 [H, W, 3] agar langsung ditumpuk untuk preprocessing ber-batch.
 
-    # A. Inisialisasi Model Embedding (CLIP)
-    try:
-        model = SentenceTransformer(
-            config.CLIP_MODEL_NAME,
-            device=config.DEVICE,
-            cache_folder=config.MODELS_CACHE_DIR
-        )
-    except Exception as e:
-        print(f"❌ Gagal memuat model: {e}")
-        return
+    Returns:
+        tuple: (list PIL Image / array uint8, list metadata) untuk gambar yang valid saja.
+    """
+    batch_images = []
+    batch_meta = []
+
+    for img_path, class_id in batch_files:
+        try:
+            row = image_store.lookup(img_path) if image_store is not None else None
+            if row is not None:
+                img = image_store.array(row) if fast_preprocess_enabled() else image_store.image(row)
+            else:
+                # Convert RGB penting untuk menangani gambar grayscale/RGBA
+                img = Image.open(img_path).convert('RGB')
+            batch_images.append(img)
+
+            # Simpan metadata terkait
+            batch_meta.append({
+                "path": img_path,
+                "class_id": class_id,
+                "label": class_map.get(class_id, class_id)
+            })
+        except Exception as e:
+            # Skip gambar corrupt
+            metrics.inc("indexer_corrupt_images_total", help_text="Gambar corrupt yang dilewati indexer.")
+            metrics.log_event("corrupt_image", path=img_path, error=str(e))
+            continue
 
-    # B. Persiapan Data
-    class_map = load_class_mapping(config.WORDS_FILE)
+    return batch_images, batch_meta
 
-    # Gabungkan data Train dan Validation
-    train_imgs = get_image_paths(config.TRAIN_DIR, "Train")
-    val_imgs = get_image_paths(config.VAL_DIR, "Validation")
-    all_images = train_imgs + val_imgs
+def timed_load_batch(batch_files, class_map, image_store=None):
+    """
+    `load_batch` yang diukur ke histogram metrik `indexer_decode_seconds`.
+    """
+    with metrics.timer("indexer_decode", items=len(batch_files)):
+        return load_batch(batch_files, class_map, image_store)
 
-    print(f"Σ  Total Semua Gambar: {len(all_images)}")
-    if not all_images:
-        print("❌ Tidak ada gambar untuk diproses.")
+def iter_decoded_batches(all_images, class_map, batch_size=BATCH_SIZE,
+                         num_workers=config.INDEX_NUM_WORKERS,
+                         prefetch=config.INDEX_PREFETCH_BATCHES, image_store=None):
+    """
+    Generator batch gambar yang sudah di-decode secara paralel (pipelined).
+
+    Sekumpulan thread men-decode batch berikutnya selagi batch saat ini
+    di-encode oleh CLIP. Decoder JPEG milik Pillow melepas GIL, sehingga
+    thread cukup tanpa perlu mengirim (pickle) gambar antar proses.
+    Jumlah batch yang menunggu dibatasi oleh `prefetch` agar memori tetap terkendali.
+
+    Args:
+        all_images (list): Daftar tuple [(path_gambar, class_id), ...].
+        class_map (dict): Mapping {class_id: human_readable_label}.
+        batch_size (int): Jumlah gambar per batch.
+        num_workers (int): Jumlah thread decoder (0 = decode sinkron).
+        prefetch (int): Jumlah maksimum batch yang di-decode lebih dulu.
+        image_store (ImageStore): Sumber piksel ter-pack (opsional, lihat `load_batch`).
+
+    Yields:
+        tuple: (list PIL Image / array uint8, list metadata) sesuai urutan input.
+    """
+    batches = (all_images[i : i + batch_size] for i in range(0, len(all_images), batch_size))
+
+    if num_workers <= 0:
+        for batch_files in batches:
+            yield timed_load_batch(batch_files, class_map, image_store)
         return
 
-    embeddings = []
-    metadata = []
+    prefetch = max(1, prefetch)
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        pending = deque()
+        for batch_files in batches:
+            pending.append(pool.submit(timed_load_batch, batch_files, class_map, image_store))
+            metrics.set_gauge("indexer_prefetch_queue_depth", len(pending),
+                              help_text="Jumlah batch decode yang sedang antre.")
+            # Antrian penuh -> tunggu batch terdepan selesai sebelum menambah lagi
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
 
-    # C. Batch Processing (Encoding)
-    print("⚙️  Memproses Embedding (Batch Processing)...")
+        while pending:
+            yield pending.popleft().result()
 
-    # Loop dengan step sebesar BATCH_SIZE
-    for i in tqdm(range(0, len(all_images), BATCH_SIZE), desc="Indexing"):
-        batch_files = all_images[i : i + BATCH_SIZE]
-        batch_images = []
-        batch_meta = []
+# 2. MANIFEST (INCREMENTAL INDEXING)
 
-        # Load gambar dalam batch
-        for img_path, class_id in batch_files:
-            try:
-                # Convert RGB penting untuk menangani gambar grayscale/RGBA
-                img = Image.open(img_path).convert('RGB')
-                batch_images.append(img)
-
-                # Simpan metadata terkait
-                batch_meta.append({
-                    "path": img_path,
-                    "class_id": class_id,
-                    "label": class_map.get(class_id, class_id)
-                })
-            except Exception as e:
-                # Skip gambar corrupt
-                continue
+def file_signature(path):
+    """
+    Mengambil tanda pengenal file untuk mendeteksi perubahan tanpa membaca isinya.
+
+    Args:
+        path (str): Path file gambar.
+
+    Returns:
+        dict: {"size": ukuran_byte, "mtime_ns": waktu_modifikasi}.
+    """
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def load_manifest(manifest_path=config.MANIFEST_FILE):
+    """
+    Membaca manifest file yang sudah ter-index.
+
+    Returns:
+        dict: Mapping {path: {"size", "mtime_ns", "row"}} atau dict kosong.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path, 'r') as f:
+        return json.load(f).get("files", {})
+
+def load_manifest_header(manifest_path=config.MANIFEST_FILE):
+    """
+    Header manifest: identitas encoder (`encoder_name`) dan jumlah baris index (`ntotal`)
+    saat database terakhir disimpan lengkap. Nilai yang tidak tercatat bernilai None.
+    """
+    if not os.path.exists(manifest_path):
+        return {"encoder": None, "ntotal": None}
+
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    return {"encoder": manifest.get("encoder"), "ntotal": manifest.get("ntotal")}
+
+def build_manifest(metadata, signatures):
+    """
+    Menyusun manifest dari urutan metadata (posisi = row id di index FAISS).
+
+    Args:
+        metadata (list): Daftar metadata sesuai urutan baris index.
+        signatures (dict): Mapping {path: file_signature(path)} hasil pemindaian.
+
+    Returns:
+        dict: Mapping {path: {"size", "mtime_ns", "row"}}.
+    """
+    manifest = {}
+    for row, item in enumerate(metadata):
+        sig = signatures.get(item['path'])
+        if sig is None:
+            continue
+        manifest[item['path']] = {**sig, "row": row}
+    return manifest
+
+def diff_manifest(manifest, all_images, signatures):
+    """
+    Membandingkan hasil pemindaian dataset dengan manifest.
+
+    Args:
+        manifest (dict): Manifest lama {path: {"size", "mtime_ns", "row"}}.
+        all_images (list): Daftar tuple [(path_gambar, class_id), ...] saat ini.
+        signatures (dict): Mapping {path: file_signature(path)} saat ini.
+
+    Returns:
+        tuple: (list gambar yang perlu di-encode, list row id yang harus dihapus).
+    """
+    to_encode = []
+    stale_rows = []
+
+    for img_path, class_id in all_images:
+        entry = manifest.get(img_path)
+        sig = signatures[img_path]
+        if entry is None:
+            to_encode.append((img_path, class_id))
+        elif entry['size'] != sig['size'] or entry['mtime_ns'] != sig['mtime_ns']:
+            # File berubah -> baris lama dihapus, lalu di-encode ulang
+            to_encode.append((img_path, class_id))
+            stale_rows.append(entry['row'])
+
+    # File yang ada di manifest tetapi sudah tidak ada di disk
+    for img_path, entry in manifest.items():
+        if img_path not in signatures:
+            stale_rows.append(entry['row'])
 
+    return to_encode, sorted(stale_rows)
+
+# 3. ENCODING, SHARD CHECKPOINT & MERGE
+
+def encode_images(model, images, class_map, num_workers, prefetch, desc="Indexing", image_store=None):
+    """
+    Meng-encode daftar gambar menjadi embedding CLIP ter-normalisasi L2.
+
+    Args:
+        model: Encoder CLIP (SentenceTransformer atau OnnxClipEncoder).
+        images (list): Daftar tuple [(path_gambar, class_id), ...].
+        class_map (dict): Mapping {class_id: human_readable_label}.
+        num_workers (int): Jumlah thread decoder.
+        prefetch (int): Jumlah maksimum batch yang di-decode lebih dulu.
+        desc (str): Label progress bar.
+        image_store (ImageStore): Sumber piksel ter-pack (opsional).
+
+    Returns:
+        tuple: (np.ndarray float32 [N, D] atau None, list metadata).
+    """
+    embeddings = []
+    metadata = []
+
+    # Decode berjalan di thread pool, encode di main thread (pipelined)
+    num_batches = (len(images) + BATCH_SIZE - 1) // BATCH_SIZE
+    decoded = iter_decoded_batches(
+        images, class_map,
+        batch_size=BATCH_SIZE,
+        num_workers=num_workers,
+        prefetch=prefetch,
+        image_store=image_store
+    )
+
+    for batch_images, batch_meta in tqdm(decoded, total=num_batches, desc=desc):
         # Jika batch memiliki gambar valid, lakukan encoding
         if batch_images:
-            with torch.no_grad():
+            with torch.no_grad(), metrics.timer("indexer_encode", items=len(batch_images)):
                 # Encode gambar menjadi vektor
-                batch_emb = model.encode(
-                    batch_images,
-                    convert_to_numpy=True,
-                    show_progress_bar=False
-                )
+                batch_emb = encode_image_batch(model, batch_images)
+            metrics.inc("indexer_images_encoded_total", len(batch_images),
+                        help_text="Jumlah gambar yang di-encode indexer.")
 
             # Normalisasi L2 untuk pencarian berbasis Cosine Similarity
             faiss.normalize_L2(batch_emb)
@@ -165,30 +330,425 @@ def main():
             embeddings.append(batch_emb)
             metadata.extend(batch_meta)
 
-    # D. Penyimpanan Index FAISS & Metadata
-    if embeddings:
-        final_embeddings = np.vstack(embeddings)
-        print(f"📊 Dimensi Matrix Akhir: {final_embeddings.shape}")
+    if not embeddings:
+        return None, metadata
+    return np.vstack(embeddings), metadata
+
+def shard_paths(shard_id, shards_dir=config.SHARDS_DIR):
+    """
+    Mengembalikan pasangan path (embedding .npy, metadata .json) untuk satu shard.
+    """
+    stem = os.path.join(shards_dir, f"shard_{shard_id:05d}")
+    return f"{stem}.npy", f"{stem}.json"
+
+def is_shard_complete(shard_id, shard_images, encoder, shards_dir=config.SHARDS_DIR):
+    """
+    Mengecek apakah shard sudah selesai ditulis untuk daftar input & encoder yang sama.
+
+    File JSON ditulis paling akhir sehingga berfungsi sebagai penanda selesai.
+    Daftar input disimpan agar shard lama tidak dipakai jika isi dataset berubah,
+    identitas encoder agar embedding dari backend/preprocessing lain tidak tercampur.
+    """
+    emb_path, meta_path = shard_paths(shard_id, shards_dir)
+    if not (os.path.exists(emb_path) and os.path.exists(meta_path)):
+        return False
+
+    try:
+        with open(meta_path, 'r') as f:
+            shard_info = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    return (
+        shard_info.get("inputs") == [img_path for img_path, _ in shard_images]
+        and shard_info.get("encoder") == encoder
+    )
+
+def write_shard(shard_id, embeddings, metadata, shard_images, encoder, shards_dir=config.SHARDS_DIR):
+    """
+    Menyimpan embedding & metadata satu shard secara atomik (tulis ke .tmp lalu rename).
+    """
+    emb_path, meta_path = shard_paths(shard_id, shards_dir)
+    if embeddings is None:
+        embeddings = np.empty((0, 0), dtype='float32')
+
+    with open(emb_path + ".tmp", 'wb') as f:
+        np.save(f, embeddings)
+    os.replace(emb_path + ".tmp", emb_path)
+
+    shard_info = {
+        "inputs": [img_path for img_path, _ in shard_images],
+        "encoder": encoder,
+        "metadata": metadata
+    }
+    with open(meta_path + ".tmp", 'w') as f:
+        json.dump(shard_info, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+def build_shards(model, encoder, all_images, class_map, num_workers, prefetch,
+                 shard_size=config.INDEX_SHARD_SIZE, shards_dir=config.SHARDS_DIR, image_store=None):
+    """
+    Meng-encode dataset per shard dan menulis checkpoint ke disk setelah tiap shard.
+
+    Shard yang sudah lengkap dari run sebelumnya dilewati, sehingga proses
+    yang crash dapat dilanjutkan dari shard terakhir yang selesai.
+
+    Returns:
+        int: Jumlah shard.
+    """
+    os.makedirs(shards_dir, exist_ok=True)
+    num_shards = (len(all_images) + shard_size - 1) // shard_size
+
+    for shard_id in range(num_shards):
+        shard_images = all_images[shard_id * shard_size : (shard_id + 1) * shard_size]
+
+        if is_shard_complete(shard_id, shard_images, encoder, shards_dir):
+            print(f"⏭️  Shard {shard_id + 1}/{num_shards} sudah ada, dilewati.")
+            continue
+
+        embeddings, metadata = encode_images(
+            model, shard_images, class_map, num_workers, prefetch,
+            desc=f"Shard {shard_id + 1}/{num_shards}", image_store=image_store
+        )
+        write_shard(shard_id, embeddings, metadata, shard_images, encoder, shards_dir)
+
+    return num_shards
+
+def merge_shards(num_shards, shards_dir=config.SHARDS_DIR,
+                 embeddings_path=config.EMBEDDINGS_FILE, index_type=config.INDEX_TYPE):
+    """
+    Menggabungkan semua shard ke satu matrix embedding memory-mapped dan index FAISS.
+
+    Shard dibaca satu per satu sehingga memori puncak tetap sebesar satu shard
+    (ditambah index FAISS itu sendiri).
+
+    Returns:
+        tuple: (faiss.Index atau None, list metadata).
+    """
+    # Tahap 1: hitung total baris & dimensi (memmap: hanya header .npy yang dibaca)
+    total_rows, d = 0, None
+    for shard_id in range(num_shards):
+        emb_path, _ = shard_paths(shard_id, shards_dir)
+        shard_emb = np.load(emb_path, mmap_mode='r')
+        if shard_emb.shape[0] > 0:
+            total_rows += shard_emb.shape[0]
+            d = shard_emb.shape[1]
+
+    if total_rows == 0:
+        return None, []
+
+    # Tahap 2: salin tiap shard ke matrix akhir & index
+    merged = np.lib.format.open_memmap(
+        embeddings_path + ".tmp", mode='w+', dtype='float32', shape=(total_rows, d)
+    )
+    metadata = []
+    offset = 0
+
+    for shard_id in tqdm(range(num_shards), desc="Merging"):
+        emb_path, meta_path = shard_paths(shard_id, shards_dir)
+        shard_emb = np.load(emb_path)
+        with open(meta_path, 'r') as f:
+            metadata.extend(json.load(f)["metadata"])
+
+        if shard_emb.shape[0] == 0:
+            continue
 
-        # Membuat Index Flat Inner Product (Cocok untuk normalized vectors)
-        d = final_embeddings.shape[1]
-        index = faiss.IndexFlatIP(d)
-        index.add(final_embeddings)
+        merged[offset : offset + shard_emb.shape[0]] = shard_emb
+        offset += shard_emb.shape[0]
 
-        # Pastikan direktori output tersedia
-        output_folder = os.path.dirname(config.INDEX_FILE)
-        if output_folder and not os.path.exists(output_folder):
-            os.makedirs(output_folder, exist_ok=True)
-            print(f"📁 Membuat folder output: {output_folder}")
+    merged.flush()
+    del merged
+    os.replace(embeddings_path + ".tmp", embeddings_path)
 
-        print(f"💾 Menyimpan index vektor ke: {config.INDEX_FILE}")
-        faiss.write_index(index, config.INDEX_FILE)
+    # Index dibangun dari matrix memmap (training IVF/PQ memakai sampel)
+    print(f"🧱 Membangun index FAISS jenis '{index_type}'...")
+    index = ann_index.build_index(np.load(embeddings_path, mmap_mode='r'), index_type)
 
+    return index, metadata
+
+def rewrite_embeddings(stale_rows, new_embeddings, embeddings_path=config.EMBEDDINGS_FILE,
+                       chunk_size=config.INDEX_SHARD_SIZE):
+    """
+    Menyusun matrix embedding untuk mode incremental: hapus baris lama, tambah baris baru.
+
+    Penulisan dilakukan per chunk ke file sementara agar memori tetap terbatas.
+    File asli tidak disentuh; file sementara baru menggantikannya di `save_database`
+    bersama index & metadata (manifest terakhir).
+
+    Returns:
+        str: Path file sementara ({embeddings_path}.tmp).
+    """
+    old = np.load(embeddings_path, mmap_mode='r')
+    keep = np.ones(old.shape[0], dtype=bool)
+    keep[np.asarray(stale_rows, dtype='int64')] = False
+
+    n_new = 0 if new_embeddings is None else new_embeddings.shape[0]
+    total_rows = int(keep.sum()) + n_new
+
+    out = np.lib.format.open_memmap(
+        embeddings_path + ".tmp", mode='w+', dtype='float32', shape=(total_rows, old.shape[1])
+    )
+    offset = 0
+    for start in range(0, old.shape[0], chunk_size):
+        chunk = old[start : start + chunk_size][keep[start : start + chunk_size]]
+        out[offset : offset + chunk.shape[0]] = chunk
+        offset += chunk.shape[0]
+    if n_new:
+        out[offset:] = new_embeddings
+
+    out.flush()
+    del out, old
+    return embeddings_path + ".tmp"
+
+def save_database(index, metadata, signatures, encoder, export_json=False, staged_embeddings=None):
+    """
+    Menyimpan index FAISS, metadata (format kolom), dan manifest ke folder vector_db.
+
+    Urutan: index, metadata, matrix embedding (jika `staged_embeddings`), lalu
+    manifest paling akhir. Manifest mencatat `ntotal`, sehingga database yang
+    terputus di tengah penyimpanan terdeteksi dan tidak dipakai untuk incremental.
+
+    Args:
+        encoder (str): Identitas encoder (`encoder_name`) yang dicatat di manifest.
+        export_json (bool): Juga menulis metadata JSON (indent=4) untuk debugging.
+        staged_embeddings (str): File sementara dari `rewrite_embeddings` yang dipromosikan.
+    """
+    # Pastikan direktori output tersedia
+    output_folder = os.path.dirname(config.INDEX_FILE)
+    if output_folder and not os.path.exists(output_folder):
+        os.makedirs(output_folder, exist_ok=True)
+        print(f"📁 Membuat folder output: {output_folder}")
+
+    print(f"💾 Menyimpan index vektor ke: {config.INDEX_FILE}")
+    faiss.write_index(index, config.INDEX_FILE + ".tmp")
+    os.replace(config.INDEX_FILE + ".tmp", config.INDEX_FILE)
+
+    print(f"📝 Menyimpan metadata store ke: {config.METADATA_STORE_DIR}")
+    MetadataStore.write(metadata, config.METADATA_STORE_DIR)
+
+    if export_json:
         print(f"📝 Menyimpan metadata JSON ke: {config.METADATA_FILE}")
         with open(config.METADATA_FILE, 'w') as f:
             json.dump(metadata, f, indent=4)
 
+    if staged_embeddings is not None:
+        os.replace(staged_embeddings, config.EMBEDDINGS_FILE)
+
+    print(f"🧾 Menyimpan manifest ke: {config.MANIFEST_FILE}")
+    with open(config.MANIFEST_FILE + ".tmp", 'w') as f:
+        json.dump({
+            "encoder": encoder,
+            "ntotal": int(index.ntotal),
+            "files": build_manifest(metadata, signatures)
+        }, f)
+    os.replace(config.MANIFEST_FILE + ".tmp", config.MANIFEST_FILE)
+
+def save_neighbor_graph(old_graph=None, stale_rows=(), num_new=0):
+    """
+    Membangun ulang graph tetangga dari index yang tersimpan (atau menghapus graph lama jika nonaktif).
+
+    Index dibaca via `ann_index.load_index` agar parameter pencarian & re-rank
+    sama persis dengan yang dipakai RAGSystem.
+
+    Args:
+        old_graph (NeighborGraph): Graph index sebelum update incremental (opsional).
+            Jika ada, hanya baris yang terdampak yang dicari ulang.
+        stale_rows (list): Row id lama yang dihapus pada update incremental.
+        num_new (int): Jumlah baris baru pada update incremental.
+    """
+    if config.NEIGHBOR_GRAPH_K <= 0:
+        for path in (config.NEIGHBOR_IDS_FILE, config.NEIGHBOR_SCORES_FILE, config.NEIGHBOR_INFO_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        return
+
+    index = ann_index.load_index()
+    embeddings = np.load(config.EMBEDDINGS_FILE, mmap_mode='r')
+    if old_graph is not None and update_neighbor_graph(index, embeddings, old_graph, stale_rows, num_new):
+        return
+    build_neighbor_graph(index, embeddings)
+
+# 4. PROSES UTAMA (INDEXING)
+
+def main(num_workers=config.INDEX_NUM_WORKERS, prefetch=config.INDEX_PREFETCH_BATCHES,
+         incremental=False, restart=False, export_json=False,
+         index_type=config.INDEX_TYPE):
+    print(f"🚀 Memulai proses indexing pada device: {config.DEVICE}")
+
+    # A. Inisialisasi Model Embedding (CLIP), backend sesuai config.CLIP_BACKEND
+    try:
+        model, backend = load_encoder()
+    except Exception as e:
+        print(f"❌ Gagal memuat model: {e}")
+        return
+    # Identitas encoder (backend + jalur preprocessing) dicatat di manifest & checkpoint shard
+    encoder = encoder_name(backend)
+
+    # B. Persiapan Data
+    class_map = load_class_mapping(config.WORDS_FILE)
+
+    # Gabungkan data Train dan Validation.
+    # Diurutkan agar pembagian shard stabil antar run (syarat resume).
+    train_imgs = get_image_paths(config.TRAIN_DIR, "Train")
+    val_imgs = get_image_paths(config.VAL_DIR, "Validation")
+    all_images = sorted(train_imgs) + sorted(val_imgs)
+
+    print(f"Σ  Total Semua Gambar: {len(all_images)}")
+    if not all_images:
+        print("❌ Tidak ada gambar untuk diproses.")
+        return
+
+    signatures = {img_path: file_signature(img_path) for img_path, _ in all_images}
+    print(f"   - Decoder Workers : {num_workers} (prefetch {prefetch} batch)")
+
+    # Piksel ter-pack dipakai untuk file yang tidak berubah sejak di-pack (sisanya di-decode dari file)
+    image_store = open_image_store()
+    if image_store is not None:
+        print(f"   - Image Store     : {image_store.validate(signatures)}/{len(all_images)} gambar dari array ter-pack")
+
+    # C. Mode Incremental: hanya encode file baru/berubah, hapus baris file yang hilang
+    manifest = load_manifest() if incremental else {}
+    can_append = (
+        manifest
+        and os.path.exists(config.INDEX_FILE)
+        and metadata_exists()
+        and os.path.exists(config.EMBEDDINGS_FILE)
+    )
+    if incremental and not can_append:
+        print("⚠️ Manifest/index lama tidak ditemukan, melakukan full rebuild.")
+    elif can_append and load_manifest_header()["encoder"] != encoder:
+        # Embedding lama & baru harus dari encoder yang sama agar skor tetap sebanding
+        print(f"⚠️ Index dibuat dengan encoder {load_manifest_header()['encoder']}, encoder saat ini {encoder}: "
+              "melakukan full rebuild.")
+        can_append = False
+
+    if can_append:
+        index = faiss.read_index(config.INDEX_FILE)
+        metadata = open_metadata().to_list()
+
+        # Index, metadata, matrix embedding & manifest harus menggambarkan jumlah baris yang sama
+        # (tidak sama = penyimpanan sebelumnya terputus, row id manifest tidak bisa dipercaya)
+        rows = {
+            "manifest": load_manifest_header()["ntotal"],
+            "index": int(index.ntotal),
+            "metadata": len(metadata),
+            "embeddings": int(np.load(config.EMBEDDINGS_FILE, mmap_mode='r').shape[0])
+        }
+        if len(set(rows.values())) != 1:
+            print(f"⚠️ Jumlah baris database tidak konsisten {rows}, melakukan full rebuild.")
+            can_append = False
+
+    if can_append:
+
+        # Graph yang masih berlaku untuk index lama: hanya baris terdampak yang dicari ulang
+        old_graph = open_neighbor_graph(index.ntotal) if config.NEIGHBOR_GRAPH_K > 0 else None
+
+        to_encode, stale_rows = diff_manifest(manifest, all_images, signatures)
+        print(f"🔁 Incremental: {len(to_encode)} gambar baru/berubah, {len(stale_rows)} baris dihapus.")
+
+        if not to_encode and not stale_rows:
+            print("✅ Index sudah up-to-date.")
+            return
+
+        new_embeddings = None
+        if to_encode:
+            print("⚙️  Memproses Embedding (Batch Processing)...")
+            new_embeddings, new_metadata = encode_images(
+                model, to_encode, class_map, num_workers, prefetch, image_store=image_store
+            )
+
+        if stale_rows:
+            stale = set(stale_rows)
+            metadata = [item for row, item in enumerate(metadata) if row not in stale]
+        if new_embeddings is not None:
+            metadata.extend(new_metadata)
+
+        staged_embeddings = rewrite_embeddings(stale_rows, new_embeddings)
+
+        if ann_index.get_index_type(index) == "flat":
+            # IndexFlat memadatkan baris tersisa dengan urutan tetap,
+            # sehingga cukup hapus baris lama lalu tambahkan baris baru.
+            if stale_rows:
+                index.remove_ids(np.array(stale_rows, dtype='int64'))
+            if new_embeddings is not None:
+                index.add(new_embeddings)
+        else:
+            # IVF/HNSW tidak memadatkan row id saat remove, sehingga index diisi
+            # ulang dari matrix embedding (quantizer yang sudah di-train tetap dipakai).
+            ann_index.refill_index(index, np.load(staged_embeddings, mmap_mode='r'))
+
+        print(f"📊 Total Baris Index: {index.ntotal}")
+        save_database(index, metadata, signatures, encoder, export_json, staged_embeddings)
+        build_router(model, encoder)
+        save_neighbor_graph(old_graph, stale_rows, 0 if new_embeddings is None else new_embeddings.shape[0])
+        print("\n🎉 SUKSES! Database Vector berhasil diperbarui.")
+        return
+
+    # D. Batch Processing per Shard (Checkpoint & Resume)
+    if restart and os.path.exists(config.SHARDS_DIR):
+        print(f"🗑️  Menghapus checkpoint lama: {config.SHARDS_DIR}")
+        shutil.rmtree(config.SHARDS_DIR)
+
+    print("⚙️  Memproses Embedding (Batch Processing)...")
+    num_shards = build_shards(model, encoder, all_images, class_map, num_workers, prefetch, image_store=image_store)
+
+    # E. Merge Shard -> Index FAISS & Matrix Embedding
+    index, metadata = merge_shards(num_shards, index_type=index_type)
+
+    # F. Penyimpanan Index FAISS & Metadata
+    if index is not None:
+        print(f"📊 Dimensi Matrix Akhir: ({index.ntotal}, {index.d})")
+
+        save_database(index, metadata, signatures, encoder, export_json)
+        build_router(model, encoder)
+
+        # Checkpoint tidak lagi diperlukan setelah database tersimpan
+        shutil.rmtree(config.SHARDS_DIR, ignore_errors=True)
+
+        # Operating point lama tidak berlaku untuk index yang baru dibangun
+        if os.path.exists(config.INDEX_TUNING_FILE):
+            os.remove(config.INDEX_TUNING_FILE)
+        if index_type != "flat":
+            # Ukuran memori & recall yang dikorbankan oleh index kompak/aproksimasi
+            # (dibaca ulang dari file agar parameter pencarian bawaan ikut diterapkan)
+            ann_index.storage_report()
+        save_neighbor_graph()
+        if index_type in ann_index.TUNING_PARAMS:
+            print("💡 Jalankan 'python ann_index.py tune' untuk memilih nprobe/efSearch, "
+                  "lalu 'python neighbor_graph.py' untuk membangun ulang graph tetangga.")
+
         print("\n🎉 SUKSES! Database Vector berhasil dibuat.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Membangun index FAISS TinyImageNet.")
+    parser.add_argument("--workers", type=int, default=config.INDEX_NUM_WORKERS,
+                        help="Jumlah thread decoder gambar (0 = sinkron).")
+    parser.add_argument("--prefetch", type=int, default=config.INDEX_PREFETCH_BATCHES,
+                        help="Jumlah maksimum batch yang di-decode lebih dulu.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Hanya encode gambar baru/berubah dan hapus baris file yang hilang.")
+    parser.add_argument("--restart", action="store_true",
+                        help="Abaikan checkpoint shard dari run sebelumnya dan mulai dari awal.")
+    parser.add_argument("--export-json", action="store_true",
+                        help="Juga tulis metadata JSON (indent=4) untuk debugging.")
+    parser.add_argument("--index-type", choices=ann_index.INDEX_TYPES, default=config.INDEX_TYPE,
+                        help="Jenis index FAISS yang dibangun.")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    metrics.configure_logging()
+    metrics.set_role("indexer")
+    try:
+        main(
+            num_workers=args.workers,
+            prefetch=args.prefetch,
+            incremental=args.incremental,
+            restart=args.restart,
+            export_json=args.export_json,
+            index_type=args.index_type
+        )
+    finally:
+        # Latency decode/encode & jumlah gambar corrupt untuk run ini
+        metrics.write_prometheus()
+        print(f"📈 Metrik indexing diekspor ke: {metrics.metrics_path()}")
\ No newline at end of file
@@ -0,0 +1,312 @@
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+
+# Import konfigurasi lokal
+import config
+
+# Nama file di dalam folder metadata store
+PATHS_FILE = "paths"
+CLASS_IDS_FILE = "class_ids"
+LABELS_FILE = "labels"
+CLASS_CODES_FILE = "class_codes.npy"
+SPLIT_CODES_FILE = "split_codes.npy"
+CLASS_ROWS_FILE = "class_rows.npy"
+CLASS_OFFSETS_FILE = "class_offsets.npy"
+PATH_ORDER_FILE = "path_order.npy"
+INFO_FILE = "info.json"
+
+FORMAT_VERSION = 2
+
+# Split dataset (kode int8 per baris di split_codes.npy)
+SPLITS = ("train", "val", "other")
+
+def split_of(path):
+    """
+    Menentukan split dari path gambar berdasarkan nama folder Train/Val di dalamnya.
+    """
+    parts = os.path.normpath(path).split(os.sep)
+    if os.path.basename(config.TRAIN_DIR) in parts:
+        return "train"
+    if os.path.basename(config.VAL_DIR) in parts:
+        return "val"
+    return "other"
+
+
+# 1. PACKED STRING TABLE
+
+class PackedStrings:
+    """
+    Tabel string ter-packing: satu buffer UTF-8 + array offset int64 [N + 1].
+
+    Kedua file di-memory-map sehingga membuka tabel berisi ratusan ribu path
+    tidak mem-parsing apa pun; string baru di-decode saat diakses.
+    """
+
+    def __init__(self, prefix):
+        self.offsets = np.load(f"{prefix}.offsets.npy", mmap_mode='r')
+        data_path = f"{prefix}.bin"
+        # np.memmap tidak bisa memetakan file kosong
+        if os.path.getsize(data_path) > 0:
+            self.data = np.memmap(data_path, dtype=np.uint8, mode='r')
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.data[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @staticmethod
+    def write(strings, prefix):
+        """
+        Menulis daftar string ke format packed ({prefix}.bin & {prefix}.offsets.npy).
+        """
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.array([len(b) for b in encoded], dtype=np.int64), out=offsets[1:])
+
+        with open(f"{prefix}.bin", 'wb') as f:
+            f.write(b"".join(encoded))
+        np.save(f"{prefix}.offsets.npy", offsets)
+
+
+# 2. METADATA STORE (COLUMNAR)
+
+class MetadataStore:
+    """
+    Metadata index dalam format kolom yang dapat di-memory-map.
+
+    Struktur folder:
+    - paths.bin / paths.offsets.npy       : tabel path gambar (per baris index).
+    - class_ids.* / labels.*              : tabel kelas ter-intern (satu entri per kelas).
+    - class_codes.npy                     : int32 [N], kode kelas tiap baris.
+    - split_codes.npy                     : int8 [N], kode split (SPLITS) tiap baris.
+    - class_rows.npy / class_offsets.npy  : baris per kelas (CSR) untuk filter kelas.
+    - path_order.npy                      : baris terurut menurut path untuk filter prefix.
+
+    Baris dibaca secara lazy: `store[i]` menghasilkan dict yang sama dengan
+    format JSON lama ({"path", "class_id", "label"}).
+    """
+
+    def __init__(self, store_dir=config.METADATA_STORE_DIR, legacy=False):
+        """
+        Args:
+            legacy (bool): Hanya buka kolom dasar (store versi 1, untuk migrasi).
+        """
+        self.store_dir = store_dir
+        self.paths = PackedStrings(os.path.join(store_dir, PATHS_FILE))
+        self.class_codes = np.load(os.path.join(store_dir, CLASS_CODES_FILE), mmap_mode='r')
+
+        # Tabel kelas kecil (±200 entri) sehingga langsung di-decode ke list
+        self.class_ids = list(PackedStrings(os.path.join(store_dir, CLASS_IDS_FILE)))
+        self.labels = list(PackedStrings(os.path.join(store_dir, LABELS_FILE)))
+        if legacy:
+            return
+
+        self.split_codes = np.load(os.path.join(store_dir, SPLIT_CODES_FILE), mmap_mode='r')
+        self.class_rows = np.load(os.path.join(store_dir, CLASS_ROWS_FILE), mmap_mode='r')
+        self.class_offsets = np.load(os.path.join(store_dir, CLASS_OFFSETS_FILE))
+        self.path_order = np.load(os.path.join(store_dir, PATH_ORDER_FILE), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.class_codes)
+
+    def __getitem__(self, row):
+        code = self.class_codes[row]
+        return {
+            "path": self.paths[row],
+            "class_id": self.class_ids[code],
+            "label": self.labels[code]
+        }
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def rows_for_classes(self, class_ids):
+        """
+        Baris milik kelas-kelas tertentu (dari tabel CSR, tanpa memindai class_codes).
+        """
+        code_of = {class_id: code for code, class_id in enumerate(self.class_ids)}
+        parts = [
+            self.class_rows[self.class_offsets[code] : self.class_offsets[code + 1]]
+            for code in (code_of[c] for c in class_ids if c in code_of)
+        ]
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def rows_for_split(self, split):
+        """
+        Baris milik split tertentu ("train", "val", atau "other").
+        """
+        if split not in SPLITS:
+            raise ValueError(f"Split tidak dikenal: '{split}'. Pilihan: {', '.join(SPLITS)}")
+        return np.flatnonzero(self.split_codes == SPLITS.index(split)).astype(np.int64)
+
+    def _lower_bound(self, key):
+        # Posisi pertama di path_order dengan path >= key (binary search, O(log N) decode)
+        lo, hi = 0, len(self.path_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.paths[self.path_order[mid]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def row_for_path(self, path):
+        """
+        Row id untuk path gambar yang ter-index, atau None.
+        """
+        pos = self._lower_bound(path)
+        if pos < len(self.path_order):
+            row = int(self.path_order[pos])
+            if self.paths[row] == path:
+                return row
+        return None
+
+    def rows_for_prefix(self, prefix):
+        """
+        Baris dengan path berawalan `prefix` (binary search pada path_order).
+
+        Prefix relatif dianggap relatif terhadap config.DATASET_DIR.
+        """
+        if not os.path.isabs(prefix):
+            prefix = os.path.join(config.DATASET_DIR, prefix)
+
+        # Semua path berawalan prefix berada di antara prefix dan prefix + karakter tertinggi
+        start, end = self._lower_bound(prefix), self._lower_bound(prefix + "\U0010ffff")
+        return np.sort(np.asarray(self.path_order[start:end], dtype=np.int64))
+
+    def filter_rows(self, class_ids=None, split=None, path_prefix=None):
+        """
+        Irisan baris yang memenuhi semua filter yang diberikan.
+
+        Args:
+            class_ids (list): Daftar class_id (misal ["n01443537"]).
+            split (str): "train", "val", atau "other".
+            path_prefix (str): Awalan path gambar.
+
+        Returns:
+            np.ndarray atau None: Row id int64 terurut, None jika tidak ada filter.
+        """
+        rows = None
+        for selected in (
+            self.rows_for_classes(class_ids) if class_ids else None,
+            self.rows_for_split(split) if split else None,
+            self.rows_for_prefix(path_prefix) if path_prefix else None,
+        ):
+            if selected is not None:
+                rows = selected if rows is None else np.intersect1d(rows, selected, assume_unique=True)
+        return rows
+
+    def to_list(self):
+        """
+        Mengembalikan seluruh metadata sebagai list dict (format JSON lama).
+        """
+        return list(self)
+
+    def export_json(self, json_path=config.METADATA_FILE):
+        """
+        Mengekspor metadata ke JSON (indent=4) untuk keperluan debugging.
+        """
+        with open(json_path, 'w') as f:
+            json.dump(self.to_list(), f, indent=4)
+
+    @staticmethod
+    def write(metadata, store_dir=config.METADATA_STORE_DIR):
+        """
+        Menulis list metadata ({"path", "class_id", "label"}) ke format kolom.
+
+        Folder ditulis ke lokasi sementara lalu di-rename agar pembaca
+        tidak pernah melihat store yang setengah jadi.
+        """
+        class_index = {}
+        class_ids, labels = [], []
+        codes = np.empty(len(metadata), dtype=np.int32)
+
+        for row, item in enumerate(metadata):
+            code = class_index.get(item['class_id'])
+            if code is None:
+                code = len(class_ids)
+                class_index[item['class_id']] = code
+                class_ids.append(item['class_id'])
+                labels.append(item['label'])
+            codes[row] = code
+
+        tmp_dir = store_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        PackedStrings.write([item['path'] for item in metadata], os.path.join(tmp_dir, PATHS_FILE))
+        PackedStrings.write(class_ids, os.path.join(tmp_dir, CLASS_IDS_FILE))
+        PackedStrings.write(labels, os.path.join(tmp_dir, LABELS_FILE))
+        np.save(os.path.join(tmp_dir, CLASS_CODES_FILE), codes)
+
+        # Indeks filter (split, baris per kelas, urutan path) dihitung sekali saat indexing
+        paths = [item['path'] for item in metadata]
+        split_codes = np.array([SPLITS.index(split_of(path)) for path in paths], dtype=np.int8)
+        class_offsets = np.zeros(len(class_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(class_ids)), out=class_offsets[1:])
+        np.save(os.path.join(tmp_dir, SPLIT_CODES_FILE), split_codes)
+        np.save(os.path.join(tmp_dir, CLASS_ROWS_FILE), np.argsort(codes, kind='stable').astype(np.int64))
+        np.save(os.path.join(tmp_dir, CLASS_OFFSETS_FILE), class_offsets)
+        np.save(os.path.join(tmp_dir, PATH_ORDER_FILE),
+                np.array(sorted(range(len(paths)), key=paths.__getitem__), dtype=np.int64))
+
+        with open(os.path.join(tmp_dir, INFO_FILE), 'w') as f:
+            json.dump({"version": FORMAT_VERSION, "rows": len(metadata), "classes": len(class_ids)}, f)
+
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.replace(tmp_dir, store_dir)
+
+
+def open_metadata(store_dir=config.METADATA_STORE_DIR, json_path=config.METADATA_FILE):
+    """
+    Membuka metadata store. Jika hanya ada file JSON lama, dikonversi sekali ke format kolom.
+
+    Returns:
+        MetadataStore: Store siap pakai.
+    """
+    info_path = os.path.join(store_dir, INFO_FILE)
+    if not os.path.exists(info_path) and os.path.exists(json_path):
+        print(f"🔄 Mengonversi metadata JSON lama ke format kolom: {store_dir}")
+        with open(json_path, 'r') as f:
+            MetadataStore.write(json.load(f), store_dir)
+    elif os.path.exists(info_path):
+        with open(info_path, 'r') as f:
+            version = json.load(f).get("version", 1)
+        if version < FORMAT_VERSION:
+            # Store versi lama belum punya indeks filter: tulis ulang sekali
+            print(f"🔄 Memperbarui metadata store ke versi {FORMAT_VERSION}: {store_dir}")
+            MetadataStore.write(MetadataStore(store_dir, legacy=True).to_list(), store_dir)
+
+    return MetadataStore(store_dir)
+
+
+def metadata_exists(store_dir=config.METADATA_STORE_DIR, json_path=config.METADATA_FILE):
+    """
+    Mengecek apakah metadata tersedia (format kolom atau JSON lama).
+    """
+    return os.path.exists(os.path.join(store_dir, INFO_FILE)) or os.path.exists(json_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Utilitas metadata store FAISS.")
+    parser.add_argument("--export-json", metavar="PATH", nargs='?', const=config.METADATA_FILE,
+                        help="Ekspor metadata ke JSON untuk debugging.")
+    args = parser.parse_args()
+
+    store = open_metadata()
+    print(f"📚 Metadata store: {len(store)} baris, {len(store.class_ids)} kelas.")
+    if args.export_json:
+        store.export_json(args.export_json)
+        print(f"📝 Metadata JSON diekspor ke: {args.export_json}")
@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import cProfile
+from contextlib import contextmanager
+
+# Import konfigurasi lokal
+import config
+
+# Logger terstruktur (satu baris JSON per event)
+logger = logging.getLogger("rag")
+
+# Bucket histogram latency (detik)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# 1. METRIK (COUNTER, GAUGE, HISTOGRAM)
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + list(extra or [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+class Registry:
+    """
+    Registry metrik in-process yang thread-safe, dapat diekspor ke format teks Prometheus.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+
+    def inc(self, name, value=1, labels=None, help_text=None):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if help_text:
+                self.help.setdefault(name, help_text)
+
+    def set(self, name, value, labels=None, help_text=None):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.gauges[key] = value
+            if help_text:
+                self.help.setdefault(name, help_text)
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS, help_text=None):
+        key = (name, _label_key(labels))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+                self.histograms[key] = hist
+            for i, bound in enumerate(hist["buckets"]):
+                if value <= bound:
+                    hist["counts"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+            if help_text:
+                self.help.setdefault(name, help_text)
+
+    def render_prometheus(self):
+        """
+        Menghasilkan teks format exposition Prometheus.
+        """
+        lines = []
+        with self.lock:
+            for kind, store in (("counter", self.counters), ("gauge", self.gauges)):
+                seen = set()
+                for (name, key), value in sorted(store.items()):
+                    if name not in seen:
+                        seen.add(name)
+                        if name in self.help:
+                            lines.append(f"# HELP {name} {self.help[name]}")
+                        lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            seen = set()
+            for (name, key), hist in sorted(self.histograms.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self.help:
+                        lines.append(f"# HELP {name} {self.help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                # Bucket sudah kumulatif karena observe menambah semua bucket >= value
+                for bound, count in zip(hist["buckets"], hist["counts"]):
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{name}_sum{_format_labels(key)} {hist['sum']}")
+                lines.append(f"{name}_count{_format_labels(key)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+# Registry global yang dipakai seluruh modul
+REGISTRY = Registry()
+
+def inc(name, value=1, labels=None, help_text=None):
+    REGISTRY.inc(name, value, labels, help_text)
+
+def set_gauge(name, value, labels=None, help_text=None):
+    REGISTRY.set(name, value, labels, help_text)
+
+def observe(name, value, labels=None, buckets=LATENCY_BUCKETS, help_text=None):
+    REGISTRY.observe(name, value, labels, buckets=buckets, help_text=help_text)
+
+def count_buckets(max_value):
+    """
+    Bucket histogram untuk nilai cacahan (misal ukuran batch): 1, 2, 4, ..., max_value.
+    """
+    buckets = []
+    bound = 1
+    while bound < max_value:
+        buckets.append(bound)
+        bound *= 2
+    buckets.append(max_value)
+    return tuple(buckets)
+
+
+# 2. TIMER & LOG TERSTRUKTUR
+
+def configure_logging(level=config.LOG_LEVEL):
+    """
+    Memasang handler stderr untuk logger "rag" (pesan sudah berupa JSON satu baris).
+    """
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+def log_event(event, **fields):
+    """
+    Menulis satu event log terstruktur (JSON) ke logger "rag".
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, "ts": time.time(), **fields}, default=str))
+
+@contextmanager
+def timer(name, labels=None, items=None):
+    """
+    Mengukur durasi blok kode ke histogram `{name}_seconds` dan log terstruktur.
+
+    Args:
+        name (str): Nama tahap (misal "clip_encode", "faiss_search", "vlm_generate").
+        labels (dict): Label tambahan (misal {"modality": "image"}).
+        items (int): Jumlah item yang diproses (dicatat di log).
+    """
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        inc(f"{name}_errors_total", labels=labels, help_text=f"Jumlah error pada tahap {name}.")
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        observe(f"{name}_seconds", elapsed, labels, help_text=f"Latency tahap {name} (detik).")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({
+                "event": "stage", "stage": name, "seconds": elapsed,
+                "status": status, "items": items, **(labels or {})
+            }))
+
+
+# 3. EKSPOR PROMETHEUS (TEXTFILE)
+
+_last_export = 0.0
+_export_lock = threading.Lock()
+
+# Peran proses ini (bagian nama file metrik), diatur sekali saat startup lewat set_role
+_role = "app"
+
+def set_role(role, instance=None):
+    """
+    Mengatur peran proses ("app", "indexer", "service", ...) untuk nama file metrik.
+
+    Args:
+        instance: Pembeda replika dengan peran yang sama di satu host (misal port).
+    """
+    global _role
+    _role = role if instance is None else f"{role}-{instance}"
+
+def metrics_path(path=config.METRICS_FILE, role=None):
+    """
+    Path file metrik untuk peran proses (template `{role}` di config.METRICS_FILE).
+    """
+    return path.format(role=role or _role) if path else None
+
+def write_prometheus(path=config.METRICS_FILE, role=None):
+    """
+    Menulis seluruh metrik ke file teks Prometheus secara atomik (untuk textfile collector).
+    """
+    path = metrics_path(path, role)
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(REGISTRY.render_prometheus())
+    os.replace(tmp_path, path)
+
+def maybe_export(path=config.METRICS_FILE, interval=config.METRICS_EXPORT_INTERVAL, role=None):
+    """
+    Ekspor metrik ke file, dibatasi maksimal sekali per `interval` detik (murah di hot path).
+    """
+    global _last_export
+    path = metrics_path(path, role)
+    if not path:
+        return
+    now = time.time()
+    if now - _last_export < interval:
+        return
+    with _export_lock:
+        if now - _last_export < interval:
+            return
+        _last_export = now
+    try:
+        write_prometheus(path)
+    except OSError as e:
+        logger.warning(f"Gagal menulis metrik ke {path}: {e}")
+
+
+# 4. PROFILING TERSAMPEL
+
+_profile_lock = threading.Lock()
+
+@contextmanager
+def maybe_profile(name, sample_rate=None):
+    """
+    Memprofil sebagian kecil request (cProfile atau torch profiler) dan menyimpan trace-nya.
+
+    Aktif jika `config.PROFILE_SAMPLE_RATE` > 0; setiap pemanggilan diprofil dengan
+    peluang sebesar nilai tersebut. Hasil disimpan di `config.PROFILE_DIR`.
+    """
+    rate = config.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    # Hanya satu profiler aktif per proses; request lain tetap jalan tanpa profiling
+    if rate <= 0 or random.random() >= rate or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        stamp = f"{name}_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{threading.get_ident()}"
+
+        if config.PROFILE_BACKEND == "torch":
+            import torch.profiler
+            with torch.profiler.profile(record_shapes=True) as prof:
+                yield
+            trace_path = os.path.join(config.PROFILE_DIR, f"{stamp}.trace.json")
+            prof.export_chrome_trace(trace_path)
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                trace_path = os.path.join(config.PROFILE_DIR, f"{stamp}.prof")
+                profiler.dump_stats(trace_path)
+
+        log_event("profile", stage=name, path=trace_path)
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,234 @@
+import os
+import json
+import argparse
+import numpy as np
+from tqdm import tqdm
+
+# Import konfigurasi lokal
+import config
+from ann_index import load_index
+
+# Jumlah baris yang dicari sekaligus saat membangun graph (all-vs-all ber-batch)
+GRAPH_BATCH_SIZE = 4096
+
+FORMAT_VERSION = 1
+
+
+# 1. IDENTITAS GRAPH
+
+def _stat(path):
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def graph_signature(k, index_path=config.INDEX_FILE, embeddings_path=config.EMBEDDINGS_FILE,
+                    tuning_path=config.INDEX_TUNING_FILE, rerank_factor=config.RERANK_FACTOR):
+    """
+    Sidik jari index & operating point pencarian yang menentukan isi graph.
+
+    Isi graph adalah hasil `index.search`, sehingga hanya berlaku untuk file index,
+    matrix embedding, hasil tuning (nprobe/efSearch), dan re-rank yang sama.
+    """
+    return {
+        "version": FORMAT_VERSION,
+        "k": int(k),
+        "index": _stat(index_path),
+        "embeddings": _stat(embeddings_path),
+        "tuning": _stat(tuning_path),
+        "rerank_factor": rerank_factor
+    }
+
+def write_graph_info(k, info_path=config.NEIGHBOR_INFO_FILE):
+    tmp_path = info_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(graph_signature(k), f)
+    os.replace(tmp_path, info_path)
+
+
+# 2. PEMBANGUNAN GRAPH TETANGGA
+
+def build_neighbor_graph(index, embeddings, k=config.NEIGHBOR_GRAPH_K,
+                         ids_path=config.NEIGHBOR_IDS_FILE, scores_path=config.NEIGHBOR_SCORES_FILE,
+                         info_path=config.NEIGHBOR_INFO_FILE, batch_size=GRAPH_BATCH_SIZE):
+    """
+    Menghitung top-k tetangga setiap baris index (all-vs-all) dan menyimpannya sebagai tabel.
+
+    Setiap baris embedding dicari ke index yang sama per batch, sehingga hasil
+    tabel identik dengan `index.search` untuk gambar tersebut (baris itu sendiri
+    ikut sebagai hasil pertama, sama seperti pencarian biasa).
+
+    Args:
+        index (faiss.Index): Index yang baru dibangun/diperbarui.
+        embeddings (np.ndarray): Matrix embedding float32 [N, D] (boleh memmap), urutan = row id.
+        k (int): Jumlah tetangga per baris.
+    """
+    n = embeddings.shape[0]
+    k = min(k, n)
+    print(f"🕸️  Membangun graph tetangga top-{k} untuk {n} baris...")
+
+    ids_out = np.lib.format.open_memmap(ids_path + ".tmp", mode='w+', dtype=np.int64, shape=(n, k))
+    scores_out = np.lib.format.open_memmap(scores_path + ".tmp", mode='w+', dtype=np.float32, shape=(n, k))
+
+    for start in tqdm(range(0, n, batch_size), desc="Neighbor Graph"):
+        batch = np.ascontiguousarray(embeddings[start : start + batch_size], dtype='float32')
+        scores, ids = index.search(batch, k)
+        ids_out[start : start + len(batch)] = ids
+        scores_out[start : start + len(batch)] = scores
+
+    ids_out.flush()
+    scores_out.flush()
+    del ids_out, scores_out
+    os.replace(ids_path + ".tmp", ids_path)
+    os.replace(scores_path + ".tmp", scores_path)
+    # Info ditulis terakhir: tanpa file ini graph dianggap tidak berlaku
+    write_graph_info(k, info_path)
+    print(f"💾 Graph tetangga disimpan ke: {ids_path}")
+
+def update_neighbor_graph(index, embeddings, old_graph, stale_rows, num_new, k=config.NEIGHBOR_GRAPH_K,
+                          ids_path=config.NEIGHBOR_IDS_FILE, scores_path=config.NEIGHBOR_SCORES_FILE,
+                          info_path=config.NEIGHBOR_INFO_FILE, batch_size=GRAPH_BATCH_SIZE):
+    """
+    Memperbarui graph tetangga setelah update incremental tanpa pencarian all-vs-all.
+
+    Urutan baris setelah update = baris lama tanpa `stale_rows` (urutan tetap)
+    diikuti `num_new` baris baru, sama seperti matrix embedding di indexer.
+    Hanya baris yang top-k-nya bisa berubah yang dicari ulang ke index:
+    - baris baru,
+    - baris lama yang salah satu tetangganya dihapus,
+    - baris lama yang skornya ke salah satu baris baru >= skor tetangga ke-k.
+    Baris lain cukup dipetakan ke row id baru. Untuk index exact (flat atau
+    dengan re-rank) hasilnya sama dengan `build_neighbor_graph`.
+
+    Args:
+        old_graph (NeighborGraph): Graph yang berlaku untuk index sebelum update.
+        stale_rows (list): Row id lama yang dihapus.
+        num_new (int): Jumlah baris baru di akhir matrix embedding.
+
+    Returns:
+        bool: False jika graph lama tidak bisa dipakai (k berbeda), graph tidak ditulis.
+    """
+    n = embeddings.shape[0]
+    k = min(k, n)
+    if old_graph.k < k:
+        return False
+
+    keep = np.ones(len(old_graph), dtype=bool)
+    keep[np.asarray(stale_rows, dtype=np.int64)] = False
+    kept = np.flatnonzero(keep)
+    n_kept = len(kept)
+
+    # Row id lama -> row id baru (-1 = dihapus)
+    remap = np.full(len(old_graph), -1, dtype=np.int64)
+    remap[kept] = np.arange(n_kept)
+
+    old_ids = np.asarray(old_graph.ids[kept, :k])
+    old_scores = np.asarray(old_graph.scores[kept, :k])
+    ids = np.where(old_ids >= 0, remap[np.clip(old_ids, 0, None)], -1)
+
+    dirty = np.ones(n, dtype=bool)
+    dirty[:n_kept] = (ids < 0).any(axis=1)
+    if num_new:
+        new_vectors = np.ascontiguousarray(embeddings[n_kept:], dtype='float32')
+        kth = old_scores[:, -1]
+        for start in range(0, n_kept, batch_size):
+            block = np.ascontiguousarray(embeddings[start : min(start + batch_size, n_kept)], dtype='float32')
+            best = np.full(len(block), -np.inf, dtype=np.float32)
+            for new_start in range(0, num_new, batch_size):
+                scores = block @ new_vectors[new_start : new_start + batch_size].T
+                best = np.maximum(best, scores.max(axis=1))
+            dirty[start : start + len(block)] |= best >= kth[start : start + len(block)]
+
+    rows = np.flatnonzero(dirty)
+    print(f"🕸️  Memperbarui graph tetangga top-{k}: {len(rows)} dari {n} baris dicari ulang...")
+
+    ids_out = np.lib.format.open_memmap(ids_path + ".tmp", mode='w+', dtype=np.int64, shape=(n, k))
+    scores_out = np.lib.format.open_memmap(scores_path + ".tmp", mode='w+', dtype=np.float32, shape=(n, k))
+    ids_out[:n_kept] = ids
+    scores_out[:n_kept] = old_scores
+    del ids, old_ids, old_scores
+
+    for start in tqdm(range(0, len(rows), batch_size), desc="Neighbor Graph"):
+        batch_rows = rows[start : start + batch_size]
+        batch = np.ascontiguousarray(embeddings[batch_rows], dtype='float32')
+        scores, found = index.search(batch, k)
+        ids_out[batch_rows] = found
+        scores_out[batch_rows] = scores
+
+    ids_out.flush()
+    scores_out.flush()
+    del ids_out, scores_out
+    os.replace(ids_path + ".tmp", ids_path)
+    os.replace(scores_path + ".tmp", scores_path)
+    write_graph_info(k, info_path)
+    print(f"💾 Graph tetangga disimpan ke: {ids_path}")
+    return True
+
+
+# 3. PEMBACA GRAPH TETANGGA
+
+class NeighborGraph:
+    """
+    Tabel top-k tetangga (row id & skor) per baris index, di-memory-map.
+
+    Pencarian untuk gambar yang sudah ter-index cukup membaca satu baris tabel:
+    tanpa decode gambar, tanpa forward pass CLIP, dan tanpa pencarian FAISS.
+    """
+
+    def __init__(self, ids_path=config.NEIGHBOR_IDS_FILE, scores_path=config.NEIGHBOR_SCORES_FILE):
+        self.ids = np.load(ids_path, mmap_mode='r')
+        self.scores = np.load(scores_path, mmap_mode='r')
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    def search(self, rows, k):
+        """
+        Top-k tetangga untuk baris-baris index (format sama dengan `faiss.Index.search`).
+
+        Args:
+            rows (np.ndarray): Row id query di index.
+            k (int): Jumlah hasil, maksimal `self.k`.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.asarray(self.scores[rows, :k]), np.asarray(self.ids[rows, :k])
+
+
+def open_neighbor_graph(ntotal, ids_path=config.NEIGHBOR_IDS_FILE, scores_path=config.NEIGHBOR_SCORES_FILE,
+                        info_path=config.NEIGHBOR_INFO_FILE):
+    """
+    Membuka graph tetangga jika ada dan sesuai dengan index saat ini, selain itu None.
+
+    Graph ditolak jika jumlah barisnya berbeda atau sidik jari index/tuning/re-rank
+    saat dibangun tidak sama dengan yang sekarang (misal setelah `ann_index.py tune`).
+
+    Args:
+        ntotal (int): Jumlah baris index yang sedang dipakai.
+    """
+    if not all(os.path.exists(path) for path in (ids_path, scores_path, info_path)):
+        return None
+
+    graph = NeighborGraph(ids_path, scores_path)
+    if len(graph) != ntotal:
+        print("⚠️ Graph tetangga tidak sesuai dengan index (jumlah baris berbeda), diabaikan.")
+        return None
+
+    with open(info_path, 'r') as f:
+        info = json.load(f)
+    if info != graph_signature(graph.k):
+        print("⚠️ Graph tetangga dibangun untuk index/operating point lain, diabaikan. "
+              "Jalankan 'python neighbor_graph.py' untuk membangun ulang.")
+        return None
+    return graph
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Membangun graph tetangga top-K dari index tersimpan.")
+    parser.add_argument("--k", type=int, default=config.NEIGHBOR_GRAPH_K)
+    args = parser.parse_args()
+
+    build_neighbor_graph(load_index(), np.load(config.EMBEDDINGS_FILE, mmap_mode='r'), k=args.k)
@@ -0,0 +1,144 @@
+import os
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Import konfigurasi lokal
+import config
+
+
+# 1. KUNCI CACHE
+
+def text_key(text):
+    """
+    Kunci cache untuk query teks.
+
+    Tokenizer CLIP sudah melakukan lowercase & merapikan spasi, sehingga
+    normalisasi ini tidak mengubah embedding yang dihasilkan.
+    """
+    return "t:" + " ".join(str(text).lower().split())
+
+def image_key(image):
+    """
+    Kunci cache untuk query gambar: hash dari piksel hasil decode (bukan byte file),
+    sehingga file yang sama dengan nama/kompresi berbeda tetap cocok selama pikselnya sama.
+
+    Args:
+        image (PIL.Image.Image): Gambar RGB.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode())
+    digest.update(image.tobytes())
+    return "i:" + digest.hexdigest()
+
+
+# 2. LRU CACHE EMBEDDING
+
+class EmbeddingCache:
+    """
+    LRU cache in-process untuk embedding query CLIP (thread-safe).
+
+    Query populer yang berulang langsung mengambil embedding dari cache tanpa
+    forward pass encoder. Isi cache dapat disimpan ke disk agar bertahan
+    setelah restart.
+    """
+
+    def __init__(self, max_entries=config.QUERY_CACHE_SIZE, persist_path=None,
+                 model_name=config.CLIP_MODEL_NAME):
+        """
+        Args:
+            max_entries (int): Jumlah maksimum embedding yang disimpan (0 = nonaktif).
+            persist_path (str): File .npz untuk persistensi (None = hanya in-memory).
+            model_name (str): Nama model encoder, agar cache dari model lain tidak dipakai.
+        """
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.model_name = model_name
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, key):
+        """
+        Mengambil embedding (np.ndarray) atau None jika tidak ada di cache.
+        """
+        with self.lock:
+            emb = self.entries.get(key)
+            if emb is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return emb
+
+    def put(self, key, emb):
+        """
+        Menyimpan embedding; entri yang paling lama tidak dipakai dibuang jika penuh.
+        """
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = np.array(emb, dtype='float32', copy=True)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Statistik cache.
+
+        Returns:
+            dict: {"entries", "hits", "misses", "hit_rate"}.
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def save(self):
+        """
+        Menyimpan isi cache ke file .npz (urutan LRU dipertahankan).
+        """
+        if not self.persist_path:
+            return
+        with self.lock:
+            if not self.entries:
+                return
+            keys = np.array(list(self.entries.keys()))
+            embs = np.stack(list(self.entries.values()))
+
+        tmp_path = self.persist_path + ".tmp.npz"
+        np.savez(tmp_path, keys=keys, embeddings=embs, model_name=np.array(self.model_name))
+        os.replace(tmp_path, self.persist_path)
+
+    def load(self):
+        """
+        Memuat isi cache dari file .npz (jika ada dan berasal dari model yang sama).
+        """
+        if self.max_entries <= 0 or not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with np.load(self.persist_path) as data:
+                if str(data["model_name"]) != self.model_name:
+                    print("⚠️ Cache embedding berasal dari model lain, diabaikan.")
+                    return
+                keys, embs = data["keys"], data["embeddings"]
+        except Exception as e:
+            print(f"⚠️ Gagal memuat cache embedding: {e}")
+            return
+
+        with self.lock:
+            for key, emb in zip(keys[-self.max_entries:], embs[-self.max_entries:]):
+                self.entries[str(key)] = emb
+        print(f"🗃️  Cache embedding dimuat: {len(self.entries)} entri.")
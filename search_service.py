@@ -0,0 +1,287 @@
+import json
+import time
+import queue
+import base64
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Import konfigurasi lokal
+import config
+from backend import RAGSystem, QUERY_TEXT, QUERY_IMAGE
+from metadata_store import SPLITS
+import metrics
+
+
+# 1. DYNAMIC MICRO-BATCHING
+
+class MicroBatcher:
+    """
+    Mengumpulkan request pencarian yang datang bersamaan menjadi satu batch.
+
+    Request pertama membuka jendela selama `max_wait_ms`; semua request yang
+    masuk dalam jendela tersebut (hingga `max_batch_size`) di-encode dalam satu
+    forward pass CLIP dan dicari dengan satu pemanggilan FAISS, lalu hasilnya
+    dikembalikan ke masing-masing pemanggil.
+    """
+
+    def __init__(self, rag, max_batch_size=config.SERVICE_MAX_BATCH_SIZE,
+                 max_wait_ms=config.SERVICE_MAX_WAIT_MS):
+        self.rag = rag
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.batch_size_buckets = metrics.count_buckets(max_batch_size)
+
+        self.stats_lock = threading.Lock()
+        self.num_batches = 0
+        self.num_requests = 0
+
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, query, top_k=config.TOP_K, query_type=None, filters=None):
+        """
+        Mengantrikan satu query dan menunggu hasilnya.
+
+        Args:
+            filters (dict): Filter opsional {"class_ids", "split", "path_prefix"}.
+
+        Returns:
+            list: Hasil pencarian (format sama dengan RAGSystem.search).
+        """
+        future = Future()
+        self.requests.put((query, query_type, top_k, filters or {}, future))
+        metrics.set_gauge("service_queue_depth", self.requests.qsize(),
+                          help_text="Jumlah request yang menunggu batch.")
+        return future.result()
+
+    def _collect(self):
+        # Blok sampai ada request pertama, lalu tunggu sisa jendela batch
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _filter_key(filters):
+        class_ids = filters.get("class_ids")
+        return (tuple(sorted(class_ids)) if class_ids else None,
+                filters.get("split"), filters.get("path_prefix"))
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Satu pemanggilan search per kombinasi filter (umumnya hanya satu grup)
+            groups = {}
+            for request in batch:
+                groups.setdefault(self._filter_key(request[3]), []).append(request)
+            for group in groups.values():
+                self._run_group(group)
+
+            with self.stats_lock:
+                self.num_batches += 1
+                self.num_requests += len(batch)
+
+            metrics.observe("service_batch_size", len(batch), buckets=self.batch_size_buckets,
+                            help_text="Ukuran batch micro-batching.")
+            metrics.set_gauge("service_queue_depth", self.requests.qsize())
+
+    def _run_group(self, group):
+        queries = [query for query, _, _, _, _ in group]
+        query_types = [query_type for _, query_type, _, _, _ in group]
+        max_k = max(top_k for _, _, top_k, _, _ in group)
+        filters = group[0][3]
+
+        try:
+            results = self.rag.search_batch(queries, top_k=max_k, query_types=query_types, **filters)
+        except Exception:
+            # Jika batch gagal, ulangi per request agar error tidak menular
+            for query, query_type, top_k, filters, future in group:
+                try:
+                    future.set_result(self.rag.search(query, top_k=top_k, query_type=query_type, **filters))
+                except Exception as e:
+                    future.set_exception(e)
+        else:
+            for (_, _, top_k, _, future), res in zip(group, results):
+                future.set_result(res[:top_k])
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "batches": self.num_batches,
+                "requests": self.num_requests,
+                "avg_batch_size": self.num_requests / self.num_batches if self.num_batches else 0.0,
+                "queue_depth": self.requests.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0
+            }
+
+
+# 2. HTTP HANDLER
+
+def parse_query(payload):
+    """
+    Mengubah body JSON menjadi query untuk RAGSystem.
+
+    Format: {"text": "..."} atau {"image": "<base64>"}, opsional "top_k".
+
+    Returns:
+        tuple: (query, query_type). Tipe selalu eksplisit sehingga teks dari
+        klien tidak pernah ditafsirkan sebagai path file di server.
+    """
+    if "image" in payload:
+        return base64.b64decode(payload["image"]), QUERY_IMAGE
+    if "text" in payload:
+        return str(payload["text"]), QUERY_TEXT
+    raise ValueError("Body harus berisi 'text' atau 'image' (base64).")
+
+def parse_top_k(payload, max_top_k=config.SERVICE_MAX_TOP_K):
+    """
+    Mengambil "top_k" dari body JSON: harus bilangan bulat 1..max_top_k.
+
+    Dibatasi karena satu batch dicari dengan top_k terbesar di dalamnya, sehingga
+    satu request dengan top_k sangat besar memperlambat semua request lain di batch.
+    """
+    top_k = payload.get("top_k", config.TOP_K)
+    if isinstance(top_k, bool) or not isinstance(top_k, int):
+        raise ValueError("top_k harus bilangan bulat.")
+    if not 1 <= top_k <= max_top_k:
+        raise ValueError(f"top_k harus antara 1 dan {max_top_k}.")
+    return top_k
+
+def parse_filters(payload):
+    """
+    Mengambil filter opsional dari body JSON: "class_ids" (list), "split", "path_prefix".
+
+    Raises:
+        ValueError: Jika split tidak dikenal (dijawab 400 sebelum masuk antrean batch).
+    """
+    filters = {}
+    if payload.get("class_ids"):
+        class_ids = payload["class_ids"]
+        filters["class_ids"] = [class_ids] if isinstance(class_ids, str) else [str(c) for c in class_ids]
+    if payload.get("split"):
+        split = str(payload["split"])
+        if split not in SPLITS:
+            raise ValueError(f"split harus salah satu dari: {', '.join(SPLITS)}.")
+        filters["split"] = split
+    if payload.get("path_prefix"):
+        filters["path_prefix"] = str(payload["path_prefix"])
+    return filters
+
+class SearchHandler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            data = metrics.REGISTRY.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self.path == "/stats":
+            self._send_json(200, {
+                "batcher": self.batcher.stats(),
+                "query_cache": self.batcher.rag.query_cache.stats()
+            })
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path not in ("/search", "/classify"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._send_json(400, {"error": "Content-Length tidak valid."})
+            return
+        if length < 0 or length > config.SERVICE_MAX_BODY_BYTES:
+            # Body tidak dibaca; koneksi ditutup agar sisa body tidak dianggap request berikutnya
+            self.close_connection = True
+            self._send_json(413, {"error": f"Body maksimal {config.SERVICE_MAX_BODY_BYTES} byte."})
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            query, query_type = parse_query(payload)
+            top_k = parse_top_k(payload)
+            filters = parse_filters(payload)
+        except Exception as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            if self.path == "/classify":
+                # Prediksi label zero-shot cukup 200 skor kelas, tidak perlu micro-batching
+                results = self.batcher.rag.predict_labels(query, top_k=top_k, query_type=query_type)
+            else:
+                results = self.batcher.submit(query, top_k=top_k, query_type=query_type, filters=filters)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+
+        self._send_json(200, {"results": results})
+
+    def log_message(self, format, *args):
+        # Log per request dimatikan agar tidak membebani hot path
+        pass
+
+
+# 3. MAIN
+
+def serve(host=config.SERVICE_HOST, port=config.SERVICE_PORT,
+          max_batch_size=config.SERVICE_MAX_BATCH_SIZE, max_wait_ms=config.SERVICE_MAX_WAIT_MS):
+    metrics.configure_logging()
+    metrics.set_role("service", instance=port)
+
+    # Service pencarian tidak membutuhkan Qwen2-VL
+    rag = RAGSystem(retrieval_only=True)
+    SearchHandler.batcher = MicroBatcher(rag, max_batch_size, max_wait_ms)
+
+    server = ThreadingHTTPServer((host, port), SearchHandler)
+    print(f"🌐 Search service berjalan di http://{host}:{port} "
+          f"(max batch {max_batch_size}, max wait {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Search service dihentikan.")
+    finally:
+        server.server_close()
+        metrics.write_prometheus()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP search service dengan micro-batching CLIP.")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=config.SERVICE_MAX_BATCH_SIZE,
+                        help="Jumlah request maksimum per batch encode.")
+    parser.add_argument("--max-wait-ms", type=float, default=config.SERVICE_MAX_WAIT_MS,
+                        help="Lama menunggu request lain sebelum batch dijalankan.")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.max_batch_size, args.max_wait_ms)
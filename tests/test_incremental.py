@@ -0,0 +1,67 @@
+import numpy as np
+
+from indexer import build_manifest, diff_manifest, rewrite_embeddings
+
+
+def signature(size, mtime_ns=1):
+    return {"size": size, "mtime_ns": mtime_ns}
+
+def test_diff_manifest_detects_new_changed_and_deleted():
+    manifest = {
+        "a.jpg": {**signature(10), "row": 0},
+        "b.jpg": {**signature(20), "row": 1},
+        "c.jpg": {**signature(30), "row": 2},
+        "d.jpg": {**signature(40), "row": 3},
+    }
+    # b berubah, c dihapus, e baru
+    all_images = [("a.jpg", "n0"), ("b.jpg", "n0"), ("d.jpg", "n1"), ("e.jpg", "n1")]
+    signatures = {"a.jpg": signature(10), "b.jpg": signature(21), "d.jpg": signature(40), "e.jpg": signature(50)}
+
+    to_encode, stale_rows = diff_manifest(manifest, all_images, signatures)
+
+    assert to_encode == [("b.jpg", "n0"), ("e.jpg", "n1")]
+    assert stale_rows == [1, 2]
+
+def test_diff_manifest_up_to_date():
+    manifest = {"a.jpg": {**signature(10), "row": 0}}
+    assert diff_manifest(manifest, [("a.jpg", "n0")], {"a.jpg": signature(10)}) == ([], [])
+
+def test_rewrite_embeddings_keeps_row_order(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    old = np.arange(10 * 4, dtype='float32').reshape(10, 4)
+    np.save(path, old)
+    new = -np.arange(3 * 4, dtype='float32').reshape(3, 4) - 1
+    stale_rows = [0, 4, 5, 9]
+
+    # chunk_size kecil agar baris yang dihapus melintasi batas chunk
+    staged = rewrite_embeddings(stale_rows, new, embeddings_path=path, chunk_size=3)
+
+    keep = np.setdiff1d(np.arange(10), stale_rows)
+    np.testing.assert_array_equal(np.load(staged), np.concatenate([old[keep], new]))
+    # File asli baru diganti oleh save_database
+    np.testing.assert_array_equal(np.load(path), old)
+
+def test_manifest_rows_follow_rewritten_embeddings(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    paths = [f"img_{i}.jpg" for i in range(6)]
+    np.save(path, np.arange(6, dtype='float32').reshape(6, 1))
+    signatures = {p: signature(i) for i, p in enumerate(paths)}
+    metadata = [{"path": p} for p in paths]
+    manifest = build_manifest(metadata, signatures)
+
+    # img_2 berubah, img_4 dihapus
+    del signatures["img_4.jpg"]
+    signatures["img_2.jpg"] = signature(99)
+    all_images = [(p, "n0") for p in paths if p in signatures]
+    to_encode, stale_rows = diff_manifest(manifest, all_images, signatures)
+
+    # Langkah yang sama dengan mode incremental di indexer.main
+    stale = set(stale_rows)
+    metadata = [item for row, item in enumerate(metadata) if row not in stale]
+    metadata.extend({"path": p} for p, _ in to_encode)
+    new = np.array([[float(paths.index(p)) + 100] for p, _ in to_encode], dtype='float32')
+    embeddings = np.load(rewrite_embeddings(stale_rows, new, embeddings_path=path, chunk_size=4))
+
+    for p, entry in build_manifest(metadata, signatures).items():
+        expected = paths.index(p) + (100 if p == "img_2.jpg" else 0)
+        assert embeddings[entry["row"], 0] == expected
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+
+from metadata_store import MetadataStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = str(tmp_path / "Dataset")
+    # Urutan baris sengaja tidak terurut menurut path
+    paths = [
+        os.path.join(root, "Val", "n02", "b.jpg"),
+        os.path.join(root, "Train", "n01", "a.jpg"),
+        os.path.join(root, "Val", "n010", "c.jpg"),
+        os.path.join(root, "Val", "n01", "a.jpg"),
+        os.path.join(root, "Train", "n01", "z.jpg"),
+    ]
+    metadata = [{"path": p, "class_id": p.split(os.sep)[-2], "label": "x"} for p in paths]
+    store_dir = str(tmp_path / "store")
+    MetadataStore.write(metadata, store_dir)
+    return MetadataStore(store_dir), root, paths
+
+def test_row_for_path(store):
+    metadata, root, paths = store
+    for row, path in enumerate(paths):
+        assert metadata.row_for_path(path) == row
+
+    # Sebelum path terkecil, sesudah path terbesar, dan di antara dua path
+    assert metadata.row_for_path(os.path.join(root, "A.jpg")) is None
+    assert metadata.row_for_path(os.path.join(root, "Val", "zzz.jpg")) is None
+    assert metadata.row_for_path(os.path.join(root, "Train", "n01", "m.jpg")) is None
+    # Awalan dari path yang ada bukan path yang ada
+    assert metadata.row_for_path(os.path.join(root, "Val", "n01")) is None
+
+def test_rows_for_prefix(store):
+    metadata, root, _ = store
+    join = lambda *parts: os.path.join(root, *parts)
+
+    np.testing.assert_array_equal(metadata.rows_for_prefix(root), [0, 1, 2, 3, 4])
+    np.testing.assert_array_equal(metadata.rows_for_prefix(join("Train", "")), [1, 4])
+    # "n01/" tidak ikut mencocokkan folder "n010"
+    np.testing.assert_array_equal(metadata.rows_for_prefix(join("Val", "n01", "")), [3])
+    np.testing.assert_array_equal(metadata.rows_for_prefix(join("Val", "n01")), [2, 3])
+    # Path persis (batas atas = path itu sendiri) dan prefix tanpa hasil
+    np.testing.assert_array_equal(metadata.rows_for_prefix(join("Train", "n01", "z.jpg")), [4])
+    assert len(metadata.rows_for_prefix(join("Test"))) == 0
+    assert len(metadata.rows_for_prefix(join("Val", "n03"))) == 0
+
+def test_rows_for_relative_prefix(store, monkeypatch):
+    metadata, root, _ = store
+    monkeypatch.setattr("metadata_store.config.DATASET_DIR", root)
+    np.testing.assert_array_equal(metadata.rows_for_prefix(os.path.join("Val", "n02")), [0])
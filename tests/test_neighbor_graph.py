@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from neighbor_graph import NeighborGraph, build_neighbor_graph, update_neighbor_graph
+
+
+def random_embeddings(n, d, seed):
+    emb = np.random.default_rng(seed).standard_normal((n, d)).astype('float32')
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+def flat_index(embeddings):
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    return index
+
+def graph_paths(tmp_path, name):
+    return {
+        "ids_path": str(tmp_path / f"{name}_ids.npy"),
+        "scores_path": str(tmp_path / f"{name}_scores.npy"),
+        "info_path": str(tmp_path / f"{name}.json"),
+    }
+
+
+@pytest.mark.parametrize("stale_rows, num_new", [
+    ([0, 17, 150, 299], 20),   # hapus (termasuk baris pertama & terakhir) + tambah
+    ([5, 6, 7], 0),            # hanya hapus
+    ([], 35),                  # hanya tambah
+])
+def test_update_matches_full_rebuild(tmp_path, stale_rows, num_new):
+    k = 8
+    old = random_embeddings(300, 16, seed=0)
+    old_paths = graph_paths(tmp_path, "old")
+    build_neighbor_graph(flat_index(old), old, k=k, batch_size=64, **old_paths)
+    old_graph = NeighborGraph(old_paths["ids_path"], old_paths["scores_path"])
+
+    # Urutan baris sama dengan rewrite_embeddings: baris lama tersisa, lalu baris baru
+    keep = np.ones(len(old), dtype=bool)
+    keep[stale_rows] = False
+    new = np.concatenate([old[keep], random_embeddings(num_new, 16, seed=1)])
+    index = flat_index(new)
+
+    updated_paths = graph_paths(tmp_path, "updated")
+    assert update_neighbor_graph(index, new, old_graph, stale_rows, num_new, k=k, batch_size=64, **updated_paths)
+    full_paths = graph_paths(tmp_path, "full")
+    build_neighbor_graph(index, new, k=k, batch_size=64, **full_paths)
+
+    updated = NeighborGraph(updated_paths["ids_path"], updated_paths["scores_path"])
+    full = NeighborGraph(full_paths["ids_path"], full_paths["scores_path"])
+    np.testing.assert_array_equal(updated.ids, full.ids)
+    np.testing.assert_allclose(updated.scores, full.scores, rtol=0, atol=1e-5)
+
+def test_update_refuses_smaller_old_graph(tmp_path):
+    old = random_embeddings(50, 8, seed=2)
+    old_paths = graph_paths(tmp_path, "old")
+    build_neighbor_graph(flat_index(old), old, k=4, **old_paths)
+    old_graph = NeighborGraph(old_paths["ids_path"], old_paths["scores_path"])
+
+    new = np.concatenate([old, random_embeddings(5, 8, seed=3)])
+    assert not update_neighbor_graph(flat_index(new), new, old_graph, [], 5, k=8, **graph_paths(tmp_path, "new"))
@@ -0,0 +1,198 @@
+import os
+import json
+import hashlib
+import argparse
+import threading
+import numpy as np
+from tqdm import tqdm
+
+# Import konfigurasi lokal
+import config
+
+# Nama file di dalam folder cache fitur visual
+FEATURES_FILE = "features.npy"
+VALID_FILE = "valid.npy"
+INFO_FILE = "info.json"
+
+FORMAT_VERSION = 1
+
+# Jumlah gambar per pemanggilan vision tower saat membangun cache
+BUILD_BATCH_SIZE = 32
+
+
+# 1. IDENTITAS INDEX
+
+def metadata_digest(metadata):
+    """
+    Sidik jari tabel path metadata store (baris cache hanya berlaku untuk urutan baris yang sama).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(metadata.paths.offsets).tobytes())
+    digest.update(np.ascontiguousarray(metadata.paths.data).tobytes())
+    return digest.hexdigest()
+
+
+# 2. CACHE FITUR VISUAL
+
+class VisionFeatureCache:
+    """
+    Fitur visual Qwen2-VL (output vision tower setelah patch merger) per baris index.
+
+    Struktur folder:
+    - features.npy : float16 [N, T, H], T = token visual per gambar, H = hidden size LLM.
+    - valid.npy    : uint8 [N], 1 jika baris sudah terisi.
+    - info.json    : pengaturan model/processor, grid_thw, dan sidik jari metadata.
+
+    Semua gambar TinyImageNet berukuran sama sehingga jumlah token visual per
+    gambar tetap dan cukup disimpan dalam satu array. Cache diisi saat build
+    (`python vision_cache.py`) maupun otomatis saat gambar ter-index pertama kali
+    dideskripsikan. Jika pengaturan model/processor atau isi index berubah,
+    cache lama diabaikan dan dibuat ulang.
+    """
+
+    def __init__(self, metadata, settings, cache_dir=config.VISION_CACHE_DIR):
+        """
+        Args:
+            metadata (MetadataStore): Metadata index (path -> row id).
+            settings (dict): Pengaturan yang memengaruhi fitur (model, min/max pixels, dtype).
+        """
+        self.metadata = metadata
+        self.settings = settings
+        self.cache_dir = cache_dir
+        self.digest = metadata_digest(metadata)
+        self.lock = threading.Lock()
+
+        self.features = None
+        self.valid = None
+        self.grid_thw = None
+        self._open()
+
+    def _open(self):
+        info_path = os.path.join(self.cache_dir, INFO_FILE)
+        if not os.path.exists(info_path):
+            return
+        with open(info_path, 'r') as f:
+            info = json.load(f)
+
+        if (info.get("version") != FORMAT_VERSION or info.get("settings") != self.settings
+                or info.get("digest") != self.digest or info.get("rows") != len(self.metadata)):
+            print("⚠️ Cache fitur visual tidak sesuai dengan model/index saat ini, dibuat ulang saat dibutuhkan.")
+            return
+
+        self.features = np.load(os.path.join(self.cache_dir, FEATURES_FILE), mmap_mode='r+')
+        self.valid = np.load(os.path.join(self.cache_dir, VALID_FILE), mmap_mode='r+')
+        self.grid_thw = np.asarray(info["grid_thw"], dtype=np.int64)
+
+    def _create(self, shape, grid_thw):
+        """
+        Membuat array cache kosong untuk fitur berbentuk `shape` ([T, H]).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        rows = len(self.metadata)
+        features = np.lib.format.open_memmap(
+            os.path.join(self.cache_dir, FEATURES_FILE), mode='w+', dtype=np.float16, shape=(rows,) + tuple(shape)
+        )
+        valid = np.lib.format.open_memmap(
+            os.path.join(self.cache_dir, VALID_FILE), mode='w+', dtype=np.uint8, shape=(rows,)
+        )
+        del features, valid
+
+        # info.json ditulis terakhir: tanpa file ini cache dianggap tidak ada
+        tmp_path = os.path.join(self.cache_dir, INFO_FILE + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "rows": rows,
+                "digest": self.digest,
+                "settings": self.settings,
+                "grid_thw": [int(v) for v in grid_thw],
+                "tokens": int(shape[0]),
+                "hidden_size": int(shape[1])
+            }, f)
+        os.replace(tmp_path, os.path.join(self.cache_dir, INFO_FILE))
+        self._open()
+
+    def row_for_path(self, path):
+        return self.metadata.row_for_path(path)
+
+    def get(self, row):
+        """
+        Fitur tersimpan untuk baris index `row`.
+
+        Returns:
+            tuple atau None: (features float16 [T, H], grid_thw int64 [3]), None jika belum ada.
+        """
+        if row is None or self.valid is None or not self.valid[row]:
+            return None
+        return np.asarray(self.features[row]), self.grid_thw
+
+    def put(self, row, features, grid_thw):
+        """
+        Menyimpan fitur baris `row`. Gambar dengan grid berbeda dari isi cache dilewati.
+        """
+        if row is None:
+            return
+        features = np.asarray(features, dtype=np.float16)
+        grid_thw = np.asarray(grid_thw, dtype=np.int64)
+
+        with self.lock:
+            if self.features is None:
+                self._create(features.shape, grid_thw)
+            if features.shape != self.features.shape[1:] or not np.array_equal(grid_thw, self.grid_thw):
+                return
+            self.features[row] = features
+            self.valid[row] = 1
+
+    def num_cached(self):
+        return 0 if self.valid is None else int(np.count_nonzero(self.valid))
+
+    def flush(self):
+        with self.lock:
+            if self.features is not None:
+                self.features.flush()
+                self.valid.flush()
+
+
+def build_vision_cache(generator, metadata, image_store=None, batch_size=BUILD_BATCH_SIZE):
+    """
+    Mengisi cache fitur visual untuk semua baris index yang belum ada di cache.
+
+    Args:
+        generator (VLMGenerator): Generator yang sudah dimuat (vision tower & cache-nya dipakai).
+        metadata (MetadataStore): Metadata index.
+        image_store (ImageStore): Image store opsional (piksel tanpa decode JPEG).
+    """
+    from PIL import Image
+
+    cache = generator.vision_cache
+    missing = [row for row in range(len(metadata)) if cache.get(row) is None]
+    print(f"👁️  Membangun cache fitur visual: {len(missing)} dari {len(metadata)} baris belum ada.")
+
+    for start in tqdm(range(0, len(missing), batch_size), desc="Vision Features"):
+        rows = missing[start : start + batch_size]
+        images = []
+        for row in rows:
+            path = metadata.paths[row]
+            store_row = image_store.lookup_current(path) if image_store is not None else None
+            if store_row is not None:
+                images.append(image_store.image(store_row))
+            else:
+                images.append(Image.open(path).convert("RGB"))
+        generator.visual_features(images, rows)
+
+    cache.flush()
+    print(f"💾 Cache fitur visual: {cache.num_cached()} baris tersimpan di {cache.cache_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Membangun cache fitur visual Qwen2-VL untuk seluruh index.")
+    parser.add_argument("--batch-size", type=int, default=BUILD_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from backend import VLMGenerator
+    from image_store import open_image_store
+
+    generator = VLMGenerator()
+    if generator.vision_cache is None:
+        raise SystemExit("❌ Cache fitur visual nonaktif atau index belum dibuat.")
+    build_vision_cache(generator, generator.vision_cache.metadata, open_image_store(), args.batch_size)